@@ -4,18 +4,25 @@ import django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 django.setup()
 
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 from core import routing
+from core.middleware import JWTAuthMiddlewareStack
+from frontend.asgi_static import StaticFilesApp
+
+http_application = get_asgi_application()
+if settings.STATIC_PIPELINE:
+    # Assets do collectstatic servidos antes do Django, com cache imutável e .br/.gz
+    http_application = StaticFilesApp(http_application)
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
+        "http": http_application,
         "websocket": AllowedHostsOriginValidator(
-            AuthMiddlewareStack(
+            JWTAuthMiddlewareStack(
                 URLRouter(
                     routing.websocket_urlpatterns  # Define as rotas para WebSockets
                 )
@@ -1,5 +1,8 @@
+import logging
 import os
+import time
 from celery import Celery
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_init
 
 # Define o módulo de configurações padrão do Django para o programa 'celery'.
 # Isso evita que você tenha que configurar a variável de ambiente CELERY_SETTINGS_MODULE.
@@ -17,7 +20,110 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Isso procurará por arquivos tasks.py dentro de cada aplicativo em INSTALLED_APPS.
 app.autodiscover_tasks()
 
+logger = logging.getLogger(__name__)
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
-    print(f"Request: {self.request!r}")
+    logger.info("Request: %r", self.request)
+
+
+@before_task_publish.connect
+def add_enqueued_at_header(headers=None, **kwargs):
+    """Marca o instante de publicação para medir a espera na fila."""
+    from core.utils.metrics import ENQUEUED_AT_HEADER
+
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+@before_task_publish.connect
+def add_traceparent_header(headers=None, **kwargs):
+    """Propaga o trace atual (core.utils.tracing) para a tarefa publicada."""
+    from core.utils.tracing import TRACEPARENT_KEY, inject_traceparent
+
+    if headers is not None and TRACEPARENT_KEY not in headers:
+        inject_traceparent(headers)
+
+
+@task_prerun.connect
+def close_old_db_connections(**kwargs):
+    """
+    Aplica CONN_MAX_AGE e CONN_HEALTH_CHECKS nos workers, como o Django faz a cada
+    requisição: conexões obsoletas ou quebradas são descartadas antes da tarefa.
+    """
+    from django.db import close_old_connections
+
+    close_old_connections()
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    """Registra a espera na fila assim que o worker começa a executar a tarefa."""
+    from core.utils.metrics import ENQUEUED_AT_HEADER, observe_queue_wait
+
+    if task is not None:
+        observe_queue_wait(task.name, task.request.get(ENQUEUED_AT_HEADER))
+
+
+@task_prerun.connect
+def reset_log_context(task_id=None, task=None, **kwargs):
+    """Começa cada tarefa com um contexto de log novo (a thread do worker é reaproveitada)."""
+    from core.utils.log import bind_context, clear_context
+
+    clear_context()
+    bind_context(task=getattr(task, "name", None), task_id=task_id)
+
+
+@task_prerun.connect
+def open_task_span(task_id=None, task=None, **kwargs):
+    """Abre o span da tarefa quando ela foi publicada dentro de um trace."""
+    from core.utils.log import bind_context
+    from core.utils.metrics import ENQUEUED_AT_HEADER
+    from core.utils import tracing
+
+    if task is None:
+        return
+    task_span = tracing.start_task_span(
+        task, task_id, task.request.get(ENQUEUED_AT_HEADER)
+    )
+    if task_span is not None:
+        bind_context(trace_id=task_span.trace_id)
+
+
+@task_postrun.connect
+def close_task_span(task_id=None, state=None, **kwargs):
+    from core.utils import tracing
+
+    tracing.end_task_span(task_id, state)
+
+
+@task_prerun.connect
+def open_task_profile(task=None, args=None, kwargs=None, **extra):
+    """Perfila uma amostra das tarefas do jogo quando o profiler está ligado."""
+    from core.utils import profiling
+
+    if task is None or task.name not in profiling.PROFILED_TASKS:
+        return
+    if not profiling.should_profile():
+        return
+    session_id = (kwargs or {}).get("session_id") or (args[0] if args else None)
+    profiling.start_thread_profile("celery", task.name, session_id)
+
+
+@task_postrun.connect
+def close_task_profile(**kwargs):
+    from core.utils import profiling
+
+    profiling.stop_thread_profile()
+
+
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    """Expõe as métricas do worker em uma porta sidecar (METRICS_WORKER_PORT)."""
+    from django.conf import settings
+    from core.utils.metrics import start_metrics_server
+
+    port = getattr(settings, "METRICS_WORKER_PORT", None)
+    if port:
+        start_metrics_server(port)
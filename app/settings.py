@@ -25,7 +25,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = "django-insecure-_(t$^e+=c*r9ej86a3&6h9!(&^o=114dqj2(o4yzwx8k81tu_3"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("DEBUG", "1") == "1"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.log_context_middleware",
+    "core.middleware.tracing_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -82,22 +84,266 @@ ASGI_APPLICATION = "app.asgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+# DB_ENGINE escolhe o perfil de banco:
+# - "sqlite" (padrão): arquivo local em modo WAL, com busy_timeout e synchronous=NORMAL
+#   aplicados a cada conexão, para que o Daphne e os workers Celery escrevam sem
+#   travar uns aos outros ("database is locked").
+# - "postgres": servidor de banco com pool de conexões do psycopg (DB_POOL_MAX_SIZE > 0)
+#   ou conexões persistentes (CONN_MAX_AGE) quando o pool está desativado.
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "60"))
+
+if DB_ENGINE == "postgres":
+    DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "who_am_ai"),
+            "USER": os.environ.get("DB_USER", "postgres"),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "127.0.0.1"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            # O pool do psycopg não pode ser combinado com conexões persistentes.
+            "CONN_MAX_AGE": 0 if DB_POOL_MAX_SIZE else DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": (
+                {
+                    "pool": {
+                        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+                        "max_size": DB_POOL_MAX_SIZE,
+                        "timeout": 10,
+                    }
+                }
+                if DB_POOL_MAX_SIZE
+                else {}
+            ),
+        }
+    }
+else:
+    SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "1") == "1"
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": (
+                {
+                    "init_command": (
+                        "PRAGMA journal_mode=WAL;"
+                        "PRAGMA synchronous=NORMAL;"
+                    ),
+                    # Transações de escrita pegam o lock logo no BEGIN, evitando que
+                    # duas transações "deferred" disputem o upgrade do lock.
+                    "transaction_mode": "IMMEDIATE",
+                    # Espera pelo lock de escrita (o busy_timeout do SQLite), em segundos.
+                    "timeout": 20,
+                }
+                if SQLITE_TUNING
+                else {}
+            ),
+        }
     }
-}
+
+# Ciclo de vida das conexões do jogo (core.consumers.GameConsumer), em segundos:
+# intervalo do ping da aplicação (um pong ausente por dois intervalos encerra o socket),
+# tempo sem eventos do jogo até fechar por inatividade e carência após o fim de jogo.
+WS_PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "25"))
+WS_IDLE_TIMEOUT = float(os.environ.get("WS_IDLE_TIMEOUT", "300"))
+WS_GAME_OVER_GRACE = float(os.environ.get("WS_GAME_OVER_GRACE", "30"))
+# Expiração das entradas de grupo no Redis; o consumer renova a sua a cada ping.
+WS_GROUP_EXPIRY = int(os.environ.get("WS_GROUP_EXPIRY", "600"))
 
 # Configuração do Channel Layers para WebSockets
 # Usando channels_redis como backend. Certifique-se de que o Redis esteja em execução.
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {
-            "hosts": [("localhost", 6379)],  # Endereço do servidor Redis
+# CHANNEL_LAYER_BACKEND escolhe a implementação:
+# - "redis": RedisChannelLayer (listas por canal, com capacidade e expiração configuráveis);
+# - "pubsub": RedisPubSubChannelLayer (Pub/Sub, sem fila por canal nem expiração de grupo).
+# Com vários endereços em CHANNEL_LAYER_HOSTS (separados por vírgula), os canais e grupos
+# são distribuídos (sharding) entre os servidores Redis.
+# Use `python manage.py bench_channel_layer` para comparar as opções.
+CHANNEL_LAYER_BACKEND = os.environ.get("CHANNEL_LAYER_BACKEND", "redis")
+CHANNEL_LAYER_HOSTS = [
+    host.strip()
+    for host in os.environ.get("CHANNEL_LAYER_HOSTS", "redis://localhost:6379/0").split(",")
+    if host.strip()
+]
+# Mensagens pendentes por canal antes de descartar. Os sockets de um mesmo processo
+# Daphne compartilham uma única fila no Redis, então o padrão do channels_redis (100)
+# descarta eventos com poucas centenas de conexões. CHANNEL_LAYER_EXPIRY: segundos até
+# uma mensagem não entregue expirar (o replay do log de eventos cobre as perdidas).
+CHANNEL_LAYER_CAPACITY = int(os.environ.get("CHANNEL_LAYER_CAPACITY", "5000"))
+CHANNEL_LAYER_EXPIRY = int(os.environ.get("CHANNEL_LAYER_EXPIRY", "30"))
+
+if CHANNEL_LAYER_BACKEND == "pubsub":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.pubsub.RedisPubSubChannelLayer",
+            "CONFIG": {"hosts": CHANNEL_LAYER_HOSTS},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_LAYER_HOSTS,  # Endereços dos servidores Redis
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": CHANNEL_LAYER_EXPIRY,
+                "group_expiry": WS_GROUP_EXPIRY,
+            },
+        },
+    }
+
+# Redis usado pela aplicação (deduplicação de mensagens, caches).
+REDIS_URL = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/2")
+# Conexões por event loop do cliente assíncrono (views assíncronas); acima disso as
+# requisições esperam uma conexão livre em vez de falhar.
+REDIS_ASYNC_MAX_CONNECTIONS = int(os.environ.get("REDIS_ASYNC_MAX_CONNECTIONS", "50"))
+
+# Tempo (segundos) em que um client_message_id repetido é tratado como reenvio.
+MESSAGE_DEDUP_TTL = int(os.environ.get("MESSAGE_DEDUP_TTL", "300"))
+
+# Cache do estado dos jogos ativos (core.utils.session_state).
+# TTL (segundos) do estado em cache e intervalo do flusher write-behind para o banco.
+SESSION_STATE_TTL = int(os.environ.get("SESSION_STATE_TTL", str(6 * 60 * 60)))
+SESSION_STATE_FLUSH_INTERVAL = float(os.environ.get("SESSION_STATE_FLUSH_INTERVAL", "5"))
+
+# Dica antecipada (core.utils.speculation): depois de cada resposta da IA, um worker gera em
+# segundo plano a próxima dica extra do jogo, guardada no estado em cache; um palpite errado
+# (detectado sem o LLM) é respondido com ela na hora.
+# Atenção à precisão: "errado" quer dizer apenas que o palpite não cita o nome do personagem.
+# Um acerto por apelido ou descrição ("Pelé", "o imperador do Brasil") recebe a resposta de
+# palpite errado. Por isso a dica antecipada vale só para os temas listados em
+# SPECULATIVE_HINT_THEMES (separados por vírgula, ex.: "Filmes,Series"); vazio desliga.
+SPECULATIVE_HINT_THEMES = {
+    theme.strip()
+    for theme in os.environ.get("SPECULATIVE_HINT_THEMES", "").split(",")
+    if theme.strip()
+}
+
+# Salas multijogador (core.utils.rooms). ROOM_MAX_PLAYERS limita o tamanho pedido na criação
+# (padrão ROOM_DEFAULT_MAX_PLAYERS). No modo por turnos, após ROOM_TURN_TIMEOUT segundos sem
+# jogada qualquer participante pode jogar. Cada pergunta nova (não repetida) vale
+# ROOM_QUESTION_POINTS ao jogador; o palpite certo vale a pontuação do jogo. O worker que
+# processa a fila da sala lê até ROOM_DRAIN_BATCH mensagens por vez e mantém a posse da
+# fila por ROOM_DRAIN_LEASE segundos, renovada a cada mensagem.
+ROOM_MAX_PLAYERS = int(os.environ.get("ROOM_MAX_PLAYERS", "100"))
+ROOM_DEFAULT_MAX_PLAYERS = int(os.environ.get("ROOM_DEFAULT_MAX_PLAYERS", "8"))
+ROOM_TURN_TIMEOUT = float(os.environ.get("ROOM_TURN_TIMEOUT", "60"))
+ROOM_QUESTION_POINTS = int(os.environ.get("ROOM_QUESTION_POINTS", "2"))
+ROOM_DRAIN_BATCH = int(os.environ.get("ROOM_DRAIN_BATCH", "20"))
+ROOM_DRAIN_LEASE = int(os.environ.get("ROOM_DRAIN_LEASE", "120"))
+
+# Log de eventos por sessão (core.utils.event_log), reenviado ao WebSocket na reconexão.
+# Tamanho máximo aproximado do stream e TTL (segundos) após o último evento.
+EVENT_LOG_MAXLEN = int(os.environ.get("EVENT_LOG_MAXLEN", "500"))
+EVENT_LOG_TTL = int(os.environ.get("EVENT_LOG_TTL", str(SESSION_STATE_TTL)))
+
+# Cache em memória (por processo) de tokens JWT já verificados nos handshakes WebSocket
+# (core.middleware): número máximo de tokens e TTL (segundos) de cada entrada.
+WS_AUTH_CACHE_SIZE = int(os.environ.get("WS_AUTH_CACHE_SIZE", "1024"))
+WS_AUTH_CACHE_TTL = int(os.environ.get("WS_AUTH_CACHE_TTL", "300"))
+
+# Arquivamento das mensagens de jogos concluídos (core.utils.transcripts).
+# Sessões concluídas há mais de CHAT_ARCHIVE_RETENTION_DAYS dias têm as mensagens
+# compactadas em GameSession.transcript; a tarefa roda a cada CHAT_ARCHIVE_INTERVAL segundos.
+CHAT_ARCHIVE_RETENTION_DAYS = int(os.environ.get("CHAT_ARCHIVE_RETENTION_DAYS", "7"))
+CHAT_ARCHIVE_INTERVAL = float(os.environ.get("CHAT_ARCHIVE_INTERVAL", str(60 * 60)))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.environ.get("CHAT_ARCHIVE_BATCH_SIZE", "200"))
+
+# Ledger das chamadas ao LLM (core.utils.llm_ledger). Os turnos enfileiram as chamadas
+# no Redis e o flush grava LLMCall em lote a cada LLM_LEDGER_FLUSH_INTERVAL segundos.
+LLM_LEDGER_FLUSH_INTERVAL = float(os.environ.get("LLM_LEDGER_FLUSH_INTERVAL", "10"))
+LLM_LEDGER_BATCH_SIZE = int(os.environ.get("LLM_LEDGER_BATCH_SIZE", "500"))
+# Preço (USD por milhão de tokens) de entrada, saída e entrada em cache, por modelo.
+# Modelos fora da tabela (ex.: o provedor falso) têm custo zero.
+LLM_PRICING = {
+    "gemini-2.5-flash": {"input": 0.30, "output": 2.50, "cached": 0.075},
+    "gemini-2.5-flash-lite": {"input": 0.10, "output": 0.40, "cached": 0.025},
+    "gemini-2.5-pro": {"input": 1.25, "output": 10.00, "cached": 0.31},
+}
+
+# Logging estruturado (core.utils.log): os registros vão para uma fila e são formatados e
+# escritos em stdout por uma thread própria. LOG_FORMAT "json" (padrão) ou "text";
+# LOG_LEVELS ajusta níveis por módulo (ex.: "core.tasks=DEBUG,core.consumers=WARNING");
+# LOG_DEBUG_SAMPLE_RATE amostra os registros DEBUG (por sessão quando há session_id).
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "1"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_LEVELS = {
+    name.strip(): level.strip().upper()
+    for name, _, level in (
+        item.partition("=") for item in os.environ.get("LOG_LEVELS", "").split(",")
+    )
+    if name.strip() and level.strip()
+}
+
+# Tracing dos turnos (core.utils.tracing): spans da API, das tarefas Celery, das etapas e do
+# consumer, ligados pelo traceparent. TRACE_SAMPLE_RATE é a fração das requisições com trace;
+# os spans vão para TRACE_EXPORT_FILE (JSON lines), lido por `manage.py trace_waterfall`.
+TRACING = os.environ.get("TRACING", "0") == "1"
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1"))
+TRACE_EXPORT_FILE = os.environ.get(
+    "TRACE_EXPORT_FILE", os.path.join(BASE_DIR, "traces", "spans.jsonl")
+)
+
+# Profiler por amostragem (core.utils.profiling) das tarefas do jogo e dos handlers do
+# GameConsumer. PROFILING=1 liga sempre; `manage.py profile start` liga por um tempo em
+# todos os processos com PROFILE_CONTROL_REFRESH > 0 (eles releem o estado no Redis a cada
+# PROFILE_CONTROL_REFRESH s). O padrão, 0, deixa o controle remoto desligado e o profiler
+# sem custo algum. PROFILE_SAMPLE_RATE é a fração das execuções perfiladas e
+# PROFILE_INTERVAL_MS o intervalo entre amostras; as pilhas ("collapsed", prontas para
+# flamegraph) vão para PROFILE_OUTPUT_DIR.
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0.1"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "10"))
+PROFILE_CONTROL_REFRESH = float(os.environ.get("PROFILE_CONTROL_REFRESH", "0"))
+PROFILE_OUTPUT_DIR = os.environ.get(
+    "PROFILE_OUTPUT_DIR", os.path.join(BASE_DIR, "profiles")
+)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "log_context": {"()": "core.utils.log.ContextFilter"},
+        "debug_sampling": {
+            "()": "core.utils.log.DebugSamplingFilter",
+            "rate": LOG_DEBUG_SAMPLE_RATE,
+        },
+    },
+    "formatters": {
+        "json": {"()": "core.utils.log.JSONFormatter"},
+        "text": {
+            "()": "core.utils.log.ContextTextFormatter",
+            "format": "%(asctime)s %(levelname)s %(name)s: %(message)s",
+        },
+    },
+    "handlers": {
+        "queue": {
+            "class": "core.utils.log.QueueLogHandler",
+            "stream": "ext://sys.stdout",
+            "queue_size": LOG_QUEUE_SIZE,
+            "filters": ["log_context", "debug_sampling"],
+            "formatter": LOG_FORMAT,
         },
     },
+    # Os loggers do projeto não propagam para a raiz (que o worker Celery reconfigura).
+    "loggers": {
+        name: {
+            "handlers": ["queue"],
+            "level": LOG_LEVELS.get(name, LOG_LEVEL),
+            "propagate": False,
+        }
+        for name in ("app", "core", "frontend")
+    }
+    | {
+        name: {"level": level}
+        for name, level in LOG_LEVELS.items()
+        if name not in ("app", "core", "frontend")
+    },
 }
 
 
@@ -139,6 +385,18 @@ APPEND_SLASH = False
 
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+
+# Pipeline de assets estáticos para produção. Com STATIC_PIPELINE=1, o collectstatic
+# minifica, gera nomes com hash do conteúdo e variantes .gz/.br (frontend.storage), e o
+# app ASGI serve STATIC_ROOT com cache imutável (frontend.asgi_static).
+STATIC_PIPELINE = os.environ.get("STATIC_PIPELINE", "0") == "1"
+if STATIC_PIPELINE:
+    STORAGES = {
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {
+            "BACKEND": "frontend.storage.CompressedManifestStaticFilesStorage"
+        },
+    }
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -202,3 +460,50 @@ CELERY_TIMEZONE = "America/Sao_Paulo"
 CELERY_ENABLE_UTC = True
 CELERY_TASK_TRACK_STARTED = True
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+
+# Pool de execução dos workers. As tarefas do jogo passam quase todo o tempo
+# esperando a rede (Gemini, Redis), então "threads" ou "gevent" permitem muito
+# mais concorrência por processo que "prefork". Veja o README para os valores suportados.
+CELERY_WORKER_POOL = os.environ.get("CELERY_WORKER_POOL", "prefork")
+CELERY_WORKER_CONCURRENCY = int(os.environ.get("CELERY_WORKER_CONCURRENCY", "4"))
+
+# Por padrão o Celery fecha a conexão com o banco antes e depois de cada tarefa.
+# Reaproveita a conexão por várias tarefas; a validade (CONN_MAX_AGE/health check)
+# é verificada a cada tarefa em app/celery.py.
+CELERY_DB_REUSE_MAX = int(os.environ.get("CELERY_DB_REUSE_MAX", "100"))
+
+# Views assíncronas para iniciar jogo e enviar mensagem (core.async_views): ORM assíncrono,
+# Redis assíncrono e publicação no broker por um executor dedicado (core.utils.publisher),
+# cujas threads usam o pool de conexões do Celery (CELERY_BROKER_POOL_LIMIT).
+ASYNC_API_VIEWS = os.environ.get("ASYNC_API_VIEWS", "0") == "1"
+CELERY_BROKER_POOL_LIMIT = int(os.environ.get("CELERY_BROKER_POOL_LIMIT", "10"))
+CELERY_PUBLISH_THREADS = int(os.environ.get("CELERY_PUBLISH_THREADS", "8"))
+
+# Tarefas periódicas (executadas com `celery -A app beat`).
+CELERY_BEAT_SCHEDULE = {
+    "flush-session-states": {
+        "task": "flush_session_states_task",
+        "schedule": SESSION_STATE_FLUSH_INTERVAL,
+    },
+    "archive-completed-sessions": {
+        "task": "archive_completed_sessions_task",
+        "schedule": CHAT_ARCHIVE_INTERVAL,
+    },
+    "flush-llm-ledger": {
+        "task": "flush_llm_ledger_task",
+        "schedule": LLM_LEDGER_FLUSH_INTERVAL,
+    },
+}
+
+
+# Métricas Prometheus
+# O processo web expõe /metrics; cada worker Celery sobe um servidor sidecar nesta porta.
+# Com workers prefork, defina PROMETHEUS_MULTIPROC_DIR para agregar os processos filhos.
+METRICS_WORKER_PORT = int(os.environ.get("METRICS_WORKER_PORT", "9101"))
+
+# Suíte de microbenchmarks (python manage.py bench_suite): diretório dos resultados salvos
+# e aumento relativo do melhor tempo, frente à referência, sinalizado como regressão.
+BENCH_RESULTS_DIR = os.environ.get(
+    "BENCH_RESULTS_DIR", os.path.join(BASE_DIR, "benchmarks")
+)
+BENCH_REGRESSION_THRESHOLD = float(os.environ.get("BENCH_REGRESSION_THRESHOLD", "0.25"))
@@ -19,10 +19,12 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
+from core.views import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("core.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("frontend.urls")),
 ]
 
@@ -1,3 +1,105 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GameSession, LLMCall, RoomPlayer
+from .utils.llm_ledger import summarize
+
+
+class LLMCallInline(admin.TabularInline):
+    """Chamadas ao LLM da sessão (somente leitura)."""
+
+    model = LLMCall
+    fields = (
+        "created_at",
+        "call_type",
+        "model",
+        "input_tokens",
+        "output_tokens",
+        "cached_tokens",
+        "latency_ms",
+        "cost_usd",
+        "error",
+    )
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class RoomPlayerInline(admin.TabularInline):
+    """Jogadores de uma sala multijogador (gravados na entrada e no fim da partida)."""
+
+    model = RoomPlayer
+    fields = ("user", "joined_at", "score", "question_count", "guess_count")
+    readonly_fields = ("joined_at",)
+    raw_id_fields = ("user",)
+    extra = 0
+
+
+@admin.register(GameSession)
+class GameSessionAdmin(admin.ModelAdmin):
+    list_display = (
+        "session_id",
+        "user",
+        "theme",
+        "level",
+        "mode",
+        "is_completed",
+        "score",
+        "llm_tokens_total",
+        "llm_latency_ms_total",
+        "start_time",
+    )
+    list_filter = ("is_completed", "mode", "theme", "level")
+    search_fields = ("session_id", "user__username", "character_name")
+    date_hierarchy = "start_time"
+    raw_id_fields = ("user",)
+    inlines = [RoomPlayerInline, LLMCallInline]
+
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    """
+    Ledger das chamadas ao LLM. A listagem mostra, acima dos registros, o consumo
+    agregado por etapa e por modelo dos registros filtrados.
+    """
+
+    change_list_template = "admin/core/llmcall/change_list.html"
+    list_display = (
+        "created_at",
+        "session",
+        "call_type",
+        "model",
+        "input_tokens",
+        "output_tokens",
+        "cached_tokens",
+        "latency_ms",
+        "cost_usd",
+        "has_error",
+    )
+    list_filter = ("call_type", "model", "created_at")
+    search_fields = ("session__session_id",)
+    date_hierarchy = "created_at"
+    list_select_related = ("session",)
+    raw_id_fields = ("session",)
+
+    @admin.display(boolean=True, description="Erro")
+    def has_error(self, obj):
+        return bool(obj.error)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        context = getattr(response, "context_data", None)
+        if context and "cl" in context:
+            queryset = context["cl"].queryset
+            context["llm_usage_totals"] = summarize(queryset, group_by=())[0]
+            context["llm_usage_rows"] = summarize(queryset, group_by=("call_type", "model"))
+        return response
@@ -1,18 +1,22 @@
+import logging
 import os
 import random
+import threading
+import time
 
 
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import (
     ChatPromptTemplate,
     MessagesPlaceholder,
     PromptTemplate,
 )
-from langchain.memory import ConversationBufferMemory
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from duckduckgo_search import duckduckgo_search
-from core.utils.models.google_ai import GoggleConnectionGemini
+from core.utils.models.provider import get_llm_connection
 from core.utils.llm_prompts import CHARACTER_SELECTION_PROMPT, PRINCIPAL_GAME_PROMPT
+from core.utils.llm_usage import LLMUsage
+from core.utils.metrics import observe_stage
 
 
 # Carrega variáveis de ambiente (como GOOGLE_API_KEY)
@@ -20,21 +24,51 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Número máximo de tentativas por nível. Padrão para 7 se "Aleatorio" ou não mapeado.
+ATTEMPTS_MAP = {
+    "Facil": 10,
+    "Medio": 8,
+    "Dificil": 5,
+}
+DEFAULT_ATTEMPTS = 7
+
+# Entrada usada para pedir a primeira dica; também é usada para reconstruir o histórico.
+INITIAL_HINT_INPUT = "Por favor, me dê a dica inicial."
+
+# Entrada usada para gerar a dica antecipada (core.utils.speculation); fica fora do histórico.
+EXTRA_HINT_INPUT = (
+    "Errei o palpite. Responda APENAS com uma nova dica curta sobre você, diferente das "
+    "anteriores, sem revelar seu nome e sem confirmar ou negar o palpite."
+)
+
+
+def get_max_attempts(level: str) -> int:
+    """Retorna o número de tentativas permitido para o nível informado."""
+    return ATTEMPTS_MAP.get(level, DEFAULT_ATTEMPTS)
+
 
 class GuessingGameAgent:
     """
     Agente de IA para o jogo de adivinhação, utilizando LangChain.
-    Gerencia a interação com o modelo Gemini, o histórico da conversa,
-    as regras do jogo (incluindo tentativas) e a geração de imagens.
+    Gerencia a interação com o modelo Gemini, as regras do jogo (incluindo tentativas)
+    e a geração de imagens.
+
+    O agente não guarda estado de partida: tema, nível, personagem, tentativas e
+    histórico são recebidos a cada chamada. Assim uma única instância pode ser
+    compartilhada entre threads/greenlets dos pools threads e gevent do Celery.
     """
 
     def __init__(self):
 
-        # Define o template do prompt principal do jogo.
-        # Inclui instruções, regras, parâmetros da rodada e placeholder para o histórico.
+        # Clientes LLM e cadeias são criados uma única vez e apenas lidos depois disso.
         self.llm_chat, self.llm_character_selection, self.llm_classification = (
-            GoggleConnectionGemini.connect()
+            get_llm_connection().connect()
         )
+
+        # Define o template do prompt principal do jogo.
+        # Inclui instruções, regras, parâmetros da rodada e placeholder para o histórico.
         self.game_prompt_template = ChatPromptTemplate.from_messages(
             [
                 (
@@ -46,236 +80,312 @@ class GuessingGameAgent:
             ]
         )
 
-        # Inicializa a memória da conversa.
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
+        # Cria a cadeia principal do LangChain. O histórico é passado em cada chamada.
+        # As cadeias terminam no modelo (AIMessage) para preservar os metadados de uso
+        # de tokens; o texto é extraído em _invoke.
+        self.chain = self.game_prompt_template | self.llm_chat
+        self.output_parser = StrOutputParser()
+
+        self.character_selection_chain = (
+            PromptTemplate.from_template(CHARACTER_SELECTION_PROMPT)
+            | self.llm_character_selection
         )
 
-        # Cria a cadeia principal do LangChain.
-        self.chain = (
-            RunnablePassthrough.assign(
-                chat_history=lambda x: self.memory.load_memory_variables({})[
-                    "chat_history"
-                ]
+        self.classification_chain = (
+            PromptTemplate.from_template(
+                "A seguinte entrada do usuário é uma tentativa de adivinhar o personagem "
+                "ou uma pergunta sobre o personagem? Responda APENAS 'guess' ou 'question'."
+                "\n\nEntrada do usuário: '{user_input}'"
             )
-            | self.game_prompt_template
-            | self.llm_chat
-            | StrOutputParser()
+            | self.llm_classification
         )
 
-        # Variáveis de estado do jogo
-        self.current_theme = ""
-        self.current_level = ""
-        self.character_name = ""
-        self.max_attempts = 0
-        self.attempts_left = 0
+    def _invoke(
+        self, chain, inputs: dict, stage: str, call_type: str, usage: LLMUsage = None
+    ) -> str:
+        """
+        Invoca uma cadeia, mede a etapa e registra latência e tokens em `usage`.
+        """
+        llm = chain.last
+        model = getattr(llm, "model", "") or type(llm).__name__
+        start = time.perf_counter()
+        message = None
+        stage_span = None
+        error = ""
+        try:
+            with observe_stage(stage, call_type) as stage_span:
+                message = chain.invoke(inputs)
+            return self.output_parser.invoke(message)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            metadata = getattr(message, "usage_metadata", None) or {}
+            details = metadata.get("input_token_details") or {}
+            input_tokens = metadata.get("input_tokens", 0)
+            output_tokens = metadata.get("output_tokens", 0)
+            if stage_span is not None:
+                stage_span.set_attributes(
+                    model=model, input_tokens=input_tokens, output_tokens=output_tokens
+                )
+            if usage is not None:
+                usage.record(
+                    call_type=call_type,
+                    model=model,
+                    latency_ms=int((time.perf_counter() - start) * 1000),
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    cached_tokens=details.get("cache_read", 0),
+                    error=error,
+                )
 
-    def start_new_game(self, theme: str, level: str, last_character_names: list) -> str:
+    @staticmethod
+    def resolve_level(level: str, seed: str = "") -> str:
         """
-        Inicia uma nova rodada do jogo.
-        Limpa o histórico, define tema/nível/tentativas, escolhe o personagem e gera a dica inicial.
+        Resolve o nível "Aleatorio" para um nível real.
+        A escolha é determinística pela semente (session_id), para que todos os
+        turnos da mesma partida usem o mesmo nível sem guardar estado no agente.
         """
-        # self.memory.clear()
-        self.character_name = ""
-        self.current_theme = theme
-        self.current_level = level
-        self.last_character_names = (
-            ", ".join(last_character_names) if last_character_names else ""
-        )
+        if level != "Aleatorio":
+            return level
+        return random.Random(seed).choice(["Facil", "Medio", "Dificil"])
 
-        # Define o número máximo de tentativas com base no nível
-        attempts_map = {
-            "Facil": 10,
-            "Medio": 8,
-            "Dificil": 5,
-        }
-        self.max_attempts = attempts_map.get(level, 7)
-        self.attempts_left = self.max_attempts
+    @staticmethod
+    def build_chat_history(messages) -> list:
+        """
+        Converte as mensagens salvas da sessão, pares (sender, texto) em ordem
+        cronológica, no histórico de mensagens usado pelo prompt principal.
+        """
+        history = []
+        for sender, text in messages:
+            if sender == "user":
+                history.append(HumanMessage(content=text))
+            else:
+                if not history:
+                    # A dica inicial é a resposta ao pedido implícito de início de jogo.
+                    history.append(HumanMessage(content=INITIAL_HINT_INPUT))
+                history.append(AIMessage(content=text))
+        return history
+
+    @staticmethod
+    def build_attempts_instruction(
+        character_name: str, attempts_left: int, initial: bool = False
+    ) -> str:
+        """Monta a instrução sobre tentativas restantes enviada ao prompt principal."""
+        instruction = (
+            f"Você tem {attempts_left} tentativas diretas restantes para adivinhar o personagem. "
+            f"Se o jogador tentar adivinhar e errar, mencione as tentativas restantes. "
+            f"Se as tentativas chegarem a 0 e o jogador não acertou, diga 'Suas tentativas acabaram! O personagem era {character_name}.'"
+        )
+        if initial:
+            instruction = (
+                f"Você é este personagem que já foi escolhido {character_name}. "
+                f"Cuidado ao revelar suas dicas. " + instruction
+            )
+        return instruction
 
-        # Se o nível for "Aleatório", escolhe um nível real
-        if self.current_level == "Aleatorio":
-            self.current_level = random.choice(["Facil", "Medio", "Dificil"])
-            print(f"DEBUG Agent: Nível aleatório escolhido: {self.current_level}")
+    def start_new_game(
+        self,
+        theme: str,
+        level: str,
+        last_character_names: list,
+        seed: str = "",
+        usage: LLMUsage = None,
+    ) -> tuple:
+        """
+        Inicia uma nova rodada do jogo.
+        Escolhe o personagem e gera a dica inicial.
+        Retorna a tupla (character_name, initial_hint); character_name é vazio em caso de erro.
+        """
+        resolved_level = self.resolve_level(level, seed)
+        if resolved_level != level:
+            logger.debug("Nível aleatório escolhido: %s", resolved_level)
 
         try:
             # 1. Escolhe o personagem internamente (com um prompt separado para controle)
-            character_selection_prompt_template = PromptTemplate.from_template(
-                CHARACTER_SELECTION_PROMPT
-            )
-            character_selection_chain = (
-                character_selection_prompt_template
-                | self.llm_character_selection
-                | StrOutputParser()
-            )
-
-            self.character_name = character_selection_chain.invoke(
+            character_name = self._invoke(
+                self.character_selection_chain,
                 {
-                    "theme": self.current_theme,
-                    "level": self.current_level,
-                    "character_name": self.character_name,
-                    "last_character_names": self.last_character_names,
-                }
+                    "theme": theme,
+                    "level": resolved_level,
+                    "character_name": "",
+                    "last_character_names": (
+                        ", ".join(last_character_names) if last_character_names else ""
+                    ),
+                },
+                "llm_call",
+                "character_selection",
+                usage,
             ).strip()
-            print(f"DEBUG Agent: Personagem escolhido pela IA: {self.character_name}")
+            logger.debug("Personagem escolhido pela IA: %s", character_name)
 
             # 2. Gera a primeira dica usando o prompt principal do jogo
             # A instrução de tentativas é incluída aqui.
-            attempts_instruction_text = (
-                f"Você é este personagem que já foi escolhido {self.character_name}. "
-                f"Cuidado ao revelar suas dicas. "
-                f"Você tem {self.attempts_left} tentativas diretas restantes para adivinhar o personagem. "
-                f"Se o jogador tentar adivinhar e errar, mencione as tentativas restantes. "
-                f"Se as tentativas chegarem a 0 e o jogador não acertou, diga 'Suas tentativas acabaram! O personagem era {self.character_name}.'"
-            )
-
-            initial_response_text = self.chain.invoke(
+            initial_response_text = self._invoke(
+                self.chain,
                 {
-                    "tema": self.current_theme,
-                    "nivel": self.current_level,
-                    "character_name": self.character_name,
-                    "attempts_instruction": attempts_instruction_text,  # Passa a instrução de tentativas
-                    "input": "Por favor, me dê a dica inicial.",
-                }
-            )
-
-            # Salva a interação na memória
-            self.memory.save_context(
-                {"input": "Por favor, me dê a dica inicial."},
-                {"output": initial_response_text},
+                    "tema": theme,
+                    "nivel": resolved_level,
+                    "character_name": character_name,
+                    "attempts_instruction": self.build_attempts_instruction(
+                        character_name, get_max_attempts(level), initial=True
+                    ),  # Passa a instrução de tentativas
+                    "chat_history": [],
+                    "input": INITIAL_HINT_INPUT,
+                },
+                "llm_call",
+                "initial_hint",
+                usage,
             )
 
-            return initial_response_text
+            return character_name, initial_response_text
 
         except Exception as e:
-            print(f"Erro ao iniciar novo jogo com a IA: {e}")
-            return "Desculpe, não consegui iniciar um novo jogo no momento. Tente novamente."
+            logger.exception("Erro ao iniciar novo jogo com a IA: %s", e)
+            return (
+                "",
+                "Desculpe, não consegui iniciar um novo jogo no momento. Tente novamente.",
+            )
 
-    def classify_user_input(self, user_input: str) -> str:
+    def classify_user_input(self, user_input: str, usage: LLMUsage = None) -> str:
         """
         Classifica a entrada do usuário como 'guess' (tentativa de adivinhação) ou 'question'.
         Utiliza um LLM separado para uma classificação precisa.
         """
-        classification_prompt_template = PromptTemplate.from_template(
-            "A seguinte entrada do usuário é uma tentativa de adivinhar o personagem "
-            "ou uma pergunta sobre o personagem? Responda APENAS 'guess' ou 'question'."
-            "\n\nEntrada do usuário: '{user_input}'"
-        )
-        classification_chain = (
-            classification_prompt_template | self.llm_classification | StrOutputParser()
-        )
-
         try:
             classification = (
-                classification_chain.invoke({"user_input": user_input}).strip().lower()
+                self._invoke(
+                    self.classification_chain,
+                    {"user_input": user_input},
+                    "classification",
+                    "classification",
+                    usage,
+                )
+                .strip()
+                .lower()
             )
             if classification == "guess":
                 return "guess"
             return "question"
         except Exception as e:
-            print(f"Erro ao classificar entrada do usuário: {e}")
+            logger.warning("Erro ao classificar entrada do usuário: %s", e)
             return "question"  # Padrão para pergunta em caso de erro
 
     def process_player_input(
         self,
         player_input: str,
-        number_attempts_left_session: int,
+        attempts_left: int,
+        character_name: str,
+        theme: str,
+        level: str,
+        chat_history: list,
+        seed: str = "",
+        usage: LLMUsage = None,
     ) -> str:
         """
         Processa a entrada do jogador, interage com a IA e retorna a resposta.
-        Gerencia a contagem de tentativas e verifica o fim do jogo.
+        `attempts_left` já deve refletir a classificação desta entrada, e
+        `chat_history` contém as mensagens anteriores da sessão (ver build_chat_history).
         """
-        # Classifica a entrada do usuário para determinar se é uma tentativa
-        input_type = self.classify_user_input(player_input)
-        print(f"DEBUG Agent: Entrada do usuário classificada como: {input_type}")
-        print(
-            f"DEBUG Agent: Tentativas restantes na sessão: {number_attempts_left_session}"
-        )
-
-        # Decrementa tentativas apenas se for uma tentativa de adivinhação
-        if input_type == "guess":
-            self.attempts_left -= 1
-            print(f"DEBUG Agent: Tentativas restantes: {self.attempts_left}")
-
-        # Adiciona a instrução sobre tentativas restantes ao prompt principal para a IA
-        attempts_instruction_text = (
-            f"Você tem {self.attempts_left} tentativas diretas restantes para adivinhar o personagem. "
-            f"Se o jogador tentar adivinhar e errar, mencione as tentativas restantes. "
-            f"Se as tentativas chegarem a 0 e o jogador não acertou, diga 'Suas tentativas acabaram! O personagem era {self.character_name}.'"
-        )
+        logger.debug("Tentativas restantes na sessão: %s", attempts_left)
 
         # Invoca a cadeia LangChain com a nova entrada do jogador e as instruções atualizadas.
-        agent_response_text = self.chain.invoke(
+        agent_response_text = self._invoke(
+            self.chain,
             {
-                "tema": self.current_theme,
-                "nivel": self.current_level,
-                "character_name": self.character_name,
-                "attempts_instruction": attempts_instruction_text,  # Passa a instrução de tentativas atualizada
+                "tema": theme,
+                "nivel": self.resolve_level(level, seed),
+                "character_name": character_name,
+                "attempts_instruction": self.build_attempts_instruction(
+                    character_name, attempts_left
+                ),  # Passa a instrução de tentativas atualizada
+                "chat_history": chat_history,
                 "input": player_input,
-            }
+            },
+            "llm_call",
+            "chat",
+            usage,
         )
-        agent_response_text = agent_response_text.strip()
+        return agent_response_text.strip()
 
-        # Salva a interação atual na memória.
-        self.memory.save_context(
-            {"input": player_input},
-            {"output": agent_response_text},
+    def generate_extra_hint(
+        self,
+        attempts_left: int,
+        character_name: str,
+        theme: str,
+        level: str,
+        chat_history: list,
+        seed: str = "",
+        usage: LLMUsage = None,
+    ) -> str:
+        """
+        Gera a próxima dica extra da conversa (a que acompanharia um palpite errado),
+        com o mesmo prompt e histórico de process_player_input.
+        """
+        hint = self._invoke(
+            self.chain,
+            {
+                "tema": theme,
+                "nivel": self.resolve_level(level, seed),
+                "character_name": character_name,
+                "attempts_instruction": self.build_attempts_instruction(
+                    character_name, attempts_left
+                ),
+                "chat_history": chat_history,
+                "input": EXTRA_HINT_INPUT,
+            },
+            "llm_call",
+            "speculative_hint",
+            usage,
         )
+        return hint.strip()
 
-        # Heurística para tentar capturar o nome do personagem quando o jogador acerta.
-        if "Sim, você acertou!" in agent_response_text:
-            try:
-                self.character_name = (
-                    agent_response_text.split("Sim, você acertou! Eu sou ")[1]
-                    .replace(".", "")
-                    .strip()
-                )
-            except IndexError:
-                print(
-                    "Aviso: Falha ao extrair o nome do personagem da resposta do agente."
-                )
-                pass
-        elif (
-            "Suas tentativas acabaram!" in agent_response_text
-            or self.attempts_left <= 0
-        ):
-            # Garante que o character_name esteja definido mesmo se as tentativas acabarem
-            if not self.character_name:
-                print(
-                    "Aviso: Tentativas acabaram, mas character_name não foi definido."
-                )
-                # Tenta uma última extração ou define um fallback
-                self.character_name = "Personagem Desconhecido"  # Fallback
-
-        return agent_response_text
-
-    def generate_character_image_prompt(self):
+    def generate_character_image_prompt(self, character_name: str):
         """
         Gera uma consulta de busca para encontrar uma imagem do personagem.
         """
-        if not self.character_name:
+        if not character_name:
             return "personagem desconhecido"
 
         # Adapta o prompt para uma consulta de busca de imagem
-        return f"imagem de {self.character_name}"
+        return f"imagem de {character_name}"
 
     def generate_image(self, prompt_image: str):
         try:
-            results = duckduckgo_search.DDGS().images(
-                keywords=prompt_image,
-                region="us-en",
-                safesearch="moderate",
-                size=None,
-                color=None,
-                type_image="photo",
-                layout=None,
-                license_image=None,
-                max_results=1,
-            )
+            with observe_stage("image_search", "generate_image"):
+                results = duckduckgo_search.DDGS().images(
+                    keywords=prompt_image,
+                    region="us-en",
+                    safesearch="moderate",
+                    size=None,
+                    color=None,
+                    type_image="photo",
+                    layout=None,
+                    license_image=None,
+                    max_results=1,
+                )
             return results[0].get("image", "")
         except IndexError:
-            print(f"Nenhum resultado de imagem foi encontrado para {prompt_image}")
+            logger.info("Nenhum resultado de imagem foi encontrado para %s", prompt_image)
             return ""
         except Exception as err:
-            print(f"Error on gen image result {err}")
+            logger.warning("Erro ao buscar a imagem do personagem: %s", err)
             return ""
+
+
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_game_agent() -> GuessingGameAgent:
+    """
+    Retorna a instância compartilhada do agente, criando-a na primeira chamada.
+    A criação é protegida por lock para que threads concorrentes do worker não
+    instanciem clientes duplicados.
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = GuessingGameAgent()
+    return _agent
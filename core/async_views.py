@@ -0,0 +1,185 @@
+import json
+import logging
+import uuid
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .middleware import authenticate_token
+from .models import GameSession
+from .serializers import (
+    MessageSerializer,
+    StartGameRequestSerializer,
+    StartGameResponseSerializer,
+)
+from .tasks import process_player_message_task, process_start_game_task
+from .utils.idempotency import aclaim_message_submission, arelease_message_submission
+from .utils.log import bind_context
+from .utils.optimistic import aecho_pending_message, areject_pending_message
+from .utils.publisher import apublish
+from .utils.session_state import aseed_state
+from .utils.tracing import annotate_span, span
+
+# Versões assíncronas de StartGameAPIView e AIMessageView (ativadas por ASYNC_API_VIEWS).
+# Rodam no event loop do servidor ASGI: o usuário vem do cache de tokens JWT verificados,
+# o Redis é acessado com redis.asyncio e a publicação no Celery vai para um executor
+# dedicado, em vez de cada requisição ocupar uma thread do pool síncrono do Django.
+# Aceitam apenas autenticação Bearer (JWT), como o frontend usa.
+
+logger = logging.getLogger(__name__)
+
+
+async def _authenticate(request):
+    """Retorna o usuário do cabeçalho Authorization: Bearer <token>, ou None."""
+    header = request.headers.get("Authorization", "")
+    scheme, _, raw_token = header.partition(" ")
+    if scheme != "Bearer" or not raw_token:
+        return None
+    user, _ = await authenticate_token(raw_token.strip())
+    return user if user.is_authenticated else None
+
+
+def _unauthorized():
+    return JsonResponse(
+        {"detail": "As credenciais de autenticação não foram fornecidas."},
+        status=401,
+        headers={"WWW-Authenticate": 'Bearer realm="api"'},
+    )
+
+
+def _parse_body(request):
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+
+
+@csrf_exempt
+@require_POST
+async def start_game_view(request):
+    """
+    Inicia um novo jogo: cria a sessão, publica o estado no cache e enfileira
+    process_start_game_task. Retorna o session_id.
+    """
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized()
+
+    data = _parse_body(request)
+    if data is None:
+        return JsonResponse({"detail": "JSON inválido."}, status=400)
+    serializer = StartGameRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    theme = serializer.validated_data["theme"]
+    level = serializer.validated_data["level"]
+    session_id = str(uuid.uuid4())
+    bind_context(session_id=session_id, user_id=user.id)
+    annotate_span(session_id=session_id)
+    logger.debug("Recebida requisição para iniciar jogo (%s/%s).", theme, level)
+
+    try:
+        with span("create_session"):
+            game_session = await GameSession.objects.acreate(
+                session_id=session_id,
+                theme=theme,
+                level=level,
+                user=user,
+            )
+            await aseed_state(game_session)
+    except Exception as e:
+        logger.exception("Erro ao criar GameSession: %s", e)
+        return JsonResponse(
+            {"error": f"Erro ao criar sessão de jogo: {str(e)}"}, status=500
+        )
+
+    with span("publish"):
+        await apublish(process_start_game_task, session_id, theme, level, user.id)
+    logger.debug("Tarefa 'process_start_game_task' enfileirada.")
+
+    response_serializer = StartGameResponseSerializer({"session_id": session_id})
+    return JsonResponse(response_serializer.data, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def message_view(request):
+    """
+    Recebe uma mensagem do jogador, ecoa a mensagem provisória ao grupo da sessão e
+    enfileira process_player_message_task.
+    Não acessa o banco: a verificação de dono da sessão é feita pela tarefa.
+    """
+    user = await _authenticate(request)
+    if user is None:
+        return _unauthorized()
+
+    data = _parse_body(request)
+    if data is None:
+        return JsonResponse({"detail": "JSON inválido."}, status=400)
+    serializer = MessageSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    session_id = serializer.validated_data["session_id"]
+    player_message = serializer.validated_data["message"]
+    client_message_id = serializer.validated_data.get("client_message_id")
+    bind_context(
+        session_id=session_id, user_id=user.id, client_message_id=client_message_id
+    )
+    annotate_span(session_id=session_id)
+    logger.debug("Recebida mensagem: '%.50s'", player_message)
+
+    ack = {"status": "Mensagem recebida e encaminhada."}
+    if client_message_id:
+        ack["client_message_id"] = client_message_id
+        original_ack = await aclaim_message_submission(
+            user.id, session_id, client_message_id, ack
+        )
+        if original_ack is not None:
+            logger.debug("Mensagem duplicada; ignorando.")
+            return JsonResponse(original_ack, status=200)
+
+    provisional_id = client_message_id or str(uuid.uuid4())
+    echoed = False
+    try:
+        with span("echo"):
+            echoed = await aecho_pending_message(
+                session_id,
+                user.id,
+                provisional_id,
+                player_message,
+                player=user.username,
+            )
+    except Exception as e:
+        logger.warning("Falha no eco provisório da mensagem: %s", e)
+
+    try:
+        with span("publish"):
+            await apublish(
+                process_player_message_task,
+                session_id,
+                player_message,
+                user.id,
+                client_message_id,
+                provisional_id,
+            )
+    except Exception as e:
+        logger.exception("Erro ao enfileirar a mensagem: %s", e)
+        error = "Não foi possível enviar a mensagem. Tente novamente."
+        # Sem a tarefa, o reenvio precisa ser processado, não só confirmado.
+        if client_message_id:
+            await arelease_message_submission(user.id, session_id, client_message_id)
+        # Remove o eco provisório e o indicador "pensando" do cliente.
+        if echoed:
+            try:
+                await areject_pending_message(session_id, provisional_id, error)
+            except Exception as e:
+                logger.warning("Falha ao rejeitar o eco provisório: %s", e)
+        return JsonResponse(
+            {"error": error},
+            status=503,
+        )
+    logger.debug("Tarefa 'process_player_message_task' enfileirada.")
+    return JsonResponse(ack, status=200)
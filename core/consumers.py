@@ -1,7 +1,28 @@
+import asyncio
 import json
+import logging
+from collections import Counter
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import GameSession
+from django.conf import settings
+from .utils.event_log import parse_event_id, read_events_after
+from .utils import profiling, rooms
+from .utils.log import bind_context, log_context
+from .utils.metrics import WS_CLOSED, WS_CONNECTIONS_OPEN, WS_GROUPS_ACTIVE
+from .utils.session_state import load_state
+from .utils.tracing import TRACEPARENT_KEY, span
+from .utils.wire_format import encode, select_subprotocol
+
+logger = logging.getLogger(__name__)
+
+# Código de fechamento usado quando o socket fica sem eventos do jogo por WS_IDLE_TIMEOUT.
+# O cliente não reconecta sozinho; reabre a conexão (com replay) quando o jogador age.
+CLOSE_CODE_IDLE = 4000
+
+# Conexões deste processo por grupo de sessão (alimenta o gauge de grupos ativos).
+_local_group_members = Counter()
 
 
 class GameConsumer(AsyncWebsocketConsumer):
@@ -9,76 +30,277 @@ class GameConsumer(AsyncWebsocketConsumer):
     Consumer WebSocket para lidar com a lógica do jogo de adivinhação.
     Agora, principalmente gerencia a conexão WebSocket e envia mensagens para o frontend.
     A lógica pesada é delegada às tarefas Celery.
+    O servidor envia pings da aplicação e fecha conexões sem pong, ociosas ou de jogos
+    já encerrados (após WS_GAME_OVER_GRACE), liberando o socket e a entrada do grupo.
+    Os eventos do jogo têm um event_id do log da sessão (core.utils.event_log); ao
+    conectar com ?last_event_id=<id>, o consumer reenvia os eventos posteriores.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.game_session = None
+        self.game_state = None
+        # Último evento enviado a este socket; eventos do grupo com ID menor ou
+        # igual já foram entregues pelo replay e são descartados.
+        self.last_event_id = None
+        # Formato dos quadros negociado no handshake (core.utils.wire_format).
+        self.subprotocol = None
+        self.joined_group = False
+        self.last_activity = 0.0
+        self.last_pong = 0.0
+        self.heartbeat_task = None
+        self.game_over_close_task = None
 
     async def connect(self):
         self.session_id = self.scope["url_route"]["kwargs"]["session_id"]
         self.room_group_name = f"game_{self.session_id}"
 
-        print(f"DEBUG Consumer: Conectando WebSocket para session_id={self.session_id}")
-
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-
-        await self.accept()
+        # O consumer roda em uma task própria: o contexto vale para toda a conexão.
+        user = self.scope.get("user")
+        bind_context(
+            session_id=self.session_id,
+            user_id=user.id if user and user.is_authenticated else None,
+        )
+        logger.debug("Conectando WebSocket.")
 
-        self.game_session = await self.get_game_session_sync(self.session_id)
+        self.game_state = await self.get_game_state_sync(self.session_id)
 
-        if not self.game_session:
-            print(
-                f"DEBUG Consumer: GameSession {self.session_id} NÃO encontrada. Fechando conexão."
-            )
-            await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "system_message",
-                        "message": "Sessão de jogo não encontrada. Por favor, inicie um novo jogo via API /api/start_game/.",
-                    }
-                )
-            )
-            await self.close()
+        # Apenas o dono da sessão (ou, nas salas, os participantes) pode acompanhá-la;
+        # a conexão é recusada no handshake.
+        if self.game_state and not await self.user_can_follow_session():
+            logger.warning("Usuário sem permissão para a sessão. Conexão recusada.")
+            await self.close(code=4403)
             return
 
-        print(
-            f"DEBUG Consumer: GameSession {self.game_session.session_id} encontrada. Conexão aceita."
-        )
-        await self.send(
-            text_data=json.dumps(
+        self.subprotocol = select_subprotocol(self.scope.get("subprotocols"))
+        await self.accept(subprotocol=self.subprotocol)
+
+        if not self.game_state:
+            logger.debug("GameSession não encontrada. Fechando conexão.")
+            await self.send_payload(
                 {
                     "type": "system_message",
-                    "message": f"Conectado à sessão {self.session_id}.",
+                    "message": "Sessão de jogo não encontrada. Por favor, inicie um novo jogo via API /api/start_game/.",
                 }
             )
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        self.track_group_join()
+        self.last_activity = self.last_pong = asyncio.get_running_loop().time()
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        logger.debug("GameSession encontrada. Conexão aceita.")
+        await self.send_payload(
+            {
+                "type": "system_message",
+                "message": f"Conectado à sessão {self.session_id}.",
+            }
         )
         # Envia as tentativas restantes atuais ao conectar, caso a sessão já exista
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "update_attempts",
-                    "attempts_left": self.game_session.attempts_left,
-                }
-            )
+        await self.send_payload(
+            {
+                "type": "update_attempts",
+                "attempts_left": self.game_state["attempts_left"],
+            }
         )
 
-    async def disconnect(self, close_code):
-        print(
-            f"DEBUG Consumer: Desconectando WebSocket para session_id={self.session_id}"
+        # Nas salas, o placar e a vez atuais (o log pode já ter descartado os antigos).
+        if rooms.is_room(self.game_state):
+            await self.send_payload(await self.get_room_update_sync())
+
+        # Reenvia os eventos que o cliente ainda não viu (ex.: a primeira dica enviada
+        # antes de o socket abrir, ou eventos perdidos durante uma queda de conexão).
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        last_event_id = query.get("last_event_id", [""])[0]
+        if parse_event_id(last_event_id):
+            self.last_event_id = last_event_id
+        missed_events = await self.get_events_after_sync(self.session_id, last_event_id)
+        if missed_events:
+            logger.debug("Reenviando %d eventos.", len(missed_events))
+        for event in missed_events:
+            handler = getattr(self, event.get("type", ""), None)
+            if handler is not None:
+                await handler(event)
+
+    async def dispatch(self, message):
+        """
+        Com o profiler ligado (core.utils.profiling), uma amostra dos handlers é perfilada.
+        """
+        if not profiling.should_profile():
+            return await self.dispatch_traced(message)
+        profiling.start_task_profile(
+            "consumer",
+            f"GameConsumer.{message['type'].replace('.', '_')}",
+            self.scope["url_route"]["kwargs"].get("session_id"),
         )
+        try:
+            return await self.dispatch_traced(message)
+        finally:
+            profiling.stop_task_profile()
+
+    async def dispatch_traced(self, message):
+        """
+        Eventos do grupo enviados dentro de um trace (core.utils.tracing) são tratados
+        em um span filho; a diferença para o span de broadcast é o salto no channel layer.
+        """
+        traceparent = message.get(TRACEPARENT_KEY)
+        if not traceparent:
+            return await super().dispatch(message)
+        with span(f"ws {message['type']}", parent=traceparent) as event_span:
+            if event_span is None:
+                return await super().dispatch(message)
+            with log_context(trace_id=event_span.trace_id):
+                return await super().dispatch(message)
+
+    async def user_can_follow_session(self):
+        """Dono da sessão ou, em uma sala multijogador, um participante (lido do Redis)."""
+        if not rooms.is_room(self.game_state):
+            return self.user_owns_session()
+        user = self.scope.get("user")
+        return bool(
+            user
+            and user.is_authenticated
+            and await rooms.ais_member(self.session_id, user.id)
+        )
+
+    def user_owns_session(self):
+        """
+        Indica se o usuário autenticado no handshake (JWT ou sessão) é o dono da sessão.
+        Sessões sem dono continuam abertas a qualquer conexão.
+        """
+        owner_id = self.game_state.get("user_id")
+        if owner_id is None:
+            return True
+        user = self.scope.get("user")
+        return bool(user and user.is_authenticated and user.id == owner_id)
+
+    def track_group_join(self):
+        self.joined_group = True
+        WS_CONNECTIONS_OPEN.inc()
+        _local_group_members[self.room_group_name] += 1
+        if _local_group_members[self.room_group_name] == 1:
+            WS_GROUPS_ACTIVE.inc()
+
+    def track_group_leave(self):
+        self.joined_group = False
+        WS_CONNECTIONS_OPEN.dec()
+        _local_group_members[self.room_group_name] -= 1
+        if _local_group_members[self.room_group_name] <= 0:
+            del _local_group_members[self.room_group_name]
+            WS_GROUPS_ACTIVE.dec()
+
+    async def disconnect(self, close_code):
+        logger.debug("Desconectando WebSocket (código %s).", close_code)
+        for task in (self.heartbeat_task, self.game_over_close_task):
+            if task and task is not asyncio.current_task():
+                task.cancel()
+        if self.joined_group:
+            self.track_group_leave()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-    async def receive(self, text_data):
-        pass
+    async def close_with_reason(self, reason, code):
+        logger.debug("Fechando WebSocket (%s).", reason)
+        WS_CLOSED.labels(reason=reason).inc()
+        await self.close(code=code)
+
+    async def heartbeat(self):
+        """
+        Envia pings periódicos, fecha a conexão sem pong há dois intervalos ou sem
+        eventos do jogo há WS_IDLE_TIMEOUT, e renova a entrada do grupo no channel layer
+        (que expira em WS_GROUP_EXPIRY segundos se o processo morrer sem group_discard).
+        """
+        interval = settings.WS_PING_INTERVAL
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            now = loop.time()
+            try:
+                if now - self.last_pong > 2 * interval:
+                    await self.close_with_reason("heartbeat_timeout", 1001)
+                    return
+                if now - self.last_activity > settings.WS_IDLE_TIMEOUT:
+                    await self.close_with_reason("idle", CLOSE_CODE_IDLE)
+                    return
+                await self.send_payload({"type": "ping"})
+                await self.channel_layer.group_add(
+                    self.room_group_name, self.channel_name
+                )
+            except Exception as e:
+                logger.error("Falha no heartbeat: %s", e)
+                return
+
+    async def close_after_game_over(self):
+        await asyncio.sleep(settings.WS_GAME_OVER_GRACE)
+        await self.close_with_reason("game_over", 1000)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Qualquer quadro do cliente prova que a conexão está viva.
+        now = asyncio.get_running_loop().time()
+        self.last_pong = now
+        try:
+            message = json.loads(text_data or bytes_data or "{}")
+        except ValueError:
+            return
+        message_type = message.get("type") if isinstance(message, dict) else None
+        if message_type == "ping":
+            await self.send_payload({"type": "pong"})
+        elif message_type != "pong":
+            self.last_activity = now
+
+    async def send_payload(self, payload):
+        """Envia um evento ao cliente no formato negociado (JSON, JSON compacto ou MessagePack)."""
+        text_data, bytes_data = encode(payload, self.subprotocol)
+        await self.send(text_data=text_data, bytes_data=bytes_data)
+
+    async def send_event(self, event, payload):
+        """
+        Envia um evento do log ao cliente com o seu event_id, descartando
+        eventos já entregues por este socket.
+        """
+        event_id = event.get("event_id")
+        if event_id:
+            if self.last_event_id and parse_event_id(event_id) <= parse_event_id(
+                self.last_event_id
+            ):
+                return
+            self.last_event_id = event_id
+            payload["event_id"] = event_id
+        self.last_activity = asyncio.get_running_loop().time()
+        await self.send_payload(payload)
 
     async def chat_message(self, event):
         message = event["message"]
         sender = event["sender"]
-        await self.send(
-            text_data=json.dumps(
-                {"type": "chat_message", "sender": sender, "message": message}
-            )
+        payload = {"type": "chat_message", "sender": sender, "message": message}
+        # Confirmação de um eco otimista (ver core.utils.optimistic)
+        if event.get("provisional_id"):
+            payload["provisional_id"] = event["provisional_id"]
+        # Salas: quem enviou e se a resposta foi reaproveitada de uma pergunta repetida.
+        for field in ("player", "duplicate"):
+            if event.get(field):
+                payload[field] = event[field]
+        await self.send_event(event, payload)
+
+    async def message_pending(self, event):
+        # Eco provisório enviado pela API; fora do log da sessão, sem event_id.
+        payload = {
+            "type": "message_pending",
+            "provisional_id": event["provisional_id"],
+            "sender": event["sender"],
+            "message": event["message"],
+        }
+        if event.get("player"):
+            payload["player"] = event["player"]
+        await self.send_event(event, payload)
+
+    async def message_rejected(self, event):
+        await self.send_event(
+            event,
+            {
+                "type": "message_rejected",
+                "provisional_id": event["provisional_id"],
+                "message": event["message"],
+            },
         )
 
     async def game_over(self, event):
@@ -89,34 +311,65 @@ class GameConsumer(AsyncWebsocketConsumer):
             "character_image_url"
         )  # NOVO: Recebe a URL da imagem
 
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "game_over",
-                    "message": message,
-                    "score": score,
-                    "character_name": character_name,
-                    "character_image_url": character_image_url,  # NOVO: Envia a URL da imagem para o frontend
-                }
-            )
-        )
+        payload = {
+            "type": "game_over",
+            "message": message,
+            "score": score,
+            "character_name": character_name,
+            "character_image_url": character_image_url,  # NOVO: Envia a URL da imagem para o frontend
+        }
+        if "standings" in event:
+            payload["standings"] = event["standings"]  # Placar final da sala
+        await self.send_event(event, payload)
+        # Jogo encerrado: mantém o socket por um período de carência e fecha.
+        if self.game_over_close_task is None:
+            self.game_over_close_task = asyncio.create_task(self.close_after_game_over())
 
     async def error(self, event):
         message = event["message"]
-        await self.send(text_data=json.dumps({"type": "error", "message": message}))
+        await self.send_event(event, {"type": "error", "message": message})
 
     async def update_attempts(self, event):
         attempts_left = event["attempts_left"]
-        await self.send(
-            text_data=json.dumps(
-                {"type": "update_attempts", "attempts_left": attempts_left}
-            )
+        await self.send_event(
+            event, {"type": "update_attempts", "attempts_left": attempts_left}
+        )
+
+    async def room_update(self, event):
+        await self.send_event(
+            event,
+            {
+                "type": "room_update",
+                "mode": event["mode"],
+                "players": event["players"],
+                "turn_user_id": event["turn_user_id"],
+            },
         )
 
+    # Eventos que podem chegar agrupados em um event_batch (ver _broadcast_batch_sync).
+    BATCHED_EVENT_TYPES = frozenset(
+        ("chat_message", "update_attempts", "room_update", "game_over", "error")
+    )
+
+    async def event_batch(self, event):
+        """Eventos de um turno enviados ao grupo em um único group_send."""
+        for inner in event["events"]:
+            if inner.get("type") in self.BATCHED_EVENT_TYPES:
+                await getattr(self, inner["type"])(inner)
+
     @database_sync_to_async
-    def get_game_session_sync(self, session_id):
-        try:
-            session = GameSession.objects.get(session_id=session_id)
-            return session
-        except GameSession.DoesNotExist:
-            return None
+    def get_game_state_sync(self, session_id):
+        # Lê o estado do cache Redis; só consulta o banco se o estado não estiver em cache.
+        return load_state(session_id)
+
+    @sync_to_async
+    def get_room_update_sync(self):
+        # Um pipeline no Redis (participantes, ordem e placar), sem consultar o banco.
+        return rooms.room_update_event(
+            rooms.load_room(self.session_id, self.game_state["mode"])
+        )
+
+    @sync_to_async
+    def get_events_after_sync(self, session_id, last_event_id):
+        # Uma leitura (XRANGE) do stream da sessão, sem consultar o banco.
+        return read_events_after(session_id, last_event_id)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.utils.transcripts import archive_completed_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta as mensagens das sessões concluídas há mais que o período de "
+        "retenção em GameSession.transcript (o mesmo trabalho da tarefa periódica)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.CHAT_ARCHIVE_RETENTION_DAYS,
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.CHAT_ARCHIVE_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Máximo de sessões a arquivar."
+        )
+
+    def handle(self, *args, **options):
+        sessions, messages = archive_completed_sessions(
+            options["retention_days"],
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+        )
+        self.stdout.write(
+            f"{sessions} sessões arquivadas ({messages} mensagens compactadas)."
+        )
@@ -0,0 +1,129 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from django.urls import path
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app.celery import app as celery_app
+from core import async_views
+from core.models import GameSession
+from core.views import AIMessageView, StartGameAPIView
+
+# Fila própria do benchmark: as tarefas publicadas não chegam aos workers e são
+# descartadas ao final.
+BENCH_QUEUE = "whoami_bench_api"
+
+# URLconf usada pelo benchmark (override de ROOT_URLCONF), com as duas versões lado a lado.
+urlpatterns = [
+    path("sync/new/game/", StartGameAPIView.as_view()),
+    path("sync/message/", AIMessageView.as_view()),
+    path("async/new/game/", async_views.start_game_view),
+    path("async/message/", async_views.message_view),
+]
+
+
+async def _load(client, url, body_factory, headers, total, concurrency):
+    """Dispara `total` POSTs com até `concurrency` em andamento; retorna latências e erros."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                url, body_factory(i), content_type="application/json", headers=headers
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(total)])
+    return latencies, time.perf_counter() - start, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara requisições/s das views síncronas (DRF) e assíncronas de início de jogo "
+        "e envio de mensagem, chamando o app ASGI do Django em processo com N requisições "
+        "simultâneas. As tarefas vão para uma fila própria, descartada ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        celery_app.conf.task_routes = {"*": {"queue": BENCH_QUEUE}}
+        user, _ = User.objects.get_or_create(username="bench-api")
+        token = str(AccessToken.for_user(user))
+        session_id = f"bench-api-{uuid.uuid4()}"
+        GameSession.objects.create(
+            session_id=session_id, theme="Filmes", level="Facil", user=user
+        )
+
+        try:
+            with override_settings(ROOT_URLCONF=__name__):
+                results = asyncio.run(self._run_all(token, session_id, options))
+        finally:
+            GameSession.objects.filter(user=user).delete()
+            user.delete()
+            with celery_app.connection_for_write() as connection:
+                purged = connection.default_channel.queue_purge(BENCH_QUEUE)
+            self.stdout.write(f"Tarefas descartadas da fila {BENCH_QUEUE}: {purged}")
+
+        self.stdout.write(
+            f"{options['requests']} requisições, {options['concurrency']} simultâneas"
+        )
+        self.stdout.write(
+            f"{'endpoint':<28}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'erros':>8}"
+        )
+        for label, (latencies, elapsed, errors) in results:
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f"{label:<28}{len(latencies) / elapsed:>10.1f}"
+                f"{statistics.median(latencies) * 1000:>10.2f}{p99 * 1000:>10.2f}{errors:>8}"
+            )
+
+    async def _run_all(self, token, session_id, options):
+        client = AsyncClient()
+        headers = {"Authorization": f"Bearer {token}"}
+        total, concurrency = options["requests"], options["concurrency"]
+
+        def start_body(i):
+            return {"theme": "Filmes", "level": "Facil"}
+
+        def message_body(i):
+            return {
+                "session_id": session_id,
+                "message": f"O personagem é humano? ({i})",
+                "client_message_id": str(uuid.uuid4()),
+            }
+
+        results = []
+        for mode in ("sync", "async"):
+            for name, body in (("new/game", start_body), ("message", message_body)):
+                # Aquecimento: conexões, caches de token e imports.
+                await _load(client, f"/{mode}/{name}/", body, headers, 10, 5)
+                results.append(
+                    (
+                        f"{mode} /api/{name}/",
+                        await _load(
+                            client,
+                            f"/{mode}/{name}/",
+                            body,
+                            headers,
+                            total,
+                            concurrency,
+                        ),
+                    )
+                )
+        return results
@@ -0,0 +1,169 @@
+import asyncio
+import statistics
+import time
+
+from channels_redis.core import RedisChannelLayer
+from channels_redis.pubsub import RedisPubSubChannelLayer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _layer_options(hosts, shard_hosts):
+    """Configurações comparadas: (rótulo, classe, kwargs)."""
+    options = [
+        ("redis (padrão)", RedisChannelLayer, {"hosts": hosts}),
+        (
+            "redis (ajustado)",
+            RedisChannelLayer,
+            {
+                "hosts": hosts,
+                "capacity": settings.CHANNEL_LAYER_CAPACITY,
+                "expiry": settings.CHANNEL_LAYER_EXPIRY,
+                "group_expiry": settings.WS_GROUP_EXPIRY,
+            },
+        ),
+        ("pubsub", RedisPubSubChannelLayer, {"hosts": hosts}),
+    ]
+    if shard_hosts:
+        options += [
+            (
+                f"redis ajustado ({len(shard_hosts)} shards)",
+                RedisChannelLayer,
+                {
+                    "hosts": shard_hosts,
+                    "capacity": settings.CHANNEL_LAYER_CAPACITY,
+                    "expiry": settings.CHANNEL_LAYER_EXPIRY,
+                    "group_expiry": settings.WS_GROUP_EXPIRY,
+                },
+            ),
+            (
+                f"pubsub ({len(shard_hosts)} shards)",
+                RedisPubSubChannelLayer,
+                {"hosts": shard_hosts},
+            ),
+        ]
+    return options
+
+
+async def _run(layer, groups, receivers, messages, concurrency):
+    """
+    Cria `groups` grupos com `receivers` canais cada (como sockets de um jogo),
+    envia `messages` eventos por grupo e mede a latência de cada entrega.
+    Até `concurrency` group_send ficam em andamento ao mesmo tempo (como tarefas
+    Celery publicando em paralelo), dentro do limite do pool de conexões do Redis.
+    Retorna (latências em segundos, tempo total, entregas perdidas).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(group, i):
+        async with semaphore:
+            await layer.group_send(
+                group,
+                {
+                    "type": "chat_message",
+                    "sender": "ai",
+                    "message": f"Dica {i}: o personagem usa uma capa preta.",
+                    "sent_at": time.perf_counter(),
+                },
+            )
+
+    group_channels = {}
+    for g in range(groups):
+        group = f"bench_{g}"
+        group_channels[group] = []
+        for _ in range(receivers):
+            channel = await layer.new_channel()
+            await layer.group_add(group, channel)
+            group_channels[group].append(channel)
+
+    latencies = []
+    expected = messages
+
+    async def receive_all(channel):
+        for _ in range(expected):
+            message = await layer.receive(channel)
+            latencies.append(time.perf_counter() - message["sent_at"])
+
+    receivers_tasks = [
+        asyncio.create_task(receive_all(channel))
+        for channels in group_channels.values()
+        for channel in channels
+    ]
+    # Garante que as assinaturas (pubsub) estejam ativas antes de enviar.
+    await asyncio.sleep(0.2)
+
+    start = time.perf_counter()
+    for i in range(messages):
+        await asyncio.gather(*[send(group, i) for group in group_channels])
+    _, pending = await asyncio.wait(receivers_tasks, timeout=30)
+    elapsed = time.perf_counter() - start
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*receivers_tasks, return_exceptions=True)
+
+    for group, channels in group_channels.items():
+        for channel in channels:
+            await layer.group_discard(group, channel)
+    if hasattr(layer, "flush"):
+        await layer.flush()
+    lost = groups * receivers * messages - len(latencies)
+    return latencies, elapsed, lost
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência de fan-out e vazão do group_send para cada opção de channel "
+        "layer (RedisChannelLayer padrão e ajustado, Pub/Sub e, opcionalmente, sharding)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--groups", type=int, default=200)
+        parser.add_argument(
+            "--receivers", type=int, default=2, help="Sockets por grupo (sessão)."
+        )
+        parser.add_argument("--messages", type=int, default=20)
+        parser.add_argument(
+            "--concurrency", type=int, default=20, help="group_send simultâneos."
+        )
+        parser.add_argument(
+            "--hosts",
+            default=",".join(settings.CHANNEL_LAYER_HOSTS),
+            help="Redis usado pelas opções sem sharding (URLs separadas por vírgula).",
+        )
+        parser.add_argument(
+            "--shard-hosts",
+            default="",
+            help="URLs Redis separadas por vírgula para testar sharding (ex.: duas portas locais).",
+        )
+
+    def handle(self, *args, **options):
+        hosts = [h for h in options["hosts"].split(",") if h]
+        shard_hosts = [h for h in options["shard_hosts"].split(",") if h]
+        groups, receivers, messages = (
+            options["groups"],
+            options["receivers"],
+            options["messages"],
+        )
+        self.stdout.write(
+            f"{groups} grupos x {receivers} sockets, {messages} eventos por grupo "
+            f"({groups * receivers * messages} entregas)"
+        )
+        self.stdout.write(
+            f"{'opção':<32}{'entregas/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'perdidas':>10}"
+        )
+        for label, layer_class, kwargs in _layer_options(hosts, shard_hosts):
+            # Prefixo próprio: o flush ao final não toca nos canais da aplicação.
+            layer = layer_class(prefix="whoami_bench", **kwargs)
+            latencies, elapsed, lost = asyncio.run(
+                _run(layer, groups, receivers, messages, options["concurrency"])
+            )
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000 if latencies else 0.0
+            p99 = (
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                if latencies
+                else 0.0
+            )
+            self.stdout.write(
+                f"{label:<32}{len(latencies) / elapsed:>12.0f}{p50:>10.2f}{p99:>10.2f}{lost:>10}"
+            )
@@ -0,0 +1,106 @@
+import multiprocessing
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+
+from core.models import ChatMessage, GameSession
+
+
+def _writer(session_pk, messages, results):
+    """
+    Processo escritor: grava mensagens e atualiza contadores como um turno do jogo.
+    """
+    connections.close_all()
+    latencies = []
+    errors = 0
+    for i in range(messages):
+        start = time.perf_counter()
+        try:
+            ChatMessage.objects.create(
+                session_id=session_pk, sender="user", message_text=f"Mensagem {i}"
+            )
+            GameSession.objects.filter(pk=session_pk).update(
+                user_message_count=F("user_message_count") + 1
+            )
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    connections.close_all()
+    results.put((latencies, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a contenção de escrita no banco configurado: N processos gravando "
+        "mensagens de chat ao mesmo tempo, como o Daphne e os workers Celery."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--messages", type=int, default=500)
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        messages = options["messages"]
+
+        self._describe_database()
+        sessions = [
+            GameSession.objects.create(
+                session_id=f"bench-{uuid.uuid4()}", theme="Filmes", level="Facil"
+            )
+            for _ in range(workers)
+        ]
+        connections.close_all()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=_writer, args=(session.pk, messages, results)
+            )
+            for session in sessions
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(lat for lats, _ in collected for lat in lats)
+        errors = sum(errs for _, errs in collected)
+        GameSession.objects.filter(pk__in=[s.pk for s in sessions]).delete()
+
+        self.stdout.write(f"Escritores: {workers} x {messages} turnos")
+        self.stdout.write(f"Tempo total: {elapsed:.2f}s")
+        self.stdout.write(f"Turnos/s: {len(latencies) / elapsed:.1f}")
+        self.stdout.write(f"Erros 'database is locked': {errors}")
+        if latencies:
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f"Latência p50: {statistics.median(latencies) * 1000:.2f} ms, "
+                f"p99: {p99 * 1000:.2f} ms, máx: {latencies[-1] * 1000:.2f} ms"
+            )
+
+    def _describe_database(self):
+        settings_dict = connection.settings_dict
+        self.stdout.write(f"Banco: {connection.vendor} ({settings_dict['NAME']})")
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute("PRAGMA synchronous")
+                synchronous = cursor.fetchone()[0]
+                cursor.execute("PRAGMA busy_timeout")
+                busy_timeout = cursor.fetchone()[0]
+            self.stdout.write(
+                f"journal_mode={journal_mode} synchronous={synchronous} "
+                f"busy_timeout={busy_timeout}ms"
+            )
+        elif settings_dict.get("OPTIONS", {}).get("pool"):
+            self.stdout.write(f"Pool: {settings_dict['OPTIONS']['pool']}")
@@ -0,0 +1,64 @@
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+PAGES = {
+    "jogo": "frontend/game.html",
+    "login": "frontend/login.html",
+    "registro": "frontend/signup.html",
+}
+_ASSET_URL = re.compile(r'(?:href|src)="' + re.escape(settings.STATIC_URL) + r'([^"]+)"')
+
+
+def _size(path):
+    return os.path.getsize(path) if path and os.path.isfile(path) else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Relatório de peso das páginas do frontend: bytes dos assets locais antes do "
+        "pipeline (originais, sem compressão) e depois (minificados, .gz e .br), e "
+        "requisições na segunda visita. Requer STATIC_PIPELINE=1 e collectstatic."
+    )
+
+    def handle(self, *args, **options):
+        if not settings.STATIC_PIPELINE:
+            raise CommandError(
+                "Execute com STATIC_PIPELINE=1, depois de "
+                "'STATIC_PIPELINE=1 python manage.py collectstatic'."
+            )
+        original_names = {
+            hashed: name for name, hashed in staticfiles_storage.hashed_files.items()
+        }
+        if not original_names:
+            raise CommandError("Manifesto vazio: execute o collectstatic primeiro.")
+
+        self.stdout.write(
+            f"{'página':<10}{'assets':>7}{'original':>10}{'minif.':>9}{'gzip':>8}"
+            f"{'brotli':>8}{'2ª visita antes':>17}{'2ª visita depois':>18}"
+        )
+        for page, template in PAGES.items():
+            html = render_to_string(template, request=RequestFactory().get("/"))
+            assets = _ASSET_URL.findall(html)
+            original = minified = gzip = brotli = 0
+            for hashed_name in assets:
+                name = original_names.get(hashed_name, hashed_name)
+                built = staticfiles_storage.path(hashed_name)
+                original += _size(finders.find(name)) or 0
+                minified += _size(built) or 0
+                gzip += _size(built + ".gz") or _size(built) or 0
+                brotli += (
+                    _size(built + ".br") or _size(built + ".gz") or _size(built) or 0
+                )
+            # Antes: sem Cache-Control, cada asset é revalidado (ou baixado de novo).
+            # Depois: nomes com hash e cache imutável, nenhuma requisição.
+            self.stdout.write(
+                f"{page:<10}{len(assets):>7}{original:>10}{minified:>9}{gzip:>8}"
+                f"{brotli:>8}{f'{len(assets)} req.':>17}{'0 req.':>18}"
+            )
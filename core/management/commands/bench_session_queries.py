@@ -0,0 +1,193 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import ChatMessage, GameSession
+from core.tasks import _get_last_characters_name_sync
+
+THEMES = ["Filmes", "Series", "Historia", "Ciencia", "Esportes", "Musica"]
+LEVELS = ["Facil", "Medio", "Dificil", "Aleatorio"]
+INDEXES = ("gamesession_recent_chars_idx", "chatmessage_session_sender_idx")
+
+
+class _Rollback(Exception):
+    """Usada para desfazer os dados sintéticos ao final do benchmark."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula sessões sintéticas dentro de uma transação (desfeita ao final) e "
+        "mostra planos e tempos das consultas de últimos personagens e de pontuação, "
+        "com e sem os índices compostos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument(
+            "--messages-per-session",
+            type=int,
+            default=6,
+            help="Mensagens criadas para cada sessão de --message-sessions.",
+        )
+        parser.add_argument(
+            "--message-sessions",
+            type=int,
+            default=100_000,
+            help="Quantas sessões recebem mensagens.",
+        )
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                users, sessions = self._populate(options)
+                self._run_queries("com índices", users, sessions, options)
+                with connection.cursor() as cursor:
+                    for name in INDEXES:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+                self._run_queries("sem índices", users, sessions, options)
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write("Dados sintéticos e alterações de índice desfeitos.")
+
+    def _populate(self, options):
+        rng = random.Random(42)
+        start = time.perf_counter()
+        batch_size = options["batch_size"]
+
+        prefix = uuid.uuid4().hex[:8]
+        User.objects.bulk_create(
+            [User(username=f"bench-{prefix}-{i}") for i in range(options["users"])],
+            batch_size=batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=f"bench-{prefix}-").values_list(
+                "id", flat=True
+            )
+        )
+
+        now = timezone.now()
+        pending = []
+        for i in range(options["sessions"]):
+            end_time = now - timedelta(minutes=rng.randint(0, 525_600))
+            pending.append(
+                GameSession(
+                    user_id=rng.choice(user_ids),
+                    session_id=f"bench-{prefix}-{i}",
+                    theme=rng.choice(THEMES),
+                    level=rng.choice(LEVELS),
+                    character_name=f"Personagem {rng.randint(0, 5_000)}",
+                    is_completed=True,
+                    end_time=end_time,
+                )
+            )
+            if len(pending) >= batch_size:
+                GameSession.objects.bulk_create(pending)
+                pending = []
+        if pending:
+            GameSession.objects.bulk_create(pending)
+
+        session_pks = list(
+            GameSession.objects.filter(session_id__startswith=f"bench-{prefix}-")
+            .order_by("?")
+            .values_list("pk", flat=True)[: options["message_sessions"]]
+        )
+        pending = []
+        for session_pk in session_pks:
+            for j in range(options["messages_per_session"]):
+                pending.append(
+                    ChatMessage(
+                        session_id=session_pk,
+                        sender="user" if j % 2 else "ai",
+                        message_text="Mensagem de benchmark",
+                    )
+                )
+                if len(pending) >= batch_size:
+                    ChatMessage.objects.bulk_create(pending)
+                    pending = []
+        if pending:
+            ChatMessage.objects.bulk_create(pending)
+
+        self.stdout.write(
+            f"Populado: {options['sessions']} sessões, "
+            f"{len(session_pks) * options['messages_per_session']} mensagens "
+            f"em {time.perf_counter() - start:.1f}s."
+        )
+        return user_ids, list(GameSession.objects.filter(pk__in=session_pks[:1000]))
+
+    def _explain(self, queryset, label):
+        """
+        Executa EXPLAIN diretamente no cursor. O comentário com o rótulo evita que o
+        cache de statements do driver devolva o plano preparado antes do DROP INDEX.
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{connection.ops.explain_query_prefix()} {sql} -- {label}", params
+            )
+            return "\n".join(
+                " ".join(str(col) for col in row) for row in cursor.fetchall()
+            )
+
+    def _run_queries(self, label, user_ids, sessions, options):
+        rng = random.Random(7)
+        self.stdout.write(f"\n=== {label} ===")
+
+        user_id = user_ids[0]
+        recent_qs = (
+            GameSession.objects.filter(user_id=user_id, theme=THEMES[0], level=LEVELS[0])
+            .filter(character_name__gt="")
+            .order_by("-end_time")
+            .values_list("character_name", flat=True)[:100]
+        )
+        score_qs = ChatMessage.objects.filter(
+            session_id=sessions[0].pk, sender="user"
+        ).order_by()
+
+        self.stdout.write("Plano (últimos personagens, values_list):")
+        self.stdout.write(self._explain(recent_qs, label))
+        self.stdout.write("Plano (pontuação, COUNT por sessão/remetente):")
+        self.stdout.write(self._explain(score_qs, label))
+
+        cases = [
+            (
+                "últimos personagens (values_list)",
+                lambda: _get_last_characters_name_sync(
+                    rng.choice(user_ids), rng.choice(THEMES), rng.choice(LEVELS)
+                ),
+            ),
+            (
+                "últimos personagens (instâncias completas)",
+                lambda: [
+                    s.character_name
+                    for s in GameSession.objects.filter(
+                        user__id=rng.choice(user_ids),
+                        theme=rng.choice(THEMES),
+                        level=rng.choice(LEVELS),
+                    ).order_by("-end_time")[:100]
+                    if s.character_name
+                ],
+            ),
+            (
+                "mensagens do jogador (COUNT)",
+                lambda: ChatMessage.objects.filter(
+                    session_id=rng.choice(sessions).pk, sender="user"
+                ).count(),
+            ),
+        ]
+        for name, func in cases:
+            start = time.perf_counter()
+            for _ in range(options["repeat"]):
+                func()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{name:<45} {elapsed / options['repeat'] * 1000:8.3f} ms/consulta"
+            )
@@ -0,0 +1,438 @@
+import asyncio
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import time
+import uuid
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from core.models import GameSession
+
+QUESTIONS = [
+    "O personagem é humano?",
+    "Ele aparece em algum filme de ficção científica?",
+    "É um vilão?",
+    "Ele usa algum tipo de armadura ou capacete?",
+]
+
+# Channel layer em memória: mede o caminho do código sem depender do Redis do channels.
+BENCH_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def _chat_pairs(turns):
+    """Histórico (sender, texto) de uma partida com `turns` perguntas."""
+    pairs = [("ai", "Em uma galáxia muito, muito distante, eu uso uma capa preta.")]
+    for i in range(turns):
+        pairs.append(("user", QUESTIONS[i % len(QUESTIONS)]))
+        pairs.append(("ai", "Sim, na maior parte da história."))
+    return pairs
+
+
+def _redis_available():
+    from core.utils.redis_client import get_redis
+
+    try:
+        return bool(get_redis().ping())
+    except Exception:
+        return False
+
+
+class _BenchContext:
+    """
+    Objetos compartilhados pelos benchmarks: agente falso, usuário de teste e sessões
+    separadas para leitura (histórico fixo de 10 turnos), escrita e a tarefa completa,
+    para que um benchmark não altere os dados medidos por outro.
+    """
+
+    def __init__(self):
+        from core.agent import get_game_agent
+        from core.utils import session_state
+
+        self.agent = get_game_agent()
+        self.user, _ = User.objects.get_or_create(username="bench-suite")
+        self.read_session = self._create_session()
+        self.write_session = self._create_session()
+        self.task_session = self._create_session()
+        for i in range(20):
+            self._create_session(
+                character_name=f"Personagem {i}",
+                is_completed=True,
+                end_time=timezone.now(),
+            )
+        self.redis = _redis_available()
+        if self.redis:
+            for session in (self.read_session, self.write_session, self.task_session):
+                session_state.seed_state(session)
+                session_state.seed_history(session.session_id, _chat_pairs(10))
+
+    def _create_session(self, **fields):
+        fields.setdefault("character_name", "Darth Vader")
+        # Tentativas de sobra: o jogo nunca termina (o fim busca a imagem na rede).
+        fields.setdefault("attempts_left", 10**9)
+        return GameSession.objects.create(
+            session_id=f"bench-suite-{uuid.uuid4()}",
+            theme="Filmes",
+            level="Facil",
+            user=self.user,
+            **fields,
+        )
+
+    @staticmethod
+    def state_of(session):
+        return {"pk": session.pk, "session_id": session.session_id}
+
+    def cleanup(self):
+        sessions = GameSession.objects.filter(user=self.user)
+        if self.redis:
+            # Descarta do ledger só as chamadas das sessões de benchmark; as demais
+            # continuam na fila para o flush periódico.
+            from core.utils.llm_ledger import discard_session_calls
+
+            discard_session_calls(sessions.values_list("pk", flat=True))
+        sessions.delete()
+        self.user.delete()
+
+
+def bench_prompt_assembly(ctx):
+    """Monta o prompt principal (template, instrução de tentativas e histórico de 10 turnos)."""
+    agent = ctx.agent
+    pairs = _chat_pairs(10)
+
+    def run():
+        agent.game_prompt_template.invoke(
+            {
+                "tema": "Filmes",
+                "nivel": agent.resolve_level("Aleatorio", "seed"),
+                "character_name": "Darth Vader",
+                "attempts_instruction": agent.build_attempts_instruction(
+                    "Darth Vader", 7
+                ),
+                "chat_history": agent.build_chat_history(pairs),
+                "input": "Ele usa uma capa?",
+            }
+        )
+
+    return run
+
+
+def bench_classify_user_input(ctx):
+    """classify_user_input com o LLM falso (sem latência): custo da cadeia e do parsing."""
+    from core.utils.llm_usage import LLMUsage
+
+    agent = ctx.agent
+
+    def run():
+        agent.classify_user_input("É o Darth Vader?", usage=LLMUsage())
+
+    return run
+
+
+def bench_process_player_input(ctx):
+    """process_player_input com o LLM falso e histórico de 10 turnos."""
+    from core.utils.llm_usage import LLMUsage
+
+    agent = ctx.agent
+    history = agent.build_chat_history(_chat_pairs(10))
+
+    def run():
+        agent.process_player_input(
+            "Ele usa uma capa?",
+            7,
+            "Darth Vader",
+            "Filmes",
+            "Facil",
+            history,
+            seed="seed",
+            usage=LLMUsage(),
+        )
+
+    return run
+
+
+def bench_player_message_task(ctx):
+    """
+    process_player_message_task de ponta a ponta (LLM falso, cache Redis, banco).
+    O histórico em cache volta a 10 turnos antes de cada chamada (um LTRIM), para que
+    o custo não cresça com o número de iterações.
+    """
+    from core.tasks import process_player_message_task
+    from core.utils.session_state import _history_key, get_redis
+
+    if not ctx.redis:
+        return None
+    session_id = ctx.task_session.session_id
+    user_id = ctx.user.id
+    history_key = _history_key(session_id)
+    history_length = len(_chat_pairs(10))
+
+    def run():
+        get_redis().ltrim(history_key, 0, history_length - 1)
+        process_player_message_task(session_id, "Ele usa uma capa?", user_id)
+
+    return run
+
+
+def bench_get_game_state(ctx):
+    from core.tasks import _get_game_state_sync
+
+    if not ctx.redis:
+        return None
+    return lambda: _get_game_state_sync(ctx.read_session.session_id, "bench")
+
+
+def bench_get_chat_history(ctx):
+    from core.tasks import _get_chat_history_sync
+
+    if not ctx.redis:
+        return None
+    state = ctx.state_of(ctx.read_session)
+    return lambda: _get_chat_history_sync(state, "bench")
+
+
+def bench_last_character_names(ctx):
+    from core.tasks import _get_last_characters_name_sync
+
+    return lambda: _get_last_characters_name_sync(ctx.user.id, "Filmes", "Facil", "bench")
+
+
+def bench_save_message(ctx):
+    from core.tasks import _save_message_sync
+
+    if not ctx.redis:
+        return None
+    state = ctx.state_of(ctx.write_session)
+    return lambda: _save_message_sync(state, "user", "Ele usa uma capa?", "bench")
+
+
+def _consumer_bench(subprotocol):
+    """Serialização de um evento do grupo até o quadro do WebSocket (handler do consumer)."""
+
+    def setup(ctx):
+        from core.consumers import GameConsumer
+
+        consumer = GameConsumer()
+        consumer.subprotocol = subprotocol
+
+        async def discard(message):
+            pass
+
+        consumer.base_send = discard
+        loop = asyncio.new_event_loop()
+        counter = iter(range(1, 10**12))
+
+        async def batch():
+            for _ in range(100):
+                await consumer.chat_message(
+                    {
+                        "type": "chat_message",
+                        "sender": "ai",
+                        "message": "Sim! Ele é um dos personagens mais conhecidos da saga.",
+                        "event_id": f"1792394707390-{next(counter)}",
+                    }
+                )
+
+        def run():
+            loop.run_until_complete(batch())
+
+        run.ops = 100
+        return run
+
+    return setup
+
+
+BENCHMARKS = {
+    "agent.prompt_assembly": bench_prompt_assembly,
+    "agent.classify_user_input": bench_classify_user_input,
+    "agent.process_player_input": bench_process_player_input,
+    "tasks.process_player_message": bench_player_message_task,
+    "tasks.db.get_game_state": bench_get_game_state,
+    "tasks.db.get_chat_history": bench_get_chat_history,
+    "tasks.db.last_character_names": bench_last_character_names,
+    "tasks.db.save_message": bench_save_message,
+    "consumer.chat_message.json": _consumer_bench(None),
+    "consumer.chat_message.cjson": _consumer_bench("whoami.v1.cjson"),
+    "consumer.chat_message.msgpack": _consumer_bench("whoami.v1.msgpack"),
+}
+
+
+def _measure(run, min_time, repeat):
+    """
+    Tempo por operação (µs) de `run`: calibra o número de chamadas para cada rodada
+    durar ao menos `min_time` segundos e repete `repeat` vezes. A comparação usa o
+    melhor tempo (min_us), menos sensível ao ruído da máquina que a mediana.
+    """
+    ops = getattr(run, "ops", 1)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    samples = [elapsed / (number * ops) * 1_000_000]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - start) / (number * ops) * 1_000_000)
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+        "iterations": number * ops,
+        "repeat": repeat,
+    }
+
+
+def _results_path(name):
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(settings.BENCH_RESULTS_DIR, f"{name}.json")
+
+
+class Command(BaseCommand):
+    help = (
+        "Suíte de microbenchmarks dos caminhos quentes (prompt e classificação do agente, "
+        "process_player_message_task com LLM falso, helpers de banco das tarefas e "
+        "serialização de eventos do consumer). Salva os resultados em BENCH_RESULTS_DIR e "
+        "compara com uma referência, falhando se algum ficar mais lento que o limite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only",
+            default="*",
+            help="Padrões (glob) dos benchmarks, separados por vírgula. Ex.: 'agent.*'.",
+        )
+        parser.add_argument("--list", action="store_true", help="Lista os benchmarks.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--min-time",
+            type=float,
+            default=0.2,
+            help="Duração mínima (segundos) de cada rodada.",
+        )
+        parser.add_argument(
+            "--save",
+            default=None,
+            help="Nome (ou caminho .json) para salvar os resultados. Padrão: data e hora.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=None,
+            help="Resultados de referência (nome em BENCH_RESULTS_DIR ou caminho .json).",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=settings.BENCH_REGRESSION_THRESHOLD,
+            help="Aumento relativo do melhor tempo tratado como regressão (0.25 = 25%%).",
+        )
+
+    def handle(self, *args, **options):
+        patterns = [p.strip() for p in options["only"].split(",") if p.strip()]
+        selected = [
+            name
+            for name in BENCHMARKS
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+        ]
+        if options["list"]:
+            for name in selected:
+                self.stdout.write(name)
+            return
+        if not selected:
+            raise CommandError(f"Nenhum benchmark corresponde a {options['only']!r}.")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(_results_path(options["baseline"])) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Não foi possível ler a referência: {e}")
+
+        # Sem rede: LLM falso sem latência simulada.
+        os.environ["LLM_PROVIDER"] = "fake"
+        os.environ["FAKE_LLM_LATENCY"] = "0"
+
+        results = {}
+        with override_settings(CHANNEL_LAYERS=BENCH_CHANNEL_LAYERS):
+            ctx = _BenchContext()
+            if not ctx.redis:
+                self.stderr.write(
+                    "Redis indisponível: benchmarks que usam o cache serão pulados."
+                )
+            try:
+                for name in selected:
+                    run = BENCHMARKS[name](ctx)
+                    if run is None:
+                        self.stdout.write(f"{name:<36}pulado")
+                        continue
+                    results[name] = _measure(
+                        run, options["min_time"], options["repeat"]
+                    )
+                    self.stdout.write(
+                        self._format(
+                            name, results[name], baseline, options["threshold"]
+                        )
+                    )
+            finally:
+                ctx.cleanup()
+
+        path = _results_path(
+            options["save"] or timezone.now().strftime("%Y%m%d-%H%M%S")
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "created_at": timezone.now().isoformat(),
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "machine": platform.node(),
+                    "database": settings.DATABASES["default"]["ENGINE"],
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        self.stdout.write(f"Resultados salvos em {path}")
+
+        if baseline is not None:
+            regressions = [
+                name
+                for name, result in results.items()
+                if name in baseline
+                and result["min_us"]
+                > baseline[name]["min_us"] * (1 + options["threshold"])
+            ]
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regressões acima de {options['threshold']:.0%}: "
+                    + ", ".join(regressions)
+                )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Sem regressões acima de {options['threshold']:.0%}."
+                )
+            )
+
+    def _format(self, name, result, baseline, threshold):
+        line = f"{name:<36}{result['min_us']:>12.1f} µs  (mediana {result['median_us']:.1f})"
+        reference = (baseline or {}).get(name)
+        if reference:
+            change = result["min_us"] / reference["min_us"] - 1
+            line += f"  {change:+.1%} vs {reference['min_us']:.1f} µs"
+            if change > threshold:
+                return self.style.ERROR(line + "  REGRESSÃO")
+        return line
@@ -0,0 +1,120 @@
+import time
+import zlib
+
+from django.core.management.base import BaseCommand
+
+from core.utils.wire_format import COMPACT_JSON, JSON, MSGPACK, encode
+
+QUESTIONS = [
+    "O personagem é humano?",
+    "Ele aparece em algum filme de ficção científica?",
+    "É um vilão?",
+    "Ele usa algum tipo de armadura ou capacete?",
+    "É o Darth Vader?",
+]
+ANSWERS = [
+    "Sim, na maior parte da história ele é humano, embora tenha partes mecânicas.",
+    "Sim! Ele é um dos personagens mais conhecidos de uma saga de ficção científica.",
+    "Durante boa parte da saga, sim. Mas a história dele tem uma reviravolta.",
+    "Sim, ele usa uma armadura preta e um capacete que o ajuda a respirar.",
+    "Sim, você acertou! O personagem era Darth Vader.",
+]
+
+
+def _game_events():
+    """Eventos enviados ao cliente durante um jogo típico (dica, turnos e fim de jogo)."""
+    event_ms = 1_792_394_707_390
+    events = []
+
+    def add(payload):
+        nonlocal event_ms
+        event_ms += 1500
+        payload["event_id"] = f"{event_ms}-0"
+        events.append(payload)
+
+    add(
+        {
+            "type": "chat_message",
+            "sender": "ai",
+            "message": "Em uma galáxia muito, muito distante, eu uso uma capa preta e um capacete.",
+        }
+    )
+    add({"type": "update_attempts", "attempts_left": 10})
+    attempts = 10
+    for question, answer in zip(QUESTIONS, ANSWERS):
+        add({"type": "chat_message", "sender": "user", "message": question})
+        if question.startswith("É "):
+            attempts -= 1
+            add({"type": "update_attempts", "attempts_left": attempts})
+        add({"type": "chat_message", "sender": "ai", "message": answer})
+    add(
+        {
+            "type": "game_over",
+            "message": "Parabéns! Você adivinhou o personagem: Darth Vader!",
+            "score": 75,
+            "character_name": "Darth Vader",
+            "character_image_url": "https://upload.wikimedia.org/wikipedia/en/7/76/Darth_Vader.jpg",
+        }
+    )
+    return events
+
+
+def _frame_bytes(frame):
+    text_data, bytes_data = frame
+    return bytes_data if bytes_data is not None else text_data.encode("utf-8")
+
+
+def _deflate_per_message(frames):
+    """permessage-deflate sem context takeover: cada quadro comprimido isoladamente."""
+    total = 0
+    for data in frames:
+        compressor = zlib.compressobj(wbits=-15)
+        total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def _deflate_context_takeover(frames):
+    """permessage-deflate com context takeover: o dicionário é mantido entre quadros."""
+    compressor = zlib.compressobj(wbits=-15)
+    total = 0
+    for data in frames:
+        total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os formatos de quadro do WebSocket (JSON verboso, JSON compacto e "
+        "MessagePack): bytes por jogo, com e sem permessage-deflate, e custo de codificação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        events = _game_events()
+        repeat = options["repeat"]
+        self.stdout.write(f"Jogo simulado: {len(events)} eventos; {repeat} repetições")
+        self.stdout.write(
+            f"{'formato':<20}{'bytes/jogo':>12}{'deflate':>10}{'deflate+ctx':>13}{'µs/evento':>12}"
+        )
+        for label, subprotocol in (
+            ("json (verboso)", JSON),
+            ("json compacto", COMPACT_JSON),
+            ("msgpack", MSGPACK),
+        ):
+            frames = [_frame_bytes(encode(dict(event), subprotocol)) for event in events]
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for event in events:
+                    encode(event, subprotocol)
+            elapsed = time.perf_counter() - start
+            per_event_us = elapsed / (repeat * len(events)) * 1_000_000
+
+            self.stdout.write(
+                f"{label:<20}{sum(len(f) for f in frames):>12}"
+                f"{_deflate_per_message(frames):>10}"
+                f"{_deflate_context_takeover(frames):>13}"
+                f"{per_event_us:>12.2f}"
+            )
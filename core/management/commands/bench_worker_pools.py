@@ -0,0 +1,196 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.celery import app as celery_app
+from core.models import ChatMessage, GameSession
+from core.tasks import process_player_message_task, process_start_game_task
+
+
+def _process_tree_rss_kb(pid: int) -> int:
+    """Soma o VmRSS (kB) de um processo e de todos os seus descendentes via /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                ppid = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status_file:
+                for line in status_file:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            pass
+        pending.extend(children.get(current, []))
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara jogos/s e memória (RSS) dos workers Celery em cada pool "
+        "(prefork, threads, gevent, solo) usando o provedor de LLM falso."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pools",
+            default="prefork,threads,gevent",
+            help="Lista de pools separados por vírgula.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--games", type=int, default=40)
+        parser.add_argument(
+            "--turns", type=int, default=3, help="Mensagens do jogador por jogo."
+        )
+        parser.add_argument(
+            "--llm-latency",
+            type=float,
+            default=0.3,
+            help="Latência simulada de cada chamada ao LLM (segundos).",
+        )
+        parser.add_argument("--timeout", type=float, default=300.0)
+
+    def handle(self, *args, **options):
+        results = []
+        for pool in [p.strip() for p in options["pools"].split(",") if p.strip()]:
+            if pool == "gevent":
+                try:
+                    import gevent  # noqa: F401
+                except ImportError:
+                    self.stderr.write("gevent não está instalado; pulando o pool gevent.")
+                    continue
+            results.append(self._run_pool(pool, options))
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'pool':<10}{'concorrência':>14}{'jogos':>8}{'tempo (s)':>12}"
+            f"{'jogos/s':>10}{'RSS pico (MB)':>16}"
+        )
+        for row in results:
+            self.stdout.write(
+                f"{row['pool']:<10}{row['concurrency']:>14}{row['games']:>8}"
+                f"{row['elapsed']:>12.2f}{row['games_per_sec']:>10.2f}"
+                f"{row['peak_rss_mb']:>16.1f}"
+            )
+
+    def _run_pool(self, pool, options):
+        concurrency = options["concurrency"]
+        env = dict(
+            os.environ,
+            LLM_PROVIDER="fake",
+            FAKE_LLM_LATENCY=str(options["llm_latency"]),
+            METRICS_WORKER_PORT="0",
+        )
+        worker_name = f"bench-{pool}-{uuid.uuid4().hex[:6]}@{socket.gethostname()}"
+        worker = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "celery",
+                "-A",
+                "app",
+                "worker",
+                "-P",
+                pool,
+                "-c",
+                str(concurrency),
+                "-n",
+                worker_name,
+                "--loglevel=WARNING",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        session_ids = []
+        try:
+            self._wait_for_worker(worker_name, options["timeout"])
+            self.stdout.write(f"Pool {pool}: worker pronto, enfileirando jogos...")
+
+            start = time.perf_counter()
+            for _ in range(options["games"]):
+                session_id = str(uuid.uuid4())
+                GameSession.objects.create(
+                    session_id=session_id, theme="Filmes", level="Facil"
+                )
+                session_ids.append(session_id)
+                process_start_game_task.delay(session_id, "Filmes", "Facil", None)
+
+            expected_ai_messages = 1 + options["turns"]
+            enqueued_turns = set()
+            peak_rss = 0
+            deadline = time.monotonic() + options["timeout"]
+            while time.monotonic() < deadline:
+                peak_rss = max(peak_rss, _process_tree_rss_kb(worker.pid))
+                counts = self._ai_message_counts(session_ids)
+                # Cada jogo avança um turno de cada vez, como um jogador real.
+                for session_id in session_ids:
+                    done = counts.get(session_id, 0)
+                    if 0 < done < expected_ai_messages and (
+                        session_id,
+                        done,
+                    ) not in enqueued_turns:
+                        enqueued_turns.add((session_id, done))
+                        process_player_message_task.delay(
+                            session_id, f"Pergunta {done}?", None
+                        )
+                finished = sum(
+                    1 for c in counts.values() if c >= expected_ai_messages
+                )
+                if finished >= len(session_ids):
+                    break
+                time.sleep(0.1)
+            elapsed = time.perf_counter() - start
+            finished = sum(
+                1
+                for c in self._ai_message_counts(session_ids).values()
+                if c >= expected_ai_messages
+            )
+        finally:
+            worker.terminate()
+            try:
+                worker.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+            GameSession.objects.filter(session_id__in=session_ids).delete()
+
+        return {
+            "pool": pool,
+            "concurrency": concurrency,
+            "games": finished,
+            "elapsed": elapsed,
+            "games_per_sec": finished / elapsed if elapsed else 0.0,
+            "peak_rss_mb": peak_rss / 1024,
+        }
+
+    def _ai_message_counts(self, session_ids):
+        counts = {}
+        for session_id in ChatMessage.objects.filter(
+            session__session_id__in=session_ids, sender="ai"
+        ).values_list("session__session_id", flat=True):
+            counts[session_id] = counts.get(session_id, 0) + 1
+        return counts
+
+    def _wait_for_worker(self, worker_name, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if celery_app.control.ping(destination=[worker_name], timeout=1.0):
+                return
+        raise RuntimeError("Nenhum worker Celery respondeu ao ping a tempo.")
@@ -0,0 +1,189 @@
+import glob
+import json
+import os
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils.profiling import CONTROL_KEY
+from core.utils.redis_client import get_redis
+
+_SESSION_FRAME = re.compile(r";session:[^;]*")
+
+
+def _load_stacks(paths, by_session=False):
+    """Soma as pilhas "collapsed" dos arquivos (sem o quadro da sessão, por padrão)."""
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if not stack or not count.isdigit():
+                    continue  # Linha incompleta (processo interrompido durante a escrita)
+                if not by_session:
+                    stack = _SESSION_FRAME.sub("", stack, count=1)
+                stacks[stack] += int(count)
+    return stacks
+
+
+class Command(BaseCommand):
+    help = (
+        "Liga, desliga e consulta o profiler por amostragem (core.utils.profiling) em "
+        "todos os workers e servidores, e junta as pilhas gravadas em um arquivo pronto "
+        "para flamegraph (flamegraph.pl, speedscope)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action", choices=["start", "stop", "status", "collapse", "top"]
+        )
+        parser.add_argument(
+            "--duration",
+            type=int,
+            default=300,
+            help="start: segundos até o profiler desligar sozinho.",
+        )
+        parser.add_argument(
+            "--sample-rate",
+            type=float,
+            default=settings.PROFILE_SAMPLE_RATE,
+            help="start: fração das execuções perfiladas (0 a 1).",
+        )
+        parser.add_argument(
+            "--dir", default=settings.PROFILE_OUTPUT_DIR, help="Pasta dos perfis."
+        )
+        parser.add_argument(
+            "--kind",
+            choices=["celery", "consumer"],
+            help="collapse/top: apenas tarefas ou apenas handlers do consumer.",
+        )
+        parser.add_argument(
+            "--by-session",
+            action="store_true",
+            help="collapse: mantém o quadro session:<id> (um ramo por sessão).",
+        )
+        parser.add_argument(
+            "--output", help="collapse: arquivo de saída (padrão: stdout)."
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="top: número de funções mostradas."
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="start: apaga os perfis anteriores da pasta.",
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def profile_files(self, options):
+        pattern = f"{options['kind'] or '*'}-*.collapsed"
+        return sorted(glob.glob(os.path.join(options["dir"], pattern)))
+
+    def handle_start(self, options):
+        if not 0 < options["sample_rate"] <= 1:
+            raise CommandError("--sample-rate deve estar entre 0 (exclusivo) e 1.")
+        if options["duration"] <= 0:
+            raise CommandError("--duration deve ser positivo.")
+        if options["clear"]:
+            for path in self.profile_files(options):
+                os.remove(path)
+        get_redis().set(
+            CONTROL_KEY,
+            json.dumps({"sample_rate": options["sample_rate"]}),
+            ex=options["duration"],
+        )
+        if settings.PROFILE_CONTROL_REFRESH <= 0:
+            self.stderr.write(
+                self.style.WARNING(
+                    "Estado gravado, mas PROFILE_CONTROL_REFRESH=0 nesta configuração: só "
+                    "os processos com PROFILE_CONTROL_REFRESH > 0 passam a perfilar."
+                )
+            )
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Profiler ligado por {options['duration']} s "
+                f"(amostra de {options['sample_rate']:.0%} das execuções); os processos "
+                f"passam a perfilar em até {settings.PROFILE_CONTROL_REFRESH:g} s."
+            )
+        )
+
+    def handle_stop(self, options):
+        get_redis().delete(CONTROL_KEY)
+        self.stdout.write(self.style.SUCCESS("Profiler desligado."))
+
+    def handle_status(self, options):
+        if settings.PROFILING:
+            self.stdout.write(
+                f"PROFILING=1: ligado nesta configuração "
+                f"(amostra de {settings.PROFILE_SAMPLE_RATE:.0%})."
+            )
+        raw = get_redis().get(CONTROL_KEY)
+        if raw:
+            ttl = get_redis().ttl(CONTROL_KEY)
+            rate = json.loads(raw)["sample_rate"]
+            self.stdout.write(
+                f"Ligado remotamente: amostra de {rate:.0%}, desliga em {ttl} s."
+            )
+        elif not settings.PROFILING:
+            self.stdout.write("Desligado.")
+        for path in self.profile_files(options):
+            stacks = _load_stacks([path])
+            self.stdout.write(
+                f"  {os.path.basename(path)}: {sum(stacks.values())} amostras, "
+                f"{len(stacks)} pilhas"
+            )
+
+    def handle_collapse(self, options):
+        paths = self.profile_files(options)
+        if not paths:
+            raise CommandError(f"Nenhum perfil em {options['dir']}.")
+        stacks = _load_stacks(paths, by_session=options["by_session"])
+        lines = [f"{stack} {count}\n" for stack, count in sorted(stacks.items())]
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{len(lines)} pilhas ({sum(stacks.values())} amostras) gravadas em "
+                    f"{options['output']}."
+                )
+            )
+        else:
+            self.stdout.write("".join(lines), ending="")
+
+    def handle_top(self, options):
+        """Funções com mais amostras: próprias (no topo da pilha) e totais (em qualquer ponto)."""
+        paths = self.profile_files(options)
+        if not paths:
+            raise CommandError(f"Nenhum perfil em {options['dir']}.")
+        own, total = Counter(), Counter()
+        stages = Counter()
+        samples = 0
+        for stack, count in _load_stacks(paths).items():
+            frames = stack.split(";")
+            samples += count
+            own[frames[-1]] += count
+            for frame in set(frames):
+                if frame.startswith("stage:"):
+                    stages[frame[6:]] += count
+                else:
+                    total[frame] += count
+        if not samples:
+            return
+        self.stdout.write(f"{samples} amostras em {len(paths)} arquivos.")
+        if stages:
+            self.stdout.write("")
+            self.stdout.write(f"{'etapa':<40}{'amostras':>10}{'%':>8}")
+            for stage, count in stages.most_common():
+                self.stdout.write(f"{stage[:40]:<40}{count:>10}{count / samples:>8.1%}")
+        self.stdout.write("")
+        self.stdout.write(f"{'função':<60}{'própria':>9}{'total':>9}")
+        for frame, count in own.most_common(options["limit"]):
+            self.stdout.write(
+                f"{frame[:60]:<60}{count / samples:>9.1%}{total[frame] / samples:>9.1%}"
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.utils.leaderboards import rebuild_leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        "Recria os rankings no Redis a partir de GameSession (ex.: após perda do "
+        "Redis). Os rankings semanal e diário são recriados para o período corrente."
+    )
+
+    def handle(self, *args, **options):
+        keys = rebuild_leaderboards()
+        self.stdout.write(f"{keys} rankings recriados a partir do banco.")
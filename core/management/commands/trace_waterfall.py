@@ -0,0 +1,180 @@
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _load_traces(path):
+    """Lê o arquivo de spans (JSON lines) e agrupa os spans por trace_id."""
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue  # Linha incompleta (processo interrompido durante a escrita)
+            traces[span["trace_id"]].append(span)
+    return traces
+
+
+def _bounds(spans):
+    start = min(span["start_ns"] for span in spans)
+    end = max(span["start_ns"] + span["duration_ns"] for span in spans)
+    return start, end
+
+
+def _roots(spans):
+    ids = {span["span_id"] for span in spans}
+    return sorted(
+        (span for span in spans if span["parent_id"] not in ids),
+        key=lambda span: span["start_ns"],
+    )
+
+
+def _tree_order(spans):
+    """Spans em ordem de árvore (pais antes dos filhos, irmãos por início) com a profundidade."""
+    children = defaultdict(list)
+    for span in spans:
+        children[span["parent_id"]].append(span)
+    ordered = []
+
+    def visit(span, depth):
+        ordered.append((span, depth))
+        for child in sorted(children[span["span_id"]], key=lambda s: s["start_ns"]):
+            visit(child, depth + 1)
+
+    for root in _roots(spans):
+        visit(root, 0)
+    return ordered
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra em cascata (waterfall) os traces mais lentos gravados em TRACE_EXPORT_FILE "
+        "(TRACING=1): API, fila do Celery, tarefa, etapas, chamadas ao LLM e entrega no "
+        "WebSocket de cada turno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file", default=settings.TRACE_EXPORT_FILE, help="Arquivo de spans."
+        )
+        parser.add_argument("--trace", help="Mostra apenas este trace_id.")
+        parser.add_argument(
+            "--slowest", type=int, default=5, help="Número de traces mostrados."
+        )
+        parser.add_argument(
+            "--name",
+            default="",
+            help="Filtra pelo nome do span raiz (ex.: /api/message/).",
+        )
+        parser.add_argument(
+            "--min-ms", type=float, default=0.0, help="Duração mínima do trace (ms)."
+        )
+        parser.add_argument(
+            "--width", type=int, default=50, help="Largura das barras da cascata."
+        )
+        parser.add_argument(
+            "--summary",
+            action="store_true",
+            help="Mostra também a duração por nome de span nos traces filtrados.",
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options["file"]):
+            raise CommandError(
+                f"Arquivo de spans não encontrado: {options['file']} "
+                "(execute o servidor e os workers com TRACING=1)."
+            )
+        traces = _load_traces(options["file"])
+        if options["trace"]:
+            if options["trace"] not in traces:
+                raise CommandError(f"Trace {options['trace']} não encontrado.")
+            selected = [options["trace"]]
+        else:
+            candidates = []
+            for trace_id, spans in traces.items():
+                start, end = _bounds(spans)
+                duration_ms = (end - start) / 1e6
+                roots = _roots(spans)
+                if duration_ms < options["min_ms"]:
+                    continue
+                if options["name"] and not any(
+                    options["name"] in root["name"] for root in roots
+                ):
+                    continue
+                candidates.append((duration_ms, trace_id))
+            self.stdout.write(
+                f"{len(traces)} traces em {options['file']}; {len(candidates)} após os filtros."
+            )
+            candidates.sort(reverse=True)
+            if options["summary"]:
+                self.write_summary([traces[trace_id] for _, trace_id in candidates])
+            selected = [trace_id for _, trace_id in candidates[: options["slowest"]]]
+
+        for trace_id in selected:
+            self.write_waterfall(trace_id, traces[trace_id], options["width"])
+
+    def write_waterfall(self, trace_id, spans, width):
+        start, end = _bounds(spans)
+        total = max(end - start, 1)
+        roots = _roots(spans)
+        span_names = {span["name"] for span in spans}
+        session_id = next(
+            (s["attributes"]["session_id"] for s in spans if "session_id" in s["attributes"]),
+            "",
+        )
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"trace {trace_id}  {total / 1e6:.1f} ms  {roots[0]['name']}"
+                + (f"  sessão {session_id}" if session_id else "")
+            )
+        )
+        self.stdout.write(f"{'início':>9} {'duração':>9}  {'span':<40} cascata")
+        for span, depth in _tree_order(spans):
+            offset = span["start_ns"] - start
+            bar_start = int(offset / total * width)
+            bar_length = max(1, round(span["duration_ns"] / total * width))
+            bar = " " * bar_start + "█" * min(bar_length, width - bar_start)
+            name = "  " * depth + span["name"]
+            # Rótulo da etapa (ex.: tipo da chamada ao LLM), omitido quando repete a tarefa.
+            label = span["attributes"].get("task")
+            if label and label not in span["name"] and f"celery {label}" not in span_names:
+                name += f" [{label}]"
+            line = (
+                f"{offset / 1e6:>8.1f}ms {span['duration_ns'] / 1e6:>7.1f}ms  "
+                f"{name[:40]:<40} |{bar:<{width}}|"
+            )
+            if span["error"]:
+                line = self.style.ERROR(line + f" {span['error']}")
+            self.stdout.write(line)
+
+    def write_summary(self, traces):
+        durations = defaultdict(list)
+        for spans in traces:
+            for span in spans:
+                durations[span["name"]].append(span["duration_ns"] / 1e6)
+        if not durations:
+            return
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'span':<40}{'qtd':>7}{'média':>10}{'p95':>10}{'máx':>10}{'total':>11}"
+        )
+        for name, values in sorted(
+            durations.items(), key=lambda item: sum(item[1]), reverse=True
+        ):
+            self.stdout.write(
+                f"{name[:40]:<40}{len(values):>7}{sum(values) / len(values):>10.1f}"
+                f"{_percentile(values, 0.95):>10.1f}{max(values):>10.1f}{sum(values):>11.1f}"
+            )
@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from asgiref.sync import iscoroutinefunction
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+
+from .utils.log import bind_context, log_context
+from .utils.tracing import TRACEPARENT_KEY, span
+from .utils.metrics import WS_AUTH_RESULTS
+
+logger = logging.getLogger(__name__)
+
+# Prefixo do subprotocolo que carrega o token (evita o token na URL e nos logs de acesso).
+AUTH_SUBPROTOCOL_PREFIX = "whoami.auth."
+
+
+class VerifiedTokenCache:
+    """
+    Cache LRU com TTL de tokens JWT já verificados (token -> usuário).
+    Evita verificar a assinatura e recarregar o usuário do banco a cada reconexão.
+    Uma entrada nunca vive além da expiração do próprio token.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def set(self, token, user, token_exp):
+        expires_at = min(time.time() + self.ttl, token_exp)
+        with self._lock:
+            self._entries[token] = (user, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = VerifiedTokenCache(settings.WS_AUTH_CACHE_SIZE, settings.WS_AUTH_CACHE_TTL)
+
+
+def get_token_from_scope(scope):
+    """
+    Extrai o token de acesso do handshake: subprotocolo "whoami.auth.<token>"
+    ou parâmetro de query "?token=<token>".
+    """
+    for subprotocol in scope.get("subprotocols") or ():
+        if subprotocol.startswith(AUTH_SUBPROTOCOL_PREFIX):
+            return subprotocol[len(AUTH_SUBPROTOCOL_PREFIX) :]
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("token", [""])[0] or None
+
+
+@database_sync_to_async
+def _verify_token(raw_token):
+    """Valida assinatura/expiração do token e carrega o usuário (síncrona)."""
+    authentication = JWTAuthentication()
+    validated_token = authentication.get_validated_token(raw_token)
+    return authentication.get_user(validated_token), validated_token["exp"]
+
+
+async def authenticate_token(raw_token):
+    """
+    Autentica um token de acesso JWT usando o cache de tokens verificados.
+    Retorna (usuário, resultado), com resultado "cache_hit", "verified" ou "invalid"
+    (neste caso o usuário é anônimo). Usada pelo WebSocket e pelas views assíncronas.
+    """
+    user = token_cache.get(raw_token)
+    if user is not None:
+        return user, "cache_hit"
+    try:
+        user, token_exp = await _verify_token(raw_token)
+    except (TokenError, AuthenticationFailed) as e:
+        logger.warning("Token JWT recusado (%s).", type(e).__name__)
+        return AnonymousUser(), "invalid"
+    token_cache.set(raw_token, user, token_exp)
+    return user, "verified"
+
+
+class JWTAuthMiddleware:
+    """
+    Middleware Channels que autentica o WebSocket com o token JWT do SimpleJWT.
+    Sem token, mantém o usuário definido pela sessão (AuthMiddlewareStack).
+    Com token inválido, o usuário fica anônimo e o consumer recusa a conexão.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        raw_token = get_token_from_scope(scope)
+        if raw_token is None:
+            WS_AUTH_RESULTS.labels(result="missing").inc()
+            return await self.inner(scope, receive, send)
+
+        user, result = await authenticate_token(raw_token)
+        WS_AUTH_RESULTS.labels(result=result).inc()
+        scope = dict(scope, user=user)
+        return await self.inner(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Autenticação por sessão (cookie) com o JWT tendo precedência quando enviado."""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
+
+
+@sync_and_async_middleware
+def log_context_middleware(get_response):
+    """
+    Middleware Django que abre um contexto de log por requisição: os campos ligados
+    pelas views (bind_context) não vazam para a próxima requisição da mesma thread.
+    Sem MiddlewareMixin, não força a troca entre os modos síncrono e assíncrono.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            with log_context():
+                return await get_response(request)
+
+    else:
+
+        def middleware(request):
+            with log_context():
+                return get_response(request)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def tracing_middleware(get_response):
+    """
+    Middleware Django que abre o span raiz de cada requisição (com TRACING), continuando
+    o traceparent recebido, se houver. O traceparent vai também na resposta.
+    """
+
+    def start(request):
+        return span(
+            f"{request.method} {request.path}",
+            parent=request.headers.get(TRACEPARENT_KEY),
+            root=True,
+        )
+
+    def finish(request_span, response):
+        if request_span is not None:
+            request_span.set_attributes(status=response.status_code)
+            response[TRACEPARENT_KEY] = request_span.traceparent
+        return response
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            with start(request) as request_span:
+                if request_span is not None:
+                    bind_context(trace_id=request_span.trace_id)
+                return finish(request_span, await get_response(request))
+
+    else:
+
+        def middleware(request):
+            with start(request) as request_span:
+                if request_span is not None:
+                    bind_context(trace_id=request_span.trace_id)
+                return finish(request_span, get_response(request))
+
+    return middleware
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_gamesession_attempts_left'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'sender'], name='chatmessage_session_sender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['user', 'theme', 'level', 'end_time'], name='gamesession_recent_chars_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_gamesession_chatmessage_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='guess_count',
+            field=models.IntegerField(default=0, help_text='Número de mensagens classificadas como tentativa'),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='llm_latency_ms_total',
+            field=models.BigIntegerField(default=0, help_text='Tempo total (ms) gasto em chamadas ao LLM'),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='llm_tokens_total',
+            field=models.BigIntegerField(default=0, help_text='Total de tokens (entrada + saída) consumidos no LLM'),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='question_count',
+            field=models.IntegerField(default=0, help_text='Número de mensagens classificadas como pergunta'),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='user_message_count',
+            field=models.IntegerField(default=0, help_text='Número de mensagens enviadas pelo jogador'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+# Cópia do mapa de tentativas do agente no momento desta migração.
+ATTEMPTS_MAP = {"Facil": 10, "Medio": 8, "Dificil": 5}
+DEFAULT_ATTEMPTS = 7
+
+
+def backfill_counters(apps, schema_editor):
+    """
+    Preenche os contadores das sessões existentes em poucas instruções UPDATE.
+    Mensagens do jogador vêm de chat_messages; tentativas são deduzidas das
+    tentativas restantes. Latência e tokens de jogos antigos não foram registrados.
+    """
+    GameSession = apps.get_model("core", "GameSession")
+    ChatMessage = apps.get_model("core", "ChatMessage")
+
+    user_messages = (
+        ChatMessage.objects.filter(session=OuterRef("pk"), sender="user")
+        .order_by()
+        .values("session")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    GameSession.objects.update(
+        user_message_count=Coalesce(
+            Subquery(user_messages, output_field=IntegerField()), Value(0)
+        )
+    )
+
+    # Sessões sem personagem nunca tiveram as tentativas inicializadas.
+    max_attempts = Case(
+        *[When(level=level, then=Value(total)) for level, total in ATTEMPTS_MAP.items()],
+        default=Value(DEFAULT_ATTEMPTS),
+        output_field=IntegerField(),
+    )
+    started = GameSession.objects.exclude(character_name__isnull=True).exclude(
+        character_name=""
+    )
+    started.update(guess_count=Greatest(max_attempts - F("attempts_left"), Value(0)))
+    GameSession.objects.update(
+        question_count=Greatest(F("user_message_count") - F("guess_count"), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_gamesession_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
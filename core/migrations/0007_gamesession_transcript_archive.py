@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_gamesession_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, help_text='Data e hora em que as mensagens da sessão foram arquivadas', null=True),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='transcript',
+            field=models.BinaryField(blank=True, help_text='Transcrição compactada (JSON + zlib) das mensagens arquivadas', null=True),
+        ),
+    ]
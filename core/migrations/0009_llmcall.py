@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_gamesession_user_start_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('call_type', models.CharField(choices=[('character_selection', 'Escolha do personagem'), ('initial_hint', 'Dica inicial'), ('classification', 'Classificação'), ('chat', 'Conversa')], help_text='Etapa do jogo que fez a chamada', max_length=30)),
+                ('model', models.CharField(help_text='Modelo usado na chamada', max_length=100)),
+                ('input_tokens', models.IntegerField(default=0, help_text='Tokens de entrada')),
+                ('output_tokens', models.IntegerField(default=0, help_text='Tokens de saída')),
+                ('cached_tokens', models.IntegerField(default=0, help_text='Tokens de entrada lidos do cache de contexto')),
+                ('latency_ms', models.IntegerField(default=0, help_text='Latência da chamada (ms)')),
+                ('error', models.TextField(blank=True, default='', help_text='Erro da chamada (vazio se bem-sucedida)')),
+                ('cost_usd', models.DecimalField(decimal_places=8, default=0, help_text='Custo estimado (USD) pela tabela LLM_PRICING', max_digits=12)),
+                ('created_at', models.DateTimeField(help_text='Data e hora da chamada')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_calls', to='core.gamesession')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['call_type', 'created_at'], name='llmcall_type_created_idx'), models.Index(fields=['session', 'created_at'], name='llmcall_session_created_idx')],
+            },
+        ),
+    ]
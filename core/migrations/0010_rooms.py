@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_llmcall'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='player',
+            field=models.ForeignKey(blank=True, help_text='Jogador que enviou a mensagem (apenas em salas multijogador)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='max_players',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Número máximo de jogadores na sala'),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='mode',
+            field=models.CharField(choices=[('solo', 'Individual'), ('turns', 'Sala por turnos'), ('free_for_all', 'Sala livre')], default='solo', help_text='Jogo individual ou sala multijogador (por turnos ou livre)', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='RoomPlayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(auto_now_add=True, help_text='Data e hora de entrada na sala')),
+                ('score', models.IntegerField(default=0, help_text='Pontuação do jogador na sala')),
+                ('question_count', models.IntegerField(default=0, help_text='Perguntas do jogador respondidas pela IA')),
+                ('guess_count', models.IntegerField(default=0, help_text='Tentativas de adivinhação do jogador')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='players', to='core.gamesession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['joined_at'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'user'), name='roomplayer_session_user_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_rooms'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='llmcall',
+            name='call_type',
+            field=models.CharField(choices=[('character_selection', 'Escolha do personagem'), ('initial_hint', 'Dica inicial'), ('classification', 'Classificação'), ('chat', 'Conversa'), ('speculative_hint', 'Dica antecipada')], help_text='Etapa do jogo que fez a chamada', max_length=30),
+        ),
+    ]
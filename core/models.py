@@ -6,8 +6,16 @@ class GameSession(models.Model):
     """
     Representa uma sessão de jogo individual para um usuário.
     Armazena informações sobre o jogo, o personagem adivinhado e o resultado.
+    Em uma sala multijogador (mode diferente de "solo"), `user` é o anfitrião e os
+    participantes ficam em RoomPlayer (ver core.utils.rooms).
     """
 
+    MODES = [
+        ("solo", "Individual"),
+        ("turns", "Sala por turnos"),
+        ("free_for_all", "Sala livre"),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -49,6 +57,63 @@ class GameSession(models.Model):
         default=0,
         help_text="Número de tentativas restantes para adivinhar o personagem",
     )  # NOVO CAMPO
+    mode = models.CharField(
+        max_length=20,
+        choices=MODES,
+        default="solo",
+        help_text="Jogo individual ou sala multijogador (por turnos ou livre)",
+    )
+    max_players = models.PositiveSmallIntegerField(
+        default=1, help_text="Número máximo de jogadores na sala"
+    )
+
+    # Contadores desnormalizados. Durante o jogo são incrementados no estado em cache
+    # (HINCRBY, core.utils.session_state) e gravados aqui pelo flush write-behind.
+    # Pontuação e estatísticas leem estes valores em vez de agregar chat_messages.
+    user_message_count = models.IntegerField(
+        default=0, help_text="Número de mensagens enviadas pelo jogador"
+    )
+    guess_count = models.IntegerField(
+        default=0, help_text="Número de mensagens classificadas como tentativa"
+    )
+    question_count = models.IntegerField(
+        default=0, help_text="Número de mensagens classificadas como pergunta"
+    )
+    llm_latency_ms_total = models.BigIntegerField(
+        default=0, help_text="Tempo total (ms) gasto em chamadas ao LLM"
+    )
+    llm_tokens_total = models.BigIntegerField(
+        default=0, help_text="Total de tokens (entrada + saída) consumidos no LLM"
+    )
+
+    # Arquivamento: após o período de retenção, as mensagens de jogos concluídos
+    # são compactadas em um único blob (ver core.utils.transcripts) e removidas
+    # de chat_messages.
+    transcript = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Transcrição compactada (JSON + zlib) das mensagens arquivadas",
+    )
+    archived_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Data e hora em que as mensagens da sessão foram arquivadas",
+    )
+
+    class Meta:
+        indexes = [
+            # Busca dos últimos personagens do usuário por tema/nível (ordenada por end_time).
+            models.Index(
+                fields=["user", "theme", "level", "end_time"],
+                name="gamesession_recent_chars_idx",
+            ),
+            # Histórico de jogos do usuário paginado por cursor em start_time.
+            models.Index(
+                fields=["user", "start_time"],
+                name="gamesession_user_start_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Sessão {self.session_id} - Usuário: {self.user.username if self.user else 'Anônimo'} - Tema: {self.theme}"
@@ -68,12 +133,120 @@ class ChatMessage(models.Model):
         help_text="Remetente da mensagem (usuário ou IA)",
     )
     message_text = models.TextField(help_text="Conteúdo da mensagem")
+    player = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        help_text="Jogador que enviou a mensagem (apenas em salas multijogador)",
+    )
     timestamp = models.DateTimeField(
         auto_now_add=True, help_text="Data e hora da mensagem"
     )
 
     class Meta:
         ordering = ["timestamp"]  # Garante que as mensagens sejam ordenadas por tempo
+        indexes = [
+            # Contagem de mensagens por remetente usada na pontuação.
+            models.Index(
+                fields=["session", "sender"],
+                name="chatmessage_session_sender_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"[{self.timestamp.strftime('%H:%M')}] {self.sender.upper()}: {self.message_text[:50]}..."
+
+
+class RoomPlayer(models.Model):
+    """
+    Participante de uma sala multijogador, com a sua pontuação na partida.
+    Durante o jogo a pontuação e os contadores vivem no Redis (core.utils.rooms);
+    as linhas são atualizadas em lote no fim da partida.
+    """
+
+    session = models.ForeignKey(
+        GameSession, on_delete=models.CASCADE, related_name="players"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="room_memberships"
+    )
+    joined_at = models.DateTimeField(
+        auto_now_add=True, help_text="Data e hora de entrada na sala"
+    )
+    score = models.IntegerField(default=0, help_text="Pontuação do jogador na sala")
+    question_count = models.IntegerField(
+        default=0, help_text="Perguntas do jogador respondidas pela IA"
+    )
+    guess_count = models.IntegerField(
+        default=0, help_text="Tentativas de adivinhação do jogador"
+    )
+
+    class Meta:
+        ordering = ["joined_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "user"], name="roomplayer_session_user_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} na sala {self.session.session_id}"
+
+
+class LLMCall(models.Model):
+    """
+    Registro de uma chamada ao LLM feita pelo agente durante uma sessão de jogo.
+    As chamadas são gravadas em lote pelo flush do ledger (core.utils.llm_ledger),
+    fora do caminho do turno.
+    """
+
+    CALL_TYPES = [
+        ("character_selection", "Escolha do personagem"),
+        ("initial_hint", "Dica inicial"),
+        ("classification", "Classificação"),
+        ("chat", "Conversa"),
+        ("speculative_hint", "Dica antecipada"),
+    ]
+
+    session = models.ForeignKey(
+        GameSession, on_delete=models.CASCADE, related_name="llm_calls"
+    )
+    call_type = models.CharField(
+        max_length=30, choices=CALL_TYPES, help_text="Etapa do jogo que fez a chamada"
+    )
+    model = models.CharField(max_length=100, help_text="Modelo usado na chamada")
+    input_tokens = models.IntegerField(default=0, help_text="Tokens de entrada")
+    output_tokens = models.IntegerField(default=0, help_text="Tokens de saída")
+    cached_tokens = models.IntegerField(
+        default=0, help_text="Tokens de entrada lidos do cache de contexto"
+    )
+    latency_ms = models.IntegerField(default=0, help_text="Latência da chamada (ms)")
+    error = models.TextField(
+        blank=True, default="", help_text="Erro da chamada (vazio se bem-sucedida)"
+    )
+    cost_usd = models.DecimalField(
+        max_digits=12,
+        decimal_places=8,
+        default=0,
+        help_text="Custo estimado (USD) pela tabela LLM_PRICING",
+    )
+    created_at = models.DateTimeField(help_text="Data e hora da chamada")
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            # Relatórios agregados por etapa/modelo em um período.
+            models.Index(
+                fields=["call_type", "created_at"],
+                name="llmcall_type_created_idx",
+            ),
+            models.Index(
+                fields=["session", "created_at"],
+                name="llmcall_session_created_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.call_type} ({self.model}) - {self.latency_ms} ms"
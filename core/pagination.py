@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class GameHistoryPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) do histórico de jogos, do mais recente ao mais antigo.
+    Cada página é um `WHERE start_time < cursor ORDER BY start_time DESC LIMIT n` sobre o
+    índice (user, start_time): o custo não cresce com o número da página, ao contrário de OFFSET.
+    """
+
+    ordering = ("-start_time", "-pk")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
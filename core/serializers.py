@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from .models import GameSession, LLMCall
+from .utils.transcripts import get_transcript
 
 
 class StartGameRequestSerializer(serializers.Serializer):
@@ -28,6 +31,49 @@ class StartGameResponseSerializer(serializers.Serializer):
     )
 
 
+class CreateRoomRequestSerializer(StartGameRequestSerializer):
+    """
+    Serializador para criar uma sala multijogador: tema, nível, modo e limite de jogadores.
+    """
+
+    mode = serializers.ChoiceField(
+        choices=[("turns", "Por turnos"), ("free_for_all", "Livre")],
+        default="turns",
+        help_text="turns: um jogador por vez, na ordem de entrada; free_for_all: livre.",
+    )
+    max_players = serializers.IntegerField(
+        min_value=2,
+        max_value=settings.ROOM_MAX_PLAYERS,
+        default=settings.ROOM_DEFAULT_MAX_PLAYERS,
+        help_text="Número máximo de jogadores na sala.",
+    )
+
+
+class RoomPlayerSerializer(serializers.Serializer):
+    """
+    Serializador de um jogador da sala, com a pontuação e os contadores da partida.
+    """
+
+    user_id = serializers.IntegerField(read_only=True)
+    username = serializers.CharField(read_only=True)
+    score = serializers.IntegerField(read_only=True)
+    question_count = serializers.IntegerField(read_only=True)
+    guess_count = serializers.IntegerField(read_only=True)
+
+
+class RoomSerializer(serializers.Serializer):
+    """
+    Serializador do estado de uma sala (lido do Redis, ver core.utils.rooms.load_room).
+    """
+
+    session_id = serializers.CharField(read_only=True)
+    mode = serializers.CharField(read_only=True)
+    max_players = serializers.IntegerField(read_only=True)
+    is_completed = serializers.BooleanField(read_only=True)
+    turn_user_id = serializers.IntegerField(read_only=True, allow_null=True)
+    players = RoomPlayerSerializer(many=True, read_only=True)
+
+
 class MessageSerializer(serializers.Serializer):
     """
     Serializador para receber uma mensagem do usuário e o session_id.
@@ -41,6 +87,11 @@ class MessageSerializer(serializers.Serializer):
         max_length=1000,
         help_text="A mensagem a ser enviada para a IA.",
     )
+    client_message_id = serializers.CharField(
+        max_length=64,
+        required=False,
+        help_text="ID gerado pelo cliente para deduplicar reenvios da mesma mensagem.",
+    )
 
 
 # O AIResponseSerializer não será mais usado diretamente pela API REST para enviar a resposta da IA ao cliente,
@@ -116,3 +167,217 @@ class UserSerializer(serializers.ModelSerializer):
             "username",
         )
         read_only_fields = ("id", "username")
+
+
+class GameStatsSerializer(serializers.ModelSerializer):
+    """
+    Serializador das estatísticas de uma sessão, lidas dos contadores desnormalizados.
+    """
+
+    class Meta:
+        model = GameSession
+        fields = (
+            "session_id",
+            "is_completed",
+            "score",
+            "attempts_left",
+            "user_message_count",
+            "guess_count",
+            "question_count",
+            "llm_latency_ms_total",
+            "llm_tokens_total",
+        )
+        read_only_fields = fields
+
+
+class LLMCallSerializer(serializers.ModelSerializer):
+    """
+    Serializador de uma chamada ao LLM registrada no ledger.
+    """
+
+    class Meta:
+        model = LLMCall
+        fields = (
+            "call_type",
+            "model",
+            "input_tokens",
+            "output_tokens",
+            "cached_tokens",
+            "latency_ms",
+            "error",
+            "cost_usd",
+            "created_at",
+        )
+        read_only_fields = fields
+
+
+class LLMUsageRowSerializer(serializers.Serializer):
+    """
+    Serializador de uma linha agregada do ledger (core.utils.llm_ledger.summarize).
+    Os campos de agrupamento presentes dependem do agrupamento pedido.
+    """
+
+    call_type = serializers.CharField(read_only=True)
+    model = serializers.CharField(read_only=True)
+    day = serializers.DateField(read_only=True)
+    calls = serializers.IntegerField(read_only=True)
+    errors = serializers.IntegerField(read_only=True)
+    input_tokens = serializers.IntegerField(read_only=True)
+    output_tokens = serializers.IntegerField(read_only=True)
+    cached_tokens = serializers.IntegerField(read_only=True)
+    avg_latency_ms = serializers.FloatField(read_only=True)
+    max_latency_ms = serializers.IntegerField(read_only=True)
+    cost_usd = serializers.DecimalField(max_digits=14, decimal_places=8, read_only=True)
+
+
+class GameLLMUsageSerializer(serializers.Serializer):
+    """
+    Serializador do consumo de LLM de uma sessão: totais, totais por etapa e chamadas.
+    """
+
+    session_id = serializers.CharField(read_only=True)
+    totals = LLMUsageRowSerializer(read_only=True, allow_null=True)
+    by_call_type = LLMUsageRowSerializer(many=True, read_only=True)
+    calls = LLMCallSerializer(many=True, read_only=True)
+
+
+class LLMUsageReportSerializer(serializers.Serializer):
+    """
+    Serializador do relatório agregado de consumo de LLM em um período.
+    """
+
+    days = serializers.IntegerField(read_only=True)
+    group_by = serializers.ListField(child=serializers.CharField(), read_only=True)
+    totals = LLMUsageRowSerializer(read_only=True, allow_null=True)
+    rows = LLMUsageRowSerializer(many=True, read_only=True)
+
+
+class TranscriptMessageSerializer(serializers.Serializer):
+    """
+    Serializador de uma mensagem da transcrição (ativa ou arquivada) de uma sessão.
+    """
+
+    sender = serializers.CharField(read_only=True)
+    message_text = serializers.CharField(read_only=True)
+    timestamp = serializers.DateTimeField(read_only=True, allow_null=True)
+    player = serializers.IntegerField(
+        read_only=True,
+        allow_null=True,
+        help_text="ID do jogador que enviou a mensagem (salas multijogador).",
+    )
+
+
+class GameTranscriptSerializer(serializers.Serializer):
+    """
+    Serializador da transcrição completa de uma sessão.
+    """
+
+    session_id = serializers.CharField(read_only=True)
+    archived = serializers.BooleanField(read_only=True)
+    messages = TranscriptMessageSerializer(many=True, read_only=True)
+
+
+class LeaderboardEntrySerializer(serializers.Serializer):
+    """
+    Serializador de uma posição do ranking.
+    """
+
+    rank = serializers.IntegerField(read_only=True)
+    user_id = serializers.IntegerField(read_only=True)
+    username = serializers.CharField(read_only=True, allow_null=True)
+    score = serializers.IntegerField(read_only=True)
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    """
+    Serializador de uma página do ranking e da posição do usuário autenticado.
+    """
+
+    scope = serializers.CharField(read_only=True)
+    value = serializers.CharField(read_only=True, allow_blank=True)
+    period = serializers.CharField(read_only=True)
+    entries = LeaderboardEntrySerializer(many=True, read_only=True)
+    me = LeaderboardEntrySerializer(read_only=True, allow_null=True)
+
+
+class GameSummarySerializer(serializers.ModelSerializer):
+    """
+    Serializador resumido de uma sessão para o histórico de jogos.
+    O personagem só é revelado depois que o jogo termina.
+    """
+
+    character_name = serializers.SerializerMethodField()
+
+    # Colunas lidas do banco (usadas com .only() pelas views).
+    db_fields = (
+        "pk",
+        "session_id",
+        "theme",
+        "level",
+        "character_name",
+        "is_completed",
+        "score",
+        "attempts_left",
+        "start_time",
+        "end_time",
+        "archived_at",
+        "transcript",
+    )
+
+    class Meta:
+        model = GameSession
+        fields = (
+            "session_id",
+            "theme",
+            "level",
+            "character_name",
+            "is_completed",
+            "score",
+            "attempts_left",
+            "start_time",
+            "end_time",
+        )
+        read_only_fields = fields
+
+    def get_character_name(self, obj):
+        return obj.character_name if obj.is_completed else None
+
+
+class GameHistorySerializer(GameSummarySerializer):
+    """
+    Serializador de uma sessão com a transcrição (ativa ou arquivada).
+    Espera sessões com prefetch_related("chat_messages") para não consultar uma a uma.
+    """
+
+    archived = serializers.SerializerMethodField()
+    messages = serializers.SerializerMethodField()
+
+    class Meta(GameSummarySerializer.Meta):
+        fields = GameSummarySerializer.Meta.fields + ("archived", "messages")
+        read_only_fields = fields
+
+    def get_archived(self, obj):
+        return obj.archived_at is not None
+
+    def get_messages(self, obj):
+        return TranscriptMessageSerializer(get_transcript(obj), many=True).data
+
+
+class GameDetailSerializer(GameHistorySerializer):
+    """
+    Serializador do detalhe de uma sessão: histórico, transcrição e contadores.
+    """
+
+    db_fields = GameHistorySerializer.db_fields + (
+        "user_message_count",
+        "guess_count",
+        "question_count",
+    )
+
+    class Meta(GameHistorySerializer.Meta):
+        fields = GameHistorySerializer.Meta.fields + (
+            "user_message_count",
+            "guess_count",
+            "question_count",
+        )
+        read_only_fields = fields
@@ -1,317 +1,856 @@
+import logging
+
 from app.celery import app as celery_app
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
-from .models import GameSession, ChatMessage
-from .agent import GuessingGameAgent
-
-# Instância global do agente de IA para as tarefas Celery.
-# É importante que o agente seja criado aqui para ser reutilizado pelas tarefas.
-global_game_agent = GuessingGameAgent()
-
-
-# Funções auxiliares síncronas para interagir com o ORM do Django
-def _get_game_session_sync(session_id):
+from .models import GameSession, ChatMessage, RoomPlayer
+from .agent import get_game_agent, get_max_attempts
+from .utils import rooms, session_state, speculation
+from .utils.event_log import append_event, append_events
+from .utils.leaderboards import record_game, record_scores
+from .utils.idempotency import claim_message_processing
+from .utils.llm_ledger import enqueue_calls, flush_ledger
+from .utils.llm_usage import LLMUsage
+from .utils.log import bind_context
+from .utils.optimistic import reject_pending_message
+from .utils.tracing import inject_traceparent
+from .utils.transcripts import archive_completed_sessions
+from .utils.metrics import (
+    GAMES_FAILED,
+    GAMES_FINISHED,
+    GAMES_STARTED,
+    OPTIMISTIC_ECHOES,
+    ROOM_MESSAGES,
+    TASK_SECONDS,
+    observe_stage,
+)
+
+logger = logging.getLogger(__name__)
+
+# O agente de IA é compartilhado por todas as tarefas do processo (ver get_game_agent).
+# Ele não guarda estado de partida, então pode ser usado pelos pools prefork,
+# threads e gevent do Celery. O estado de cada jogo ativo vive no cache Redis
+# (core.utils.session_state) e é persistido em GameSession pelo flusher.
+
+
+# Funções auxiliares síncronas para interagir com o estado do jogo e o ORM do Django
+def _get_game_state_sync(session_id, task=""):
+    """Busca o estado da sessão de jogo no cache, com fallback para o banco (síncrona)."""
+    with observe_stage("state_fetch", task):
+        state = session_state.load_state(session_id)
+    if state is None:
+        logger.debug("Sessão %s não encontrada.", session_id)
+    return state
+
+
+def _get_last_characters_name_sync(user_id: str, theme: str, level: str, task=""):
     """Busca uma sessão de jogo no banco de dados (síncrona)."""
     try:
-        session = GameSession.objects.get(session_id=session_id)
-        print(
-            f"DEBUG Celery Task DB: Sessão {session_id} encontrada no banco de dados."
-        )
-        return session
+        with observe_stage("db_fetch", task):
+            # Busca apenas a coluna necessária, usando o índice (user, theme, level, end_time).
+            data = list(
+                GameSession.objects.filter(
+                    user_id=user_id,
+                    theme=theme,
+                    level=level,
+                )
+                .filter(character_name__gt="")
+                .order_by("-end_time")
+                .values_list("character_name", flat=True)[:100]
+            )
+        logger.debug("%d últimos personagens encontrados (%s/%s).", len(data), theme, level)
+        return data
     except GameSession.DoesNotExist:
-        print(
-            f"DEBUG Celery Task DB: Sessão {session_id} NÃO encontrada no banco de dados."
+        logger.debug("Últimos personagens do usuário %s não encontrados.", user_id)
+        return []
+
+
+def _get_chat_history_sync(state, task=""):
+    """Busca as mensagens da sessão como pares (sender, texto) em ordem cronológica (síncrona)."""
+    with observe_stage("state_fetch", task):
+        return session_state.load_history(state["session_id"], state["pk"])
+
+
+def _save_message_sync(
+    state, sender, message_text, task="", player_id=None, history=True
+):
+    """
+    Salva uma mensagem no banco de dados e no histórico em cache (síncrona).
+    Com history=False a mensagem fica só na transcrição, fora do contexto do LLM.
+    """
+    with observe_stage("persistence", task):
+        ChatMessage.objects.create(
+            session_id=state["pk"],
+            sender=sender,
+            message_text=message_text,
+            player_id=player_id,
         )
-        return None
+        if history:
+            session_state.append_history(state["session_id"], sender, message_text)
+    logger.debug("Mensagem de '%s' salva.", sender)
 
 
-def _get_last_characters_name_sync(user_id: str, theme: str, level: str):
-    """Busca uma sessão de jogo no banco de dados (síncrona)."""
+def _save_state_sync(state, task="", **fields):
+    """
+    Atualiza campos do estado em cache (síncrona).
+    A escrita em GameSession fica a cargo do flusher (write-behind).
+    """
+    with observe_stage("persistence", task):
+        session_state.update_state(state["session_id"], **fields)
+    state.update(fields)
+
+
+def _update_counters_sync(state, usage, input_type=None, task=""):
+    """
+    Atualiza atomicamente os contadores desnormalizados da sessão no cache
+    e reflete os novos valores no estado em memória (síncrona).
+    `input_type` é None quando o turno não tem mensagem do jogador (início do jogo).
+    """
+    increments = {
+        "llm_latency_ms_total": usage.latency_ms,
+        "llm_tokens_total": usage.total_tokens,
+    }
+    if input_type is not None:
+        increments["user_message_count"] = 1
+        increments["guess_count"] = 1 if input_type == "guess" else 0
+        increments["question_count"] = 0 if input_type == "guess" else 1
+
+    with observe_stage("persistence", task):
+        state.update(session_state.increment_state(state["session_id"], **increments))
+
+
+def _record_llm_calls_sync(state, usage, task=""):
+    """
+    Enfileira as chamadas ao LLM do turno no ledger (síncrona).
+    Também roda quando o turno falha, para que as chamadas com erro sejam contabilizadas.
+    """
     try:
-        data = GameSession.objects.filter(
-            user__id=user_id,
-            theme=theme,
-            level=level,
-        ).order_by("-end_time")[:100]
+        with observe_stage("persistence", task):
+            enqueue_calls(state["pk"], usage)
+    except Exception as e:
+        logger.warning("Não foi possível registrar as chamadas ao LLM: %s", e)
 
-        data = [i.character_name for i in data if i.character_name]
-        print(f"DEBUG Celery Task DB: Sessão {level} encontrada no banco de dados.")
-        return data
-    except GameSession.DoesNotExist:
-        print(
-            f"DEBUG Celery Task DB: não foi possivel buscar ultimos personagens para {user_id} NÃO encontrada no banco de dados."
-        )
-        return []
+
+def _schedule_hint_sync(state, version, task=""):
+    """
+    Enfileira a geração da dica antecipada para o histórico com `version` mensagens.
+    Uma falha aqui não afeta o turno: o próximo palpite errado apenas chama o LLM.
+    """
+    if not speculation.should_speculate(state):
+        return
+    try:
+        with observe_stage("publish", task):
+            pregenerate_hint_task.delay(state["session_id"], version)
+    except Exception as e:
+        logger.warning("Não foi possível enfileirar a dica antecipada: %s", e)
 
 
-def _save_message_sync(session, sender, message_text):
-    """Salva uma mensagem no banco de dados (síncrona)."""
-    ChatMessage.objects.create(
-        session=session,
-        sender=sender,
-        message_text=message_text,
-    )
-    print(
-        f"DEBUG Celery Task DB: Mensagem de '{sender}' salva para sessão {session.session_id}."
-    )
+def _broadcast_sync(session_id, event, task=""):
+    """
+    Grava o evento no log da sessão e o envia para o grupo WebSocket (síncrona).
+    O ID do log vai junto no evento para que o cliente possa retomar de onde parou;
+    o traceparent entra depois de gravar no log (o replay não continua o trace).
+    """
+    channel_layer = get_channel_layer()
+    with observe_stage("broadcast", task):
+        event["event_id"] = append_event(session_id, event)
+        inject_traceparent(event)
+        async_to_sync(channel_layer.group_send)(f"game_{session_id}", event)
 
 
-def _calculate_score_sync(session):
-    """Calcula a pontuação da sessão de jogo (síncrona)."""
-    user_messages_count = session.chat_messages.filter(sender="user").count()
+def _broadcast_batch_sync(session_id, events, task=""):
+    """
+    Versão em lote de _broadcast_sync: grava os eventos no log em um único pipeline e os
+    envia ao grupo em um único group_send (event_batch), que o consumer desmembra.
+    Nas salas, cada group_send é replicado para todas as conexões do grupo.
+    """
+    if len(events) <= 1:
+        for event in events:
+            _broadcast_sync(session_id, event, task)
+        return
+    channel_layer = get_channel_layer()
+    with observe_stage("broadcast", task):
+        for event, event_id in zip(events, append_events(session_id, events)):
+            event["event_id"] = event_id
+        batch = {"type": "event_batch", "events": events}
+        inject_traceparent(batch)
+        async_to_sync(channel_layer.group_send)(f"game_{session_id}", batch)
+
+
+def _calculate_score_sync(state, task=""):
+    """Calcula a pontuação da sessão de jogo a partir do contador desnormalizado."""
+    user_messages_count = state["user_message_count"]
     base_score = 100
     deduction_per_message = 5
     score = max(0, base_score - (user_messages_count * deduction_per_message))
-    print(
-        f"DEBUG Celery Task: Pontuação calculada para sessão {session.session_id}: {score}"
-    )
+    logger.debug("Pontuação calculada: %s", score)
     return score
 
 
+def _finish_game_sync(state, agent, outcome, message, task=""):
+    """
+    Encerra o jogo: calcula a pontuação, persiste a sessão de forma síncrona
+    e envia o evento de fim de jogo com a imagem do personagem.
+    """
+    session_id = state["session_id"]
+    _save_state_sync(
+        state,
+        task,
+        is_completed=True,
+        score=_calculate_score_sync(state, task),
+        end_time=timezone.now(),
+    )
+    with observe_stage("persistence", task):
+        session_state.flush_state(session_id)
+        # Atualiza os rankings incrementalmente (ZINCRBY) em vez de agregar GameSession.
+        record_game(
+            session_id,
+            state.get("user_id"),
+            state["theme"],
+            state["level"],
+            state["score"],
+            state["end_time"],
+        )
+    GAMES_FINISHED.labels(outcome=outcome).inc()
+
+    # Gera a imagem do personagem
+    image_prompt = agent.generate_character_image_prompt(state["character_name"])
+    image_url = agent.generate_image(image_prompt)
+    logger.info(
+        "Jogo terminado (%s) para %s: %.50s", outcome, state["character_name"], image_url
+    )
+
+    _broadcast_sync(
+        session_id,
+        {
+            "type": "game_over",
+            "message": message,
+            "score": state["score"],
+            "character_name": state["character_name"],
+            "character_image_url": image_url,  # NOVO: Envia a URL da imagem
+        },
+        task,
+    )
+
+
+def _save_room_players_sync(state, room, task=""):
+    """Grava a pontuação e os contadores dos jogadores da sala (duas consultas, em lote)."""
+    by_user = {player["user_id"]: player for player in room["players"]}
+    with observe_stage("persistence", task):
+        players = list(RoomPlayer.objects.filter(session_id=state["pk"]))
+        for room_player in players:
+            stats = by_user.get(room_player.user_id)
+            if stats is not None:
+                room_player.score = stats["score"]
+                room_player.question_count = stats["question_count"]
+                room_player.guess_count = stats["guess_count"]
+        RoomPlayer.objects.bulk_update(
+            players, ["score", "question_count", "guess_count"]
+        )
+
+
+def _finish_room_game_sync(state, room, agent, outcome, message, events, task=""):
+    """
+    Encerra o jogo de uma sala: persiste a sessão e os jogadores, soma a pontuação de
+    cada jogador aos rankings e acrescenta o fim de jogo, com o placar, aos `events`.
+    """
+    session_id = state["session_id"]
+    _save_state_sync(
+        state,
+        task,
+        is_completed=True,
+        score=_calculate_score_sync(state, task),
+        end_time=timezone.now(),
+    )
+    with observe_stage("persistence", task):
+        session_state.flush_state(session_id)
+    _save_room_players_sync(state, room, task)
+    with observe_stage("persistence", task):
+        record_scores(
+            session_id,
+            {player["user_id"]: player["score"] for player in room["players"]},
+            state["theme"],
+            state["level"],
+            state["end_time"],
+        )
+    GAMES_FINISHED.labels(outcome=outcome).inc()
+
+    image_url = agent.generate_image(
+        agent.generate_character_image_prompt(state["character_name"])
+    )
+    logger.info("Jogo da sala terminado (%s) para %s.", outcome, state["character_name"])
+    events.append(
+        {
+            "type": "game_over",
+            "message": message,
+            "score": state["score"],
+            "character_name": state["character_name"],
+            "character_image_url": image_url,
+            "standings": rooms.standings(room),
+        }
+    )
+
+
+def _process_room_turn(state, room, chat_history, agent, item, events, task=""):
+    """
+    Processa uma mensagem da fila da sala. Os eventos do turno são acumulados em
+    `events`; a lista pendente é enviada (um broadcast) antes de cada chamada ao LLM,
+    e a lista retornada segue para o próximo turno ou para o envio final do lote.
+    """
+    session_id = state["session_id"]
+    user_id = item["user_id"]
+    player_message = item["message"]
+    provisional_id = item.get("provisional_id")
+    player = rooms.get_player(room, user_id)
+
+    if player is None:
+        reason = "Você não participa desta sala."
+    elif state["is_completed"]:
+        reason = "O jogo já terminou."
+    else:
+        reason = rooms.turn_rejection(room, user_id)
+    if reason:
+        logger.debug("Mensagem da sala recusada (%s): %s", user_id, reason)
+        ROOM_MESSAGES.labels(result="rejected").inc()
+        if provisional_id:
+            reject_pending_message(session_id, provisional_id, reason)
+        return events
+
+    user_event = {
+        "type": "chat_message",
+        "sender": "user",
+        "message": player_message,
+        "player": player["username"],
+    }
+    if provisional_id:
+        user_event["provisional_id"] = provisional_id
+        OPTIMISTIC_ECHOES.labels(result="confirmed").inc()
+
+    # Mensagem repetida na sala: a resposta já dada é reaproveitada, sem chamar o LLM e
+    # fora do contexto da conversa (vai apenas para a transcrição).
+    normalized = rooms.normalize_message(player_message)
+    cached = rooms.get_answer(session_id, normalized)
+    if cached is not None:
+        answer = (
+            rooms.DUPLICATE_GUESS_REPLY
+            if cached["input_type"] == "guess"
+            else cached["answer"]
+        )
+        _save_message_sync(
+            state, "user", player_message, task, player_id=user_id, history=False
+        )
+        _save_message_sync(state, "ai", answer, task, history=False)
+        rooms.update_player(session_id, room, user_id)
+        events += [
+            user_event,
+            {"type": "chat_message", "sender": "ai", "message": answer, "duplicate": True},
+            rooms.room_update_event(room),
+        ]
+        ROOM_MESSAGES.labels(result="duplicate").inc()
+        return events
+
+    _save_message_sync(state, "user", player_message, task, player_id=user_id)
+    _broadcast_batch_sync(session_id, events + [user_event], task)
+    events = []
+
+    usage = LLMUsage()
+    try:
+        input_type = agent.classify_user_input(player_message, usage=usage)
+        if input_type == "guess":
+            with observe_stage("persistence", task):
+                state.update(session_state.increment_state(session_id, attempts_left=-1))
+            events.append(
+                {"type": "update_attempts", "attempts_left": state["attempts_left"]}
+            )
+
+        ai_response = agent.process_player_input(
+            player_message,
+            state["attempts_left"],
+            state["character_name"],
+            state["theme"],
+            state["level"],
+            agent.build_chat_history(chat_history),
+            seed=session_id,
+            usage=usage,
+        )
+        _save_message_sync(state, "ai", ai_response, task)
+        _update_counters_sync(state, usage, input_type, task)
+        chat_history += [("user", player_message), ("ai", ai_response)]
+
+        guessed = "Sim, você acertou!" in ai_response
+        points = settings.ROOM_QUESTION_POINTS if input_type == "question" else 0
+        if guessed:
+            points += _calculate_score_sync(state, task)
+        else:
+            rooms.cache_answer(session_id, normalized, input_type, ai_response)
+        rooms.update_player(session_id, room, user_id, input_type, points)
+        events += [
+            {"type": "chat_message", "sender": "ai", "message": ai_response},
+            rooms.room_update_event(room),
+        ]
+        ROOM_MESSAGES.labels(result="answered").inc()
+
+        if guessed:
+            _finish_room_game_sync(
+                state,
+                room,
+                agent,
+                "guessed",
+                f"{player['username']} adivinhou o personagem: {state['character_name']}!",
+                events,
+                task,
+            )
+        elif state["attempts_left"] <= 0 and input_type == "guess":
+            _finish_room_game_sync(
+                state,
+                room,
+                agent,
+                "out_of_attempts",
+                f"As tentativas da sala acabaram! O personagem era: {state['character_name']}.",
+                events,
+                task,
+            )
+    except Exception as e:
+        logger.exception("Erro ao processar mensagem da sala: %s", e)
+        GAMES_FAILED.labels(task=task).inc()
+        events.append(
+            {
+                "type": "error",
+                "message": f"Erro ao processar a mensagem de {player['username']}: {e}",
+            }
+        )
+    finally:
+        _record_llm_calls_sync(state, usage, task)
+    return events
+
+
+def _drain_room(session_id, task=""):
+    """
+    Processa a fila de mensagens da sala enquanto houver mensagens, se nenhum outro
+    worker já estiver com ela. O estado, a sala e o histórico são lidos uma vez por lote.
+    """
+    while True:
+        token = rooms.claim_drain(session_id)
+        if token is None:
+            return "queued 📥"
+        try:
+            while True:
+                items = rooms.pop_messages(session_id, settings.ROOM_DRAIN_BATCH)
+                if not items:
+                    break
+                state = _get_game_state_sync(session_id, task)
+                if state is None:
+                    GAMES_FAILED.labels(task=task).inc()
+                    for item in items:
+                        if item.get("provisional_id"):
+                            reject_pending_message(
+                                session_id,
+                                item["provisional_id"],
+                                "Sessão de jogo não encontrada.",
+                            )
+                    continue
+                room = rooms.load_room(session_id, state["mode"])
+                chat_history = _get_chat_history_sync(state, task)
+                agent = get_game_agent()
+                events = []
+                try:
+                    for item in items:
+                        rooms.renew_drain(session_id, token)
+                        try:
+                            events = _process_room_turn(
+                                state, room, chat_history, agent, item, events, task
+                            )
+                        except Exception as e:
+                            logger.exception("Erro na fila da sala: %s", e)
+                            GAMES_FAILED.labels(task=task).inc()
+                finally:
+                    _broadcast_batch_sync(session_id, events, task)
+        finally:
+            rooms.release_drain(session_id, token)
+        # Uma mensagem enfileirada entre o último pop e a liberação ficaria parada.
+        if not rooms.has_pending(session_id):
+            return "success 🆗"
+
+
 @celery_app.task(name="process_start_game_task")
+@TASK_SECONDS.labels(task="process_start_game_task").time()
 def process_start_game_task(session_id, theme, level, user_id):
     """
     Tarefa Celery para iniciar um novo jogo.
     Define o número de tentativas e envia a primeira dica da IA.
     """
-    print(
-        f"DEBUG Celery Task: Iniciando tarefa process_start_game_task para sessão {session_id}"
-    )
-    game_session = _get_game_session_sync(session_id)
-
-    if not game_session:
-        print(
-            f"ERRO Celery Task: Sessão {session_id} não encontrada para iniciar jogo."
-        )
+    task_name = "process_start_game_task"
+    bind_context(session_id=session_id, user_id=user_id)
+    logger.debug("Iniciando jogo (%s/%s).", theme, level)
+    state = _get_game_state_sync(session_id, task_name)
+
+    if not state:
+        logger.error("Sessão não encontrada para iniciar jogo.")
+        GAMES_FAILED.labels(task=task_name).inc()
         return
 
-    if user_id and not game_session.user_id:
+    if user_id and not state.get("user_id"):
         try:
-            user = User.objects.get(id=user_id)
-            game_session.user = user
-            game_session.save()
-            print(
-                f"DEBUG Celery Task DB: Usuário {user.username} associado à sessão {session_id}."
-            )
+            with observe_stage("db_fetch", task_name):
+                user = User.objects.get(id=user_id)
+            with observe_stage("persistence", task_name):
+                GameSession.objects.filter(pk=state["pk"]).update(user=user)
+            _save_state_sync(state, task_name, user_id=user.id)
+            logger.debug("Usuário %s associado à sessão.", user.username)
         except User.DoesNotExist:
-            print(
-                f"AVISO Celery Task DB: Usuário com ID {user_id} não encontrado para associar à sessão {session_id}."
-            )
+            logger.warning("Usuário %s não encontrado para associar à sessão.", user_id)
         except Exception as e:
-            print(
-                f"ERRO Celery Task DB: Erro ao associar usuário à sessão {session_id}: {e}"
-            )
+            logger.exception("Erro ao associar usuário à sessão: %s", e)
 
+    usage = LLMUsage()
     try:
-        # Define o número de tentativas com base no nível
-        # Padrão para 7 se "Aleatorio" ou não mapeado
-        attempts_map = {"Facil": 10, "Medio": 8, "Dificil": 5}
-        game_session.attempts_left = attempts_map.get(level, 7)
-        game_session.theme = theme
-        game_session.level = level
-        game_session.save()  # Salva as tentativas iniciais e outros dados
-
         last_character_names = _get_last_characters_name_sync(
             user_id,
             theme,
             level,
+            task_name,
         )
 
-        # Inicia o jogo com o agente de IA (que internamente define o character_name e gera a primeira dica)
-        initial_hint = global_game_agent.start_new_game(
+        # Inicia o jogo com o agente de IA (que escolhe o personagem e gera a primeira dica)
+        character_name, initial_hint = get_game_agent().start_new_game(
             theme,
             level,
             last_character_names,
+            seed=session_id,
+            usage=usage,
         )
-        game_session.character_name = (
-            global_game_agent.character_name
-        )  # Atualiza o nome do personagem após a IA escolher
-        game_session.save()  # Salva o nome do personagem
 
-        _save_message_sync(game_session, "ai", initial_hint)
+        # Define o número de tentativas com base no nível
+        # Padrão para 7 se "Aleatorio" ou não mapeado
+        _save_state_sync(
+            state,
+            task_name,
+            attempts_left=get_max_attempts(level),
+            theme=theme,
+            level=level,
+            character_name=character_name,
+        )
+        _update_counters_sync(state, usage, task=task_name)
+
+        _save_message_sync(state, "ai", initial_hint, task_name)
 
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"game_{session_id}",
+        _broadcast_sync(
+            session_id,
             {
                 "type": "chat_message",
                 "sender": "ai",
                 "message": initial_hint,
             },
+            task_name,
         )
         # Envia a contagem de tentativas para o frontend
-        async_to_sync(channel_layer.group_send)(
-            f"game_{session_id}",
+        _broadcast_sync(
+            session_id,
             {
                 "type": "update_attempts",
-                "attempts_left": game_session.attempts_left,
+                "attempts_left": state["attempts_left"],
             },
+            task_name,
         )
-        print(
-            f"DEBUG Celery Task: Jogo iniciado e dica inicial enviada para sessão {session_id}."
-        )
+        if rooms.is_room(state):
+            # A vez do primeiro jogador começa a contar com a primeira dica.
+            rooms.reset_turn_clock(session_id)
+        else:
+            # O histórico tem apenas a dica inicial.
+            _schedule_hint_sync(state, 1, task_name)
+        if character_name:
+            GAMES_STARTED.labels(theme=theme, level=level).inc()
+            logger.info("Jogo iniciado e dica inicial enviada.")
+        else:
+            # start_new_game falhou e devolveu apenas a mensagem de desculpas.
+            GAMES_FAILED.labels(task=task_name).inc()
+            logger.warning("O agente não escolheu um personagem; jogo não iniciado.")
     except Exception as e:
-        print(
-            f"ERRO Celery Task: Erro ao processar início do jogo para sessão {session_id}: {str(e)}"
-        )
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"game_{session_id}",
+        logger.exception("Erro ao processar início do jogo: %s", e)
+        GAMES_FAILED.labels(task=task_name).inc()
+        _broadcast_sync(
+            session_id,
             {"type": "error", "message": f"Erro ao iniciar o jogo: {str(e)}"},
+            task_name,
         )
+    finally:
+        _record_llm_calls_sync(state, usage, task_name)
 
 
 @celery_app.task(name="process_player_message_task")
-def process_player_message_task(session_id, player_message, user_id_from_api):
+@TASK_SECONDS.labels(task="process_player_message_task").time()
+def process_player_message_task(
+    session_id,
+    player_message,
+    user_id_from_api,
+    client_message_id=None,
+    provisional_id=None,
+):
     """
     Tarefa Celery para processar a mensagem de um jogador.
     Classifica a entrada, interage com a IA, gerencia tentativas e envia a resposta.
+    Mensagens com client_message_id já processado são ignoradas (reentregas e reenvios).
+    `provisional_id` é o ID do eco otimista enviado pela API: o chat_message do jogador
+    o confirma e, se a mensagem não puder ser processada, ele é rejeitado.
     """
-    print(
-        f"DEBUG Celery Task: Iniciando tarefa process_player_message_task para sessão {session_id}, mensagem: '{player_message[:50]}'"
+    task_name = "process_player_message_task"
+    bind_context(
+        session_id=session_id,
+        user_id=user_id_from_api,
+        client_message_id=client_message_id,
     )
-    game_session = _get_game_session_sync(session_id)
+    logger.debug("Processando mensagem do jogador: '%.50s'", player_message)
+    if client_message_id and not claim_message_processing(
+        session_id, client_message_id
+    ):
+        logger.debug("Mensagem já processada; ignorando.")
+        return "duplicate 🔁"
+    state = _get_game_state_sync(session_id, task_name)
+
+    if not state:
+        logger.error("Sessão não encontrada para processar mensagem do jogador.")
+        GAMES_FAILED.labels(task=task_name).inc()
+        if provisional_id:
+            reject_pending_message(
+                session_id, provisional_id, "Sessão de jogo não encontrada."
+            )
+        return
 
-    if not game_session:
-        print(
-            f"ERRO Celery Task: Sessão {session_id} não encontrada para processar mensagem do jogador."
+    if rooms.is_room(state):
+        # Salas: a mensagem entra na fila da sala (participação e vez verificadas lá).
+        rooms.enqueue_message(
+            session_id,
+            {
+                "user_id": user_id_from_api,
+                "message": player_message,
+                "provisional_id": provisional_id,
+            },
         )
-        return
+        return _drain_room(session_id, task_name)
 
     if (
-        game_session.user
+        state.get("user_id")
         and user_id_from_api
-        and game_session.user.id != user_id_from_api
+        and state["user_id"] != user_id_from_api
     ):
-        print(
-            f"AVISO Celery Task: Usuário {user_id_from_api} tentando enviar mensagem para sessão {session_id} de outro usuário {game_session.user.id}."
+        logger.warning(
+            "Mensagem para a sessão de outro usuário (%s); recusada.", state["user_id"]
         )
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"game_{session_id}",
+        _broadcast_sync(
+            session_id,
             {
                 "type": "error",
                 "message": "Você não tem permissão para enviar mensagens para esta sessão.",
             },
+            task_name,
         )
         return
 
-    _save_message_sync(game_session, "user", player_message)
-    print(f"DEBUG Celery Task: Mensagem do usuário salva para sessão {session_id}.")
+    if state["is_completed"]:
+        logger.warning("Mensagem recebida para sessão já encerrada; ignorando.")
+        if provisional_id:
+            reject_pending_message(session_id, provisional_id, "O jogo já terminou.")
+        return
 
-    channel_layer = get_channel_layer()
-    # Envia a mensagem do jogador para o grupo de chat (para que o cliente veja que foi enviada)
-    async_to_sync(channel_layer.group_send)(
-        f"game_{session_id}",
-        {
-            "type": "chat_message",
-            "sender": "user",
-            "message": player_message,
-        },
-    )
+    # O histórico é lido antes de salvar a mensagem atual, que vai como entrada do prompt.
+    chat_history = _get_chat_history_sync(state, task_name)
+    # A dica antecipada vale apenas para este histórico; a mensagem atual a invalida.
+    hint = speculation.take_hint(state, len(chat_history))
+    _save_message_sync(state, "user", player_message, task_name)
+    logger.debug("Mensagem do usuário salva.")
+
+    # Envia a mensagem do jogador para o grupo de chat; com provisional_id, o cliente
+    # confirma o eco otimista já exibido em vez de repetir a mensagem.
+    user_event = {"type": "chat_message", "sender": "user", "message": player_message}
+    if provisional_id:
+        user_event["provisional_id"] = provisional_id
+        OPTIMISTIC_ECHOES.labels(result="confirmed").inc()
+    _broadcast_sync(session_id, user_event, task_name)
+
+    agent = get_game_agent()
+    usage = LLMUsage()
 
     try:
         # Classifica a entrada do usuário
-        input_type = global_game_agent.classify_user_input(player_message)
-        print(f"DEBUG Celery Task: Entrada do usuário classificada como: {input_type}")
+        input_type = agent.classify_user_input(player_message, usage=usage)
+        logger.debug("Entrada do usuário classificada como: %s", input_type)
 
         # Decrementa tentativas apenas se for uma tentativa de adivinhação
         if input_type == "guess":
-            game_session.attempts_left -= 1
-            game_session.save()  # Salva a nova contagem de tentativas
-            print(
-                f"DEBUG Celery Task: Tentativas restantes para sessão {session_id}: {game_session.attempts_left}"
-            )
+            with observe_stage("persistence", task_name):
+                state.update(
+                    session_state.increment_state(session_id, attempts_left=-1)
+                )  # Decrementa atomicamente a contagem de tentativas
+            logger.debug("Tentativas restantes: %s", state["attempts_left"])
             # Envia a contagem de tentativas atualizada para o frontend
-            async_to_sync(channel_layer.group_send)(
-                f"game_{session_id}",
+            _broadcast_sync(
+                session_id,
                 {
                     "type": "update_attempts",
-                    "attempts_left": game_session.attempts_left,
+                    "attempts_left": state["attempts_left"],
                 },
+                task_name,
             )
 
-        ai_response = global_game_agent.process_player_input(
-            player_message, game_session.attempts_left
-        )
-        print(
-            f"DEBUG Celery Task: Resposta da IA para sessão {session_id}: {ai_response[:50]}..."
-        )
+        ai_response = None
+        if (
+            input_type == "guess"
+            and state["attempts_left"] > 0
+            and speculation.enabled_for(state)
+            and not speculation.may_be_correct_guess(
+                player_message, state["character_name"]
+            )
+        ):
+            # Palpite certamente errado: responde com a dica antecipada, sem o LLM.
+            if hint is not None:
+                ai_response = speculation.incorrect_guess_reply(
+                    hint, state["attempts_left"]
+                )
+                hint = None
+            else:
+                speculation.record_miss()
+        if hint is not None:
+            speculation.discard_hint(state)
+        if ai_response is None:
+            ai_response = agent.process_player_input(
+                player_message,
+                state["attempts_left"],
+                state["character_name"],
+                state["theme"],
+                state["level"],
+                agent.build_chat_history(chat_history),
+                seed=session_id,
+                usage=usage,
+            )
+        logger.debug("Resposta da IA: %.50s...", ai_response)
 
-        _save_message_sync(game_session, "ai", ai_response)
+        _save_message_sync(state, "ai", ai_response, task_name)
+        _update_counters_sync(state, usage, input_type, task_name)
 
-        async_to_sync(channel_layer.group_send)(
-            f"game_{session_id}",
+        _broadcast_sync(
+            session_id,
             {"type": "chat_message", "sender": "ai", "message": ai_response},
+            task_name,
         )
 
         # Lógica de fim de jogo
         if "Sim, você acertou!" in ai_response:
-            game_session.is_completed = True
-            game_session.character_name = global_game_agent.character_name
-            game_session.score = _calculate_score_sync(game_session)
-            game_session.end_time = timezone.now()
-            game_session.save()
-
-            # Gera a imagem do personagem
-            image_prompt = global_game_agent.generate_character_image_prompt()
-            image_url = global_game_agent.generate_image(image_prompt)
-            print(
-                f"DEBUG Celery Task: Imagem gerada para {game_session.character_name}: {image_url[:50]}..."
-            )
-
-            async_to_sync(channel_layer.group_send)(
-                f"game_{session_id}",
-                {
-                    "type": "game_over",
-                    "message": f"Parabéns! Você adivinhou o personagem: {game_session.character_name}!",
-                    "score": game_session.score,
-                    "character_name": game_session.character_name,
-                    "character_image_url": image_url,  # NOVO: Envia a URL da imagem
-                },
+            _finish_game_sync(
+                state,
+                agent,
+                "guessed",
+                f"Parabéns! Você adivinhou o personagem: {state['character_name']}!",
+                task_name,
             )
         elif (
-            game_session.attempts_left <= 0 and input_type == "guess"
+            state["attempts_left"] <= 0 and input_type == "guess"
         ):  # Fim de jogo por tentativas esgotadas
             # Garante que o jogo só termine por tentativas esgotadas se a última foi um guess
             # Pontuação final mesmo sem acertar
-            game_session.is_completed = True
-            game_session.character_name = global_game_agent.character_name
-            game_session.score = _calculate_score_sync(game_session)
-            game_session.end_time = timezone.now()
-            game_session.save()
-
-            # Gera a imagem do personagem
-            image_prompt = global_game_agent.generate_character_image_prompt()
-            image_url = global_game_agent.generate_image(image_prompt)
-            print(
-                f"DEBUG Celery Task: Jogo terminado por tentativas para {game_session.character_name}: {image_url[:50]}..."
-            )
-
-            async_to_sync(channel_layer.group_send)(
-                f"game_{session_id}",
-                {
-                    "type": "game_over",
-                    "message": f"Suas tentativas acabaram! O personagem era: {game_session.character_name}.",
-                    "score": game_session.score,
-                    "character_name": game_session.character_name,
-                    "character_image_url": image_url,  # NOVO: Envia a URL da imagem
-                },
+            _finish_game_sync(
+                state,
+                agent,
+                "out_of_attempts",
+                f"Suas tentativas acabaram! O personagem era: {state['character_name']}.",
+                task_name,
             )
+        else:
+            # Antecipa a próxima dica enquanto o jogador pensa (mensagem e resposta já
+            # estão no histórico).
+            _schedule_hint_sync(state, len(chat_history) + 2, task_name)
 
         return "success 🆗"
 
     except Exception as e:
-        print(
-            f"ERRO Celery Task: Erro ao processar mensagem do jogador para sessão {session_id}: {str(e)}"
-        )
-        async_to_sync(channel_layer.group_send)(
-            f"game_{session_id}",
+        logger.exception("Erro ao processar mensagem do jogador: %s", e)
+        GAMES_FAILED.labels(task=task_name).inc()
+        _broadcast_sync(
+            session_id,
             {
                 "type": "error",
                 "message": f"Erro ao processar sua mensagem com a IA: {str(e)}",
             },
+            task_name,
         )
         return "fail ❌"
+    finally:
+        _record_llm_calls_sync(state, usage, task_name)
+
+
+@celery_app.task(name="pregenerate_hint_task", ignore_result=True)
+@TASK_SECONDS.labels(task="pregenerate_hint_task").time()
+def pregenerate_hint_task(session_id, version):
+    """
+    Tarefa Celery que gera em segundo plano a próxima dica extra do jogo para o histórico
+    com `version` mensagens e a guarda no estado em cache (core.utils.speculation).
+    """
+    task_name = "pregenerate_hint_task"
+    bind_context(session_id=session_id)
+    state = _get_game_state_sync(session_id, task_name)
+    if not speculation.should_speculate(state):
+        return
+    chat_history = _get_chat_history_sync(state, task_name)
+    if len(chat_history) != version:
+        logger.debug("Conversa mudou antes da dica antecipada; nada gerado.")
+        return
+
+    agent = get_game_agent()
+    usage = LLMUsage()
+    try:
+        hint = agent.generate_extra_hint(
+            # A dica acompanha um palpite errado, que consome uma tentativa.
+            state["attempts_left"] - 1,
+            state["character_name"],
+            state["theme"],
+            state["level"],
+            agent.build_chat_history(chat_history),
+            seed=session_id,
+            usage=usage,
+        )
+        if not speculation.store_hint(session_id, version, hint, usage):
+            logger.debug("Conversa mudou durante a dica antecipada; descartada.")
+    except Exception as e:
+        logger.warning("Erro ao gerar a dica antecipada: %s", e)
+    finally:
+        _record_llm_calls_sync(state, usage, task_name)
+
+
+@celery_app.task(name="flush_session_states_task", ignore_result=True)
+def flush_session_states_task():
+    """
+    Tarefa periódica (Celery beat) que persiste em GameSession o estado em cache
+    das sessões alteradas desde o último flush (write-behind).
+    """
+    flushed = session_state.flush_dirty_states()
+    if flushed:
+        logger.debug("%d sessões persistidas a partir do cache.", flushed)
+
+
+@celery_app.task(name="archive_completed_sessions_task", ignore_result=True)
+def archive_completed_sessions_task():
+    """
+    Tarefa periódica (Celery beat) que compacta as mensagens das sessões concluídas
+    há mais de CHAT_ARCHIVE_RETENTION_DAYS dias em GameSession.transcript.
+    """
+    sessions, messages = archive_completed_sessions(
+        settings.CHAT_ARCHIVE_RETENTION_DAYS,
+        batch_size=settings.CHAT_ARCHIVE_BATCH_SIZE,
+    )
+    if sessions:
+        logger.info(
+            "%d sessões arquivadas (%d mensagens compactadas).", sessions, messages
+        )
+
+
+@celery_app.task(name="flush_llm_ledger_task", ignore_result=True)
+def flush_llm_ledger_task():
+    """
+    Tarefa periódica (Celery beat) que grava em lote, como LLMCall, as chamadas
+    ao LLM enfileiradas pelos turnos desde o último flush.
+    """
+    written = flush_ledger(settings.LLM_LEDGER_BATCH_SIZE)
+    if written:
+        logger.debug("%d chamadas ao LLM gravadas no ledger.", written)
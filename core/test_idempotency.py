@@ -0,0 +1,34 @@
+from core.tests import RedisTestCase
+from core.utils import idempotency
+
+
+class IdempotencyTests(RedisTestCase):
+    def test_repeated_submission_returns_the_original_ack(self):
+        ack = {"status": "success", "provisional_id": "p1"}
+
+        self.assertIsNone(
+            idempotency.claim_message_submission(
+                self.user.id, self.session_id, "m1", ack
+            )
+        )
+        self.assertEqual(
+            idempotency.claim_message_submission(
+                self.user.id, self.session_id, "m1", {"provisional_id": "p2"}
+            ),
+            ack,
+        )
+
+    def test_released_submission_can_be_claimed_again(self):
+        ack = {"status": "success"}
+        idempotency.claim_message_submission(self.user.id, self.session_id, "m1", ack)
+        idempotency.release_message_submission(self.user.id, self.session_id, "m1")
+
+        self.assertIsNone(
+            idempotency.claim_message_submission(
+                self.user.id, self.session_id, "m1", ack
+            )
+        )
+
+    def test_message_is_processed_once(self):
+        self.assertTrue(idempotency.claim_message_processing(self.session_id, "m1"))
+        self.assertFalse(idempotency.claim_message_processing(self.session_id, "m1"))
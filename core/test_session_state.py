@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.db import OperationalError
+
+from core.tests import RedisTestCase
+from core.utils import session_state
+from core.utils.redis_client import get_redis
+
+
+class SessionStateTests(RedisTestCase):
+    def test_flush_persists_the_cached_state(self):
+        session = self.create_session(attempts_left=10)
+        session_state.seed_state(session)
+
+        session_state.update_state(self.session_id, attempts_left=3, score=40)
+        session.refresh_from_db()
+        self.assertEqual(session.attempts_left, 10)
+
+        self.assertTrue(session_state.flush_state(self.session_id))
+        session.refresh_from_db()
+        self.assertEqual((session.attempts_left, session.score), (3, 40))
+
+    def test_reloads_from_the_database_after_eviction(self):
+        session = self.create_session(attempts_left=4)
+        session_state.seed_state(session)
+        get_redis().delete(session_state._state_key(self.session_id))
+
+        state = session_state.load_state(self.session_id)
+        self.assertEqual(state["attempts_left"], 4)
+        self.assertEqual(state["pk"], session.pk)
+
+    def test_writes_after_eviction_never_leave_a_partial_state(self):
+        session = self.create_session(attempts_left=4)
+        session_state.seed_state(session)
+        get_redis().delete(session_state._state_key(self.session_id))
+
+        session_state.update_state(self.session_id, score=5)
+        state = session_state.load_state(self.session_id)
+        self.assertEqual((state["pk"], state["score"]), (session.pk, 5))
+
+    def test_increment_of_an_unknown_session_creates_nothing(self):
+        self.assertEqual(
+            session_state.increment_state(self.session_id, guess_count=1), {}
+        )
+        self.assertFalse(get_redis().exists(session_state._state_key(self.session_id)))
+
+    def test_late_flush_does_not_reopen_a_finished_game(self):
+        session = self.create_session(attempts_left=10)
+        session_state.seed_state(session)
+        session_state.update_state(self.session_id, attempts_left=9)
+        # O flusher periódico lê o estado com o jogo ainda em andamento...
+        stale = session_state._take_for_flush(self.session_id)
+
+        # ...o jogo termina e faz o flush síncrono...
+        session_state.update_state(self.session_id, is_completed=True, score=50)
+        session_state.flush_state(self.session_id)
+        # ...e só então o UPDATE do flusher chega ao banco.
+        session_state._write_state(stale)
+
+        session.refresh_from_db()
+        self.assertEqual((session.is_completed, session.score), (True, 50))
+
+    def test_failed_flush_keeps_the_sessions_dirty(self):
+        session = self.create_session()
+        session_state.seed_state(session)
+        session_state.update_state(self.session_id, score=5)
+
+        with mock.patch.object(
+            session_state, "_write_state", side_effect=OperationalError("locked")
+        ):
+            with self.assertRaises(OperationalError):
+                session_state.flush_dirty_states()
+
+        self.assertTrue(
+            get_redis().sismember(session_state.DIRTY_SET_KEY, self.session_id)
+        )
+        session_state.flush_dirty_states()
+        session.refresh_from_db()
+        self.assertEqual(session.score, 5)
@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from core.tests import RedisTestCase
+from core.utils import session_state, speculation
+
+
+class TakeHintTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        session_state.seed_state(self.create_session(character_name="Darth Vader"))
+        session_state.seed_history(
+            self.session_id, [("user", "Você é homem?"), ("ai", "Sim.")]
+        )
+
+    def store(self, version):
+        return session_state.store_speculative_hint(
+            self.session_id, version, "Uso uma capa preta.", 30, Decimal("0.0001")
+        )
+
+    def test_returns_the_hint_for_the_current_history(self):
+        self.assertTrue(self.store(2))
+        state = session_state.load_state(self.session_id)
+
+        self.assertEqual(speculation.take_hint(state, 2), "Uso uma capa preta.")
+        self.assertNotIn("spec_hint", session_state.load_state(self.session_id))
+
+    def test_rejects_a_hint_for_an_old_history(self):
+        self.assertFalse(self.store(1))
+
+        self.assertTrue(self.store(2))
+        session_state.append_history(self.session_id, "user", "É o Batman?")
+        state = session_state.load_state(self.session_id)
+
+        self.assertIsNone(speculation.take_hint(state, 3))
+        self.assertNotIn("spec_hint", session_state.load_state(self.session_id))
@@ -1,3 +1,137 @@
-from django.test import TestCase
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core import tasks
+from core.models import GameSession, RoomPlayer
+from core.utils import rooms, session_state
+from core.utils.redis_client import get_redis
+
+# Estes testes usam o Redis de REDIS_URL; cada teste trabalha com um session_id próprio
+# e apaga as suas chaves no fim.
+
+
+class RedisTestCase(TestCase):
+    """TestCase com um session_id novo por teste e limpeza das chaves dele no Redis."""
+
+    def setUp(self):
+        self.session_id = f"test-{uuid.uuid4().hex}"
+        self.user = User.objects.create_user("ana", "ana@example.com", "senha")
+        # Conjunto de sessões alteradas próprio do teste: o flush não grava, no banco de
+        # teste, sessões de outros processos que usam o mesmo Redis.
+        patcher = mock.patch.object(
+            session_state, "DIRTY_SET_KEY", f"whoami:game:dirty:{self.session_id}"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        client = get_redis()
+        for key in client.scan_iter(f"whoami:*{self.session_id}*"):
+            client.delete(key)
+
+    def create_session(self, **fields):
+        fields.setdefault("theme", "Filmes")
+        fields.setdefault("level", "Facil")
+        return GameSession.objects.create(
+            session_id=self.session_id, user=self.user, **fields
+        )
+
+
+class AddPlayerTests(RedisTestCase):
+    def test_joins_until_the_room_is_full(self):
+        bia = User.objects.create_user("bia", "bia@example.com", "senha")
+        caio = User.objects.create_user("caio", "caio@example.com", "senha")
+
+        self.assertEqual(
+            rooms.add_player(self.session_id, self.user.id, "ana", 2), "joined"
+        )
+        self.assertEqual(
+            rooms.add_player(self.session_id, self.user.id, "ana", 2), "already"
+        )
+        self.assertEqual(rooms.add_player(self.session_id, bia.id, "bia", 2), "joined")
+        self.assertEqual(rooms.add_player(self.session_id, caio.id, "caio", 2), "full")
+
+        room = rooms.load_room(self.session_id, "turns")
+        self.assertEqual([p["username"] for p in room["players"]], ["ana", "bia"])
+        self.assertEqual(rooms.turn_user_id(room), self.user.id)
+
+    def test_rejoin_after_expiry_keeps_the_score(self):
+        session = self.create_session(mode="turns", max_players=4)
+        RoomPlayer.objects.create(session=session, user=self.user, score=7)
+        rooms.add_player(self.session_id, self.user.id, "ana", 4)
+        get_redis().delete(
+            rooms._players_key(self.session_id),
+            rooms._order_key(self.session_id),
+            rooms._room_key(self.session_id),
+        )
+
+        self.assertEqual(
+            rooms.add_player(self.session_id, self.user.id, "ana", 4), "already"
+        )
+        room = rooms.load_room(self.session_id, "turns")
+        self.assertEqual(room["players"][0]["score"], 7)
+
+
+class DrainRoomTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.processed = []
+        state = {"session_id": self.session_id, "mode": "free_for_all"}
+
+        def process(state, room, chat_history, agent, item, events, task=""):
+            self.processed.append(item["message"])
+            return events
+
+        for target, kwargs in (
+            ("_get_game_state_sync", {"return_value": state}),
+            ("_get_chat_history_sync", {"return_value": []}),
+            ("get_game_agent", {"return_value": None}),
+            ("_broadcast_batch_sync", {}),
+            ("_process_room_turn", {"side_effect": process}),
+        ):
+            patcher = mock.patch.object(tasks, target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def enqueue(self, *messages):
+        for message in messages:
+            rooms.enqueue_message(self.session_id, {"user_id": 1, "message": message})
+
+    @override_settings(ROOM_DRAIN_BATCH=2)
+    def test_processes_the_queue_in_order(self):
+        self.enqueue("a", "b", "c", "d", "e")
+
+        self.assertEqual(tasks._drain_room(self.session_id), "success 🆗")
+        self.assertEqual(self.processed, ["a", "b", "c", "d", "e"])
+        self.assertFalse(rooms.has_pending(self.session_id))
+        self.assertIsNone(get_redis().get(rooms._drain_key(self.session_id)))
+
+    def test_leaves_the_queue_to_the_worker_holding_the_lease(self):
+        self.enqueue("a", "b")
+        token = rooms.claim_drain(self.session_id)
+
+        self.assertEqual(tasks._drain_room(self.session_id), "queued 📥")
+        self.assertEqual(self.processed, [])
+        self.assertTrue(rooms.has_pending(self.session_id))
+
+        rooms.release_drain(self.session_id, token)
+        self.assertEqual(tasks._drain_room(self.session_id), "success 🆗")
+        self.assertEqual(self.processed, ["a", "b"])
+
+    def test_rejects_pending_echoes_when_the_session_is_gone(self):
+        rooms.enqueue_message(
+            self.session_id, {"user_id": 1, "message": "a", "provisional_id": "p1"}
+        )
+        with (
+            mock.patch.object(tasks, "_get_game_state_sync", return_value=None),
+            mock.patch.object(tasks, "reject_pending_message") as reject,
+        ):
+            tasks._drain_room(self.session_id)
+
+        reject.assert_called_once_with(
+            self.session_id, "p1", "Sessão de jogo não encontrada."
+        )
+        self.assertEqual(self.processed, [])
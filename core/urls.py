@@ -1,16 +1,88 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
     UserRegisterAPIView,
     UserLoginAPIView,
     StartGameAPIView,
     AIMessageView,
+    CreateRoomAPIView,
+    JoinRoomAPIView,
+    RoomDetailAPIView,
     UserDetailAPIView,
+    GameStatsAPIView,
+    GameTranscriptAPIView,
+    LeaderboardAPIView,
+    GameListAPIView,
+    GameDetailAPIView,
+    GameLLMUsageAPIView,
+    LLMUsageReportAPIView,
 )
 
 urlpatterns = [
     path("me/", UserDetailAPIView.as_view(), name="api_user_details"),
     path("login/", UserLoginAPIView.as_view(), name="api_login"),
     path("register/", UserRegisterAPIView.as_view(), name="api_register"),
-    path("new/game/", StartGameAPIView.as_view(), name="api_start_game"),
-    path("message/", AIMessageView.as_view(), name="api_message"),
+    # Com ASYNC_API_VIEWS, início de jogo e envio de mensagem usam as views assíncronas.
+    path(
+        "new/game/",
+        (
+            async_views.start_game_view
+            if settings.ASYNC_API_VIEWS
+            else StartGameAPIView.as_view()
+        ),
+        name="api_start_game",
+    ),
+    path(
+        "message/",
+        (
+            async_views.message_view
+            if settings.ASYNC_API_VIEWS
+            else AIMessageView.as_view()
+        ),
+        name="api_message",
+    ),
+    path("rooms/", CreateRoomAPIView.as_view(), name="api_create_room"),
+    path(
+        "rooms/<str:session_id>/",
+        RoomDetailAPIView.as_view(),
+        name="api_room_detail",
+    ),
+    path(
+        "rooms/<str:session_id>/join/",
+        JoinRoomAPIView.as_view(),
+        name="api_join_room",
+    ),
+    path("games/", GameListAPIView.as_view(), name="api_games"),
+    path(
+        "games/<str:session_id>/",
+        GameDetailAPIView.as_view(),
+        name="api_game_detail",
+    ),
+    path(
+        "games/<str:session_id>/stats/",
+        GameStatsAPIView.as_view(),
+        name="api_game_stats",
+    ),
+    path(
+        "games/<str:session_id>/transcript/",
+        GameTranscriptAPIView.as_view(),
+        name="api_game_transcript",
+    ),
+    path(
+        "games/<str:session_id>/llm-usage/",
+        GameLLMUsageAPIView.as_view(),
+        name="api_game_llm_usage",
+    ),
+    path("llm-usage/", LLMUsageReportAPIView.as_view(), name="api_llm_usage"),
+    path(
+        "leaderboards/<str:period>/",
+        LeaderboardAPIView.as_view(),
+        name="api_leaderboard",
+    ),
+    path(
+        "leaderboards/<str:scope>/<str:value>/<str:period>/",
+        LeaderboardAPIView.as_view(),
+        name="api_leaderboard_scoped",
+    ),
 ]
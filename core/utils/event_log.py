@@ -0,0 +1,70 @@
+import json
+
+from django.conf import settings
+
+from core.utils.redis_client import get_redis
+
+# Log de eventos de cada sessão em um Redis Stream limitado (XADD MAXLEN ~).
+# Todo evento enviado ao grupo WebSocket também é gravado aqui com um ID sequencial
+# ("<ms>-<seq>"). Na (re)conexão, o consumer reenvia os eventos posteriores ao último
+# ID visto pelo cliente, então nada se perde se a tarefa terminar antes de o socket abrir.
+
+
+def _stream_key(session_id):
+    return f"whoami:game:{session_id}:events"
+
+
+def parse_event_id(event_id):
+    """Converte um ID de stream ("<ms>-<seq>") em tupla comparável, ou None se inválido."""
+    try:
+        ms, seq = str(event_id).split("-", 1)
+        return int(ms), int(seq)
+    except (TypeError, ValueError):
+        return None
+
+
+def append_event(session_id, event: dict) -> str:
+    """Grava o evento no stream da sessão e retorna o ID atribuído."""
+    key = _stream_key(session_id)
+    pipe = get_redis().pipeline()
+    pipe.xadd(
+        key,
+        {"data": json.dumps(event, ensure_ascii=False)},
+        maxlen=settings.EVENT_LOG_MAXLEN,
+        approximate=True,
+    )
+    pipe.expire(key, settings.EVENT_LOG_TTL)
+    event_id, _ = pipe.execute()
+    return event_id
+
+
+def append_events(session_id, events: list) -> list:
+    """Grava vários eventos em um único pipeline e retorna os IDs atribuídos, em ordem."""
+    key = _stream_key(session_id)
+    pipe = get_redis().pipeline()
+    for event in events:
+        pipe.xadd(
+            key,
+            {"data": json.dumps(event, ensure_ascii=False)},
+            maxlen=settings.EVENT_LOG_MAXLEN,
+            approximate=True,
+        )
+    pipe.expire(key, settings.EVENT_LOG_TTL)
+    return pipe.execute()[:-1]
+
+
+def read_events_after(session_id, last_event_id=None) -> list:
+    """
+    Retorna os eventos da sessão posteriores a `last_event_id` (exclusivo) como
+    dicionários com "event_id". Sem ID (ou com um ID inválido), retorna o log inteiro.
+    """
+    start = "-"
+    if last_event_id and parse_event_id(last_event_id):
+        start = f"({last_event_id}"
+    entries = get_redis().xrange(_stream_key(session_id), min=start, max="+")
+    events = []
+    for event_id, fields in entries:
+        event = json.loads(fields["data"])
+        event["event_id"] = event_id
+        events.append(event)
+    return events
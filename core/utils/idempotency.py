@@ -0,0 +1,67 @@
+import json
+
+from django.conf import settings
+
+from core.utils.redis_client import get_async_redis, get_redis
+
+
+def _submission_key(user_id, session_id, client_message_id):
+    return f"whoami:msg:ack:{user_id}:{session_id}:{client_message_id}"
+
+
+def _processing_key(session_id, client_message_id):
+    return f"whoami:msg:task:{session_id}:{client_message_id}"
+
+
+def claim_message_submission(user_id, session_id, client_message_id, ack: dict):
+    """
+    Registra a primeira submissão de uma mensagem do cliente.
+    Retorna None se esta é a primeira vez (a tarefa deve ser enfileirada) ou
+    o ACK original se o mesmo client_message_id já foi recebido.
+    """
+    key = _submission_key(user_id, session_id, client_message_id)
+    client = get_redis()
+    if client.set(key, json.dumps(ack), nx=True, ex=settings.MESSAGE_DEDUP_TTL):
+        return None
+    stored = client.get(key)
+    return json.loads(stored) if stored else ack
+
+
+async def aclaim_message_submission(user_id, session_id, client_message_id, ack: dict):
+    """Versão assíncrona de claim_message_submission (cliente redis.asyncio)."""
+    key = _submission_key(user_id, session_id, client_message_id)
+    client = get_async_redis()
+    if await client.set(key, json.dumps(ack), nx=True, ex=settings.MESSAGE_DEDUP_TTL):
+        return None
+    stored = await client.get(key)
+    return json.loads(stored) if stored else ack
+
+
+def release_message_submission(user_id, session_id, client_message_id):
+    """
+    Desfaz claim_message_submission quando a tarefa não pôde ser enfileirada, para que o
+    reenvio do cliente com o mesmo client_message_id seja processado, e não só confirmado.
+    """
+    get_redis().delete(_submission_key(user_id, session_id, client_message_id))
+
+
+async def arelease_message_submission(user_id, session_id, client_message_id):
+    """Versão assíncrona de release_message_submission (cliente redis.asyncio)."""
+    await get_async_redis().delete(
+        _submission_key(user_id, session_id, client_message_id)
+    )
+
+
+def claim_message_processing(session_id, client_message_id) -> bool:
+    """
+    Garante que apenas uma execução da tarefa processe o mesmo client_message_id.
+    Retorna False se outra execução já reivindicou a mensagem.
+    """
+    return bool(
+        get_redis().set(
+            _processing_key(session_id, client_message_id),
+            "1",
+            nx=True,
+            ex=settings.MESSAGE_DEDUP_TTL,
+        )
+    )
@@ -0,0 +1,174 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core.models import GameSession, RoomPlayer
+from core.utils.redis_client import get_redis
+
+# Rankings em sorted sets do Redis, atualizados incrementalmente no fim de cada jogo.
+# O membro é o id do usuário e o score é a soma das pontuações dos jogos no período.
+# Escopos: "global", "theme:<tema>" e "level:<nível>"; períodos: all, weekly e daily
+# (semana ISO e dia no fuso TIME_ZONE). Chaves semanais e diárias expiram sozinhas.
+
+PERIODS = ("all", "weekly", "daily")
+SCOPES = ("global", "theme", "level")
+
+# Por quanto tempo as chaves de períodos encerrados continuam consultáveis.
+PERIOD_TTL = {
+    "weekly": 15 * 24 * 60 * 60,
+    "daily": 3 * 24 * 60 * 60,
+}
+
+# Marca de jogo já contabilizado, para que reexecuções do fim de jogo não somem duas vezes.
+RECORDED_TTL = 24 * 60 * 60
+_KEY_PREFIX = "whoami:lb"
+
+
+def _period_suffix(period, when=None):
+    if period == "all":
+        return "all"
+    local = timezone.localtime(when or timezone.now())
+    if period == "weekly":
+        year, week, _ = local.isocalendar()
+        return f"week:{year}-W{week:02d}"
+    if period == "daily":
+        return f"day:{local.date().isoformat()}"
+    raise ValueError(f"Período inválido: {period}")
+
+
+def _scope_name(scope, value=""):
+    if scope == "global":
+        return "global"
+    if scope in ("theme", "level") and value:
+        return f"{scope}:{value}"
+    raise ValueError(f"Escopo inválido: {scope}")
+
+
+def leaderboard_key(scope, period, value="", when=None):
+    """Retorna a chave do sorted set do escopo/período que contém `when` (agora, por padrão)."""
+    return f"{_KEY_PREFIX}:{_scope_name(scope, value)}:{_period_suffix(period, when)}"
+
+
+def _game_keys(theme, level, when):
+    """Todas as chaves (e TTLs) afetadas por um jogo terminado em `when`."""
+    for scope, value in (("global", ""), ("theme", theme), ("level", level)):
+        for period in PERIODS:
+            yield leaderboard_key(scope, period, value, when), PERIOD_TTL.get(period)
+
+
+def record_game(session_id, user_id, theme, level, score, finished_at=None) -> bool:
+    """
+    Soma a pontuação de um jogo terminado aos rankings do usuário (um pipeline,
+    ZINCRBY por chave). Retorna False se o jogo já havia sido contabilizado.
+    """
+    if not user_id:
+        return False
+    return record_scores(session_id, {user_id: score}, theme, level, finished_at)
+
+
+def record_scores(session_id, scores: dict, theme, level, finished_at=None) -> bool:
+    """
+    Versão de record_game para salas multijogador: soma a pontuação de cada jogador
+    ({user_id: pontos}) aos seus rankings, em um único pipeline.
+    """
+    if not scores:
+        return False
+    client = get_redis()
+    if not client.set(
+        f"{_KEY_PREFIX}:recorded:{session_id}", "1", nx=True, ex=RECORDED_TTL
+    ):
+        return False
+
+    pipe = client.pipeline(transaction=False)
+    for key, ttl in _game_keys(theme, level, finished_at or timezone.now()):
+        for user_id, score in scores.items():
+            pipe.zincrby(key, score, user_id)
+        if ttl:
+            pipe.expire(key, ttl)
+    pipe.execute()
+    return True
+
+
+def get_leaderboard(scope, period, value="", offset=0, limit=10) -> list:
+    """Retorna a página do ranking como dicionários (rank começando em 1, user_id, score)."""
+    key = leaderboard_key(scope, period, value)
+    rows = get_redis().zrevrange(key, offset, offset + limit - 1, withscores=True)
+    return [
+        {"rank": offset + position + 1, "user_id": int(member), "score": int(score)}
+        for position, (member, score) in enumerate(rows)
+    ]
+
+
+def get_user_rank(scope, period, user_id, value=""):
+    """
+    Posição e pontuação de um usuário no ranking (ZREVRANK + ZSCORE, O(log n)),
+    ou None se ele ainda não pontuou no período.
+    """
+    key = leaderboard_key(scope, period, value)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zrevrank(key, user_id)
+    pipe.zscore(key, user_id)
+    rank, score = pipe.execute()
+    if rank is None:
+        return None
+    return {"rank": rank + 1, "user_id": int(user_id), "score": int(score)}
+
+
+def rebuild_leaderboards(now=None) -> int:
+    """
+    Recria todos os rankings a partir de GameSession (jogos concluídos com usuário) e,
+    nas salas multijogador, de RoomPlayer (pontuação de cada participante).
+    Os rankings semanal e diário são recriados apenas para o período corrente.
+    Retorna o número de chaves gravadas.
+    """
+    now = now or timezone.now()
+    local = timezone.localtime(now)
+    day_start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = day_start - timedelta(days=local.isocalendar()[2] - 1)
+
+    finished = GameSession.objects.filter(is_completed=True, end_time__isnull=False)
+    windows = {
+        "all": finished,
+        "weekly": finished.filter(end_time__gte=week_start),
+        "daily": finished.filter(end_time__gte=day_start),
+    }
+
+    totals = defaultdict(lambda: defaultdict(int))
+    ttls = {}
+    for period, queryset in windows.items():
+        grouped = (
+            queryset.filter(mode="solo", user__isnull=False)
+            .order_by()
+            .values("user_id", "theme", "level")
+            .annotate(total=Sum("score"))
+        )
+        room_grouped = (
+            RoomPlayer.objects.filter(session__in=queryset.exclude(mode="solo"))
+            .order_by()
+            .values("user_id", theme=F("session__theme"), level=F("session__level"))
+            .annotate(total=Sum("score"))
+        )
+        for row in chain(grouped, room_grouped):
+            for scope, value in (
+                ("global", ""),
+                ("theme", row["theme"]),
+                ("level", row["level"]),
+            ):
+                key = leaderboard_key(scope, period, value, now)
+                totals[key][row["user_id"]] += row["total"] or 0
+                ttls[key] = PERIOD_TTL.get(period)
+
+    client = get_redis()
+    pipe = client.pipeline()
+    for key in client.scan_iter(match=f"{_KEY_PREFIX}:*"):
+        if not key.startswith(f"{_KEY_PREFIX}:recorded:"):
+            pipe.delete(key)
+    for key, members in totals.items():
+        pipe.zadd(key, members)
+        if ttls[key]:
+            pipe.expire(key, ttls[key])
+    pipe.execute()
+    return len(totals)
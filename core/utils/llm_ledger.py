@@ -0,0 +1,150 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Avg, Count, DecimalField, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from core.models import GameSession, LLMCall
+from core.utils.redis_client import get_redis
+
+# Ledger das chamadas ao LLM.
+# Cada turno apenas enfileira as suas chamadas (um RPUSH em pipeline) nesta lista do
+# Redis; a tarefa periódica flush_llm_ledger_task grava os registros LLMCall em lote,
+# sem adicionar escritas no banco à latência do turno.
+LEDGER_KEY = "whoami:llm:ledger"
+
+# Agrupamentos aceitos pelos relatórios (summarize).
+GROUP_BY_FIELDS = {
+    "call_type": "call_type",
+    "model": "model",
+    "day": "day",
+}
+
+_MILLION = Decimal(1_000_000)
+
+
+def enqueue_calls(session_pk, usage):
+    """Enfileira as chamadas registradas em `usage` (LLMUsage) para a sessão."""
+    if not usage.calls:
+        return 0
+    pipe = get_redis().pipeline(transaction=False)
+    for call in usage.calls:
+        pipe.rpush(LEDGER_KEY, json.dumps({"session_pk": session_pk, **call}))
+    pipe.execute()
+    return len(usage.calls)
+
+
+def discard_session_calls(session_pks) -> int:
+    """
+    Remove da fila as chamadas ainda não gravadas das sessões informadas (ex.: sessões de
+    benchmark), sem gravar nem remover as demais. Retorna o número de registros removidos.
+    """
+    session_pks = set(session_pks)
+    redis = get_redis()
+    raw_entries = {
+        raw
+        for raw in redis.lrange(LEDGER_KEY, 0, -1)
+        if json.loads(raw)["session_pk"] in session_pks
+    }
+    if not raw_entries:
+        return 0
+    pipe = redis.pipeline(transaction=False)
+    for raw in raw_entries:
+        pipe.lrem(LEDGER_KEY, 0, raw)
+    return sum(pipe.execute())
+
+
+def call_cost(model, input_tokens, output_tokens, cached_tokens) -> Decimal:
+    """
+    Custo estimado (USD) de uma chamada pela tabela LLM_PRICING.
+    Os tokens em cache fazem parte dos tokens de entrada e são cobrados pelo preço reduzido.
+    """
+    pricing = settings.LLM_PRICING.get(model.removeprefix("models/"))
+    if not pricing:
+        return Decimal(0)
+    cached_tokens = min(cached_tokens, input_tokens)
+    cost = (
+        Decimal(str(pricing["input"])) * (input_tokens - cached_tokens)
+        + Decimal(str(pricing.get("cached", pricing["input"]))) * cached_tokens
+        + Decimal(str(pricing["output"])) * output_tokens
+    ) / _MILLION
+    return cost.quantize(Decimal("1e-8"))
+
+
+def _build_call(entry) -> LLMCall:
+    return LLMCall(
+        session_id=entry["session_pk"],
+        call_type=entry["call_type"],
+        model=entry["model"][:100],
+        input_tokens=entry["input_tokens"],
+        output_tokens=entry["output_tokens"],
+        cached_tokens=entry["cached_tokens"],
+        latency_ms=entry["latency_ms"],
+        error=entry["error"],
+        cost_usd=call_cost(
+            entry["model"],
+            entry["input_tokens"],
+            entry["output_tokens"],
+            entry["cached_tokens"],
+        ),
+        created_at=datetime.fromtimestamp(entry["created_at"], tz=timezone.utc),
+    )
+
+
+def flush_ledger(batch_size=500) -> int:
+    """
+    Grava em lote (bulk_create) as chamadas enfileiradas desde o último flush.
+    Chamadas de sessões que já não existem são descartadas; em caso de erro no banco
+    o lote volta para a fila e é tentado no próximo flush.
+    """
+    redis = get_redis()
+    written = 0
+    while True:
+        raw_entries = redis.lpop(LEDGER_KEY, batch_size)
+        if not raw_entries:
+            return written
+        try:
+            entries = [json.loads(raw) for raw in raw_entries]
+            existing = set(
+                GameSession.objects.filter(
+                    pk__in={entry["session_pk"] for entry in entries}
+                ).values_list("pk", flat=True)
+            )
+            calls = [
+                _build_call(entry)
+                for entry in entries
+                if entry["session_pk"] in existing
+            ]
+            LLMCall.objects.bulk_create(calls, batch_size=batch_size)
+        except Exception:
+            redis.lpush(LEDGER_KEY, *reversed(raw_entries))
+            raise
+        written += len(calls)
+
+
+def summarize(queryset, group_by=("call_type",)) -> list:
+    """
+    Agrega um queryset de LLMCall pelos campos de `group_by` (chaves de GROUP_BY_FIELDS):
+    chamadas, erros, tokens, latência média e máxima e custo.
+    Sem agrupamento, retorna uma única linha com os totais.
+    """
+    aggregates = {
+        "calls": Count("id"),
+        "errors": Count("id", filter=~Q(error="")),
+        "input_tokens": Coalesce(Sum("input_tokens"), 0),
+        "output_tokens": Coalesce(Sum("output_tokens"), 0),
+        "cached_tokens": Coalesce(Sum("cached_tokens"), 0),
+        "avg_latency_ms": Avg("latency_ms"),
+        "max_latency_ms": Max("latency_ms"),
+        "cost_usd": Coalesce(Sum("cost_usd"), Decimal(0), output_field=DecimalField()),
+    }
+    if not group_by:
+        return [queryset.aggregate(**aggregates)]
+    if "day" in group_by:
+        queryset = queryset.annotate(day=TruncDate("created_at"))
+    fields = [GROUP_BY_FIELDS[field] for field in group_by]
+    return list(
+        queryset.order_by().values(*fields).annotate(**aggregates).order_by(*fields)
+    )
@@ -0,0 +1,42 @@
+import time
+
+
+class LLMUsage:
+    """
+    Acumula as chamadas ao LLM feitas durante um turno do jogo.
+    Cada tarefa cria a sua instância e a passa para o agente, que continua sem estado.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def record(
+        self,
+        call_type: str,
+        model: str,
+        latency_ms: int,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cached_tokens: int = 0,
+        error: str = "",
+    ):
+        self.calls.append(
+            {
+                "call_type": call_type,
+                "model": model,
+                "latency_ms": latency_ms,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cached_tokens": cached_tokens,
+                "error": error,
+                "created_at": time.time(),
+            }
+        )
+
+    @property
+    def latency_ms(self) -> int:
+        return sum(call["latency_ms"] for call in self.calls)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(call["input_tokens"] + call["output_tokens"] for call in self.calls)
@@ -0,0 +1,168 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging estruturado e não bloqueante.
+#
+# Os módulos usam loggers comuns (logging.getLogger(__name__)) com formatação preguiçosa
+# (logger.debug("... %s", valor)). O QueueLogHandler apenas coloca o registro em uma fila:
+# a formatação e a escrita em stdout acontecem em uma thread própria (QueueListener),
+# fora do event loop dos consumers e das tarefas dos workers. Com a fila cheia o registro
+# é descartado em vez de bloquear quem loga.
+#
+# session_id, user_id e afins ficam no contexto (contextvars) e vão em todos os registros
+# emitidos dentro dele: bind_context() nas tarefas, views e consumers.
+
+_CONTEXT = contextvars.ContextVar("log_context", default={})
+
+
+def get_context() -> dict:
+    return _CONTEXT.get()
+
+
+def bind_context(**fields):
+    """Acrescenta campos ao contexto de log atual (campos None são ignorados)."""
+    fields = {key: value for key, value in fields.items() if value is not None}
+    if fields:
+        _CONTEXT.set({**_CONTEXT.get(), **fields})
+
+
+def clear_context():
+    _CONTEXT.set({})
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Escopo de contexto: os campos (e os ligados dentro dele) valem até a saída."""
+    token = _CONTEXT.set({**_CONTEXT.get()})
+    bind_context(**fields)
+    try:
+        yield
+    finally:
+        _CONTEXT.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copia o contexto atual para o registro (roda na thread de quem loga)."""
+
+    def filter(self, record):
+        record.context = _CONTEXT.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Amostra os registros DEBUG na taxa `rate` (0 a 1); os demais níveis passam sempre.
+    Com session_id no contexto a decisão é por sessão, e uma sessão amostrada tem
+    todos os seus registros DEBUG (turnos completos em vez de linhas soltas).
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, float(rate))) * 10000)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.threshold >= 10000:
+            return True
+        context = getattr(record, "context", None) or _CONTEXT.get()
+        session_id = context.get("session_id")
+        if session_id is not None:
+            return zlib.crc32(str(session_id).encode()) % 10000 < self.threshold
+        return random.randrange(10000) < self.threshold
+
+
+class JSONFormatter(logging.Formatter):
+    """Uma linha JSON por registro: horário, nível, logger, mensagem e contexto."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextTextFormatter(logging.Formatter):
+    """Formato texto para desenvolvimento, com os campos do contexto ao final."""
+
+    def format(self, record):
+        text = super().format(record)
+        context = getattr(record, "context", None)
+        if not context:
+            return text
+        fields = " ".join(f"{key}={value}" for key, value in context.items())
+        head, sep, tail = text.partition("\n")
+        return f"{head} [{fields}]{sep}{tail}"
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Handler que enfileira os registros para uma thread de escrita (QueueListener).
+
+    A formatação da mensagem fica para a thread de escrita (o registro é copiado sem
+    formatar; os argumentos devem ser valores imutáveis, como strings e números).
+    O formatter configurado neste handler é usado pelo handler de stream da thread.
+    Nos processos filhos dos workers prefork a fila e a thread são recriadas após o fork.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        self.queue_size = queue_size
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = None
+        self._start()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start(self):
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart_after_fork(self):
+        # A thread de escrita não sobrevive ao fork (e a fila pode ter ficado travada).
+        self.queue = queue.Queue(self.queue_size)
+        self.createLock()
+        self._start()
+
+    def stop(self):
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info:
+            # O traceback é renderizado aqui: os frames não devem ir para outra thread.
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
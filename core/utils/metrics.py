@@ -0,0 +1,186 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    start_http_server,
+)
+
+from core.utils import profiling
+from core.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Buckets pensados para o jogo: operações de banco/broadcast ficam na casa dos
+# milissegundos, enquanto chamadas ao LLM e espera na fila podem levar segundos.
+STAGE_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Histograma único por etapa do pipeline, rotulado pela etapa e pela tarefa.
+# Etapas usadas: queue_wait, db_fetch, classification, llm_call, persistence,
+# broadcast e image_search.
+STAGE_SECONDS = Histogram(
+    "whoami_stage_seconds",
+    "Tempo gasto em cada etapa do processamento de um turno do jogo",
+    ["stage", "task"],
+    buckets=STAGE_BUCKETS,
+)
+
+TASK_SECONDS = Histogram(
+    "whoami_task_seconds",
+    "Tempo total de execução das tarefas do jogo",
+    ["task"],
+    buckets=STAGE_BUCKETS,
+)
+
+GAMES_STARTED = Counter(
+    "whoami_games_started_total",
+    "Número de jogos iniciados",
+    ["theme", "level"],
+)
+GAMES_FINISHED = Counter(
+    "whoami_games_finished_total",
+    "Número de jogos concluídos",
+    ["outcome"],  # "guessed" ou "out_of_attempts"
+)
+GAMES_FAILED = Counter(
+    "whoami_games_failed_total",
+    "Número de tarefas do jogo que terminaram com erro",
+    ["task"],
+)
+
+WS_AUTH_RESULTS = Counter(
+    "whoami_ws_auth_total",
+    "Autenticações JWT de WebSocket por resultado",
+    ["result"],  # "cache_hit", "verified", "invalid" ou "missing"
+)
+
+OPTIMISTIC_ECHOES = Counter(
+    "whoami_optimistic_echo_total",
+    "Ecos provisórios de mensagens do jogador, por resultado",
+    ["result"],  # "echoed", "skipped", "confirmed" ou "rejected"
+)
+
+ROOM_MESSAGES = Counter(
+    "whoami_room_messages_total",
+    "Mensagens de salas multijogador, por resultado",
+    ["result"],  # "answered", "duplicate" (sem chamar o LLM) ou "rejected"
+)
+
+SPECULATIVE_HINTS = Counter(
+    "whoami_speculative_hints_total",
+    "Dicas antecipadas (core.utils.speculation), por resultado",
+    # "generated", "hit" (palpite errado respondido sem o LLM), "miss" (palpite errado sem
+    # dica pronta) ou "wasted" (descartada sem uso)
+    ["result"],
+)
+SPECULATIVE_HINT_WASTED_TOKENS = Counter(
+    "whoami_speculative_hint_wasted_tokens_total",
+    "Tokens gastos em dicas antecipadas descartadas sem uso",
+)
+SPECULATIVE_HINT_WASTED_COST = Counter(
+    "whoami_speculative_hint_wasted_cost_usd_total",
+    "Custo estimado (USD, LLM_PRICING) das dicas antecipadas descartadas sem uso",
+)
+
+# Conexões WebSocket abertas e grupos com ao menos um membro neste processo.
+# Cada conexão mantém um socket no Daphne e uma entrada de grupo no channel layer (Redis).
+WS_CONNECTIONS_OPEN = Gauge(
+    "whoami_ws_connections_open",
+    "Conexões WebSocket do jogo abertas",
+    multiprocess_mode="livesum",
+)
+WS_GROUPS_ACTIVE = Gauge(
+    "whoami_ws_groups_active",
+    "Grupos de sessão do channel layer com membros conectados",
+    multiprocess_mode="livesum",
+)
+WS_CLOSED = Counter(
+    "whoami_ws_closed_total",
+    "Conexões WebSocket encerradas pelo servidor, por motivo",
+    ["reason"],  # "idle", "heartbeat_timeout" ou "game_over"
+)
+
+# Cabeçalho adicionado às mensagens Celery para medir o tempo de espera na fila.
+ENQUEUED_AT_HEADER = "whoami_enqueued_at"
+
+
+@contextmanager
+def observe_stage(stage: str, task: str = ""):
+    """
+    Mede o tempo de um bloco de código e registra no histograma da etapa.
+    Dentro de um trace (core.utils.tracing), a etapa também vira um span, que é retornado.
+    """
+    start = time.perf_counter()
+    # Rótulo "stage:<etapa>" nas amostras do profiler (core.utils.profiling), se ligado.
+    stage_token = profiling.enter_stage(stage)
+    try:
+        with span(stage, task=task) as stage_span:
+            yield stage_span
+    finally:
+        profiling.exit_stage(stage_token)
+        STAGE_SECONDS.labels(stage=stage, task=task).observe(
+            time.perf_counter() - start
+        )
+
+
+def observe_queue_wait(task: str, enqueued_at):
+    """
+    Registra quanto tempo a mensagem ficou no broker antes de ser consumida.
+    """
+    if not enqueued_at:
+        return
+    try:
+        waited = time.time() - float(enqueued_at)
+    except (TypeError, ValueError):
+        return
+    STAGE_SECONDS.labels(stage="queue_wait", task=task).observe(max(0.0, waited))
+
+
+def get_registry():
+    """
+    Retorna o registry a ser exportado.
+    Quando PROMETHEUS_MULTIPROC_DIR está definido (workers prefork ou vários
+    processos Daphne), agrega as métricas de todos os processos.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    """Gera o payload de texto do Prometheus e o content-type correspondente."""
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """
+    Sobe o servidor HTTP sidecar que expõe /metrics no processo do worker.
+    """
+    start_http_server(port, registry=get_registry())
+    logger.info("Servidor de métricas escutando na porta %s.", port)
@@ -0,0 +1,33 @@
+import os
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+
+class FakeConnection:
+    """
+    Provedor de LLM falso, sem acesso à rede, usado em benchmarks e desenvolvimento local.
+    A latência simulada de cada chamada é definida por FAKE_LLM_LATENCY (segundos).
+    """
+
+    @staticmethod
+    def connect():
+        latency = float(os.environ.get("FAKE_LLM_LATENCY", "0"))
+
+        llm_chat = FakeListChatModel(
+            responses=[
+                "Em uma galáxia muito, muito distante, eu uso uma capa preta e um capacete.",
+                "Sim.",
+                "Não.",
+                "Talvez. Aqui vai outra dica: minha respiração é bem marcante.",
+            ],
+            sleep=latency,
+        )
+        llm_character_selection = FakeListChatModel(
+            responses=["Darth Vader", "Cleópatra", "Sherlock Holmes"],
+            sleep=latency,
+        )
+        llm_classification = FakeListChatModel(
+            responses=["question", "question", "guess"],
+            sleep=latency,
+        )
+
+        return llm_chat, llm_character_selection, llm_classification
@@ -1,6 +1,9 @@
+import logging
 import os
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+logger = logging.getLogger(__name__)
+
 
 class GoggleConnectionGemini:
 
@@ -10,9 +13,11 @@ class GoggleConnectionGemini:
         # A chave será injetada automaticamente no ambiente Canvas se deixada vazia.
         api_key = os.environ.get("GOOGLE_API_KEY", "")
         model_ai = os.environ.get("GOOGLE_MODEL_AI", "gemini-2.5-flash")
+        # "rest" evita o gRPC, que não é compatível com o monkey patching do gevent.
+        transport = os.environ.get("GOOGLE_AI_TRANSPORT") or None
         if not api_key:
-            print(
-                "AVISO: GOOGLE_API_KEY não configurada. Usando chave padrão do ambiente Canvas."
+            logger.warning(
+                "GOOGLE_API_KEY não configurada. Usando chave padrão do ambiente Canvas."
             )
 
         # Inicializa o modelo de linguagem grande (LLM) do Google Gemini.
@@ -21,17 +26,20 @@ class GoggleConnectionGemini:
             model=model_ai,
             google_api_key=api_key,
             temperature=0.7,
+            transport=transport,
         )
         llm_character_selection = ChatGoogleGenerativeAI(
             model=model_ai,
             google_api_key=api_key,
             temperature=0.1,
+            transport=transport,
         )  # Baixa temperatura para escolha consistente
         llm_classification = ChatGoogleGenerativeAI(
             model=model_ai,
             google_api_key=api_key,
             temperature=0.0,
             max_output_tokens=10,
+            transport=transport,
         )  # Temperatura zero para classificação binária
 
         return llm_chat, llm_character_selection, llm_classification
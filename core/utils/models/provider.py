@@ -0,0 +1,16 @@
+import os
+
+
+def get_llm_connection():
+    """
+    Seleciona o provedor de LLM pela variável LLM_PROVIDER ("google" ou "fake").
+    """
+    provider = os.environ.get("LLM_PROVIDER", "google").lower()
+    if provider == "fake":
+        from core.utils.models.fake_ai import FakeConnection
+
+        return FakeConnection
+
+    from core.utils.models.google_ai import GoggleConnectionGemini
+
+    return GoggleConnectionGemini
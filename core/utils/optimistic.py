@@ -0,0 +1,111 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from core.utils.metrics import OPTIMISTIC_ECHOES
+from core.utils.rooms import ROOM_MODES, ais_member, is_member
+from core.utils.session_state import aload_owner, load_owner
+from core.utils.tracing import inject_traceparent
+
+# Eco otimista das mensagens do jogador.
+# A API envia a mensagem ao grupo da sessão assim que a recebe (message_pending), com um
+# ID provisório, e o cliente a exibe junto com o indicador "pensando". O worker depois
+# confirma (o chat_message do jogador leva o mesmo provisional_id) ou rejeita
+# (message_rejected). Os eventos provisórios não entram no log da sessão: só a
+# confirmação é reenviada numa reconexão.
+
+
+def _pending_event(provisional_id, message, player=None):
+    event = {
+        "type": "message_pending",
+        "provisional_id": provisional_id,
+        "sender": "user",
+        "message": message,
+    }
+    if player:
+        event["player"] = player
+    inject_traceparent(event)
+    return event
+
+
+def _can_echo(owner, user_id, member=False):
+    """
+    Ecoa apenas para sessões em cache, em andamento e do próprio usuário (ou, nas salas,
+    de um participante); nos demais casos (incluindo falta no cache) o worker valida e
+    envia a mensagem normalmente.
+    """
+    if owner is None:
+        return False
+    owner_id, is_completed, mode = owner
+    if mode in ROOM_MODES:
+        return not is_completed and member
+    return not is_completed and owner_id == user_id
+
+
+def _is_room(owner):
+    return owner is not None and owner[2] in ROOM_MODES
+
+
+def echo_pending_message(
+    session_id, user_id, provisional_id, message, player=None
+) -> bool:
+    """
+    Envia o eco provisório ao grupo da sessão. Retorna False se não ecoou.
+    `player` (nome do usuário) acompanha o eco nas salas multijogador.
+    """
+    owner = load_owner(session_id)
+    room = _is_room(owner)
+    if not _can_echo(owner, user_id, room and is_member(session_id, user_id)):
+        OPTIMISTIC_ECHOES.labels(result="skipped").inc()
+        return False
+    async_to_sync(get_channel_layer().group_send)(
+        f"game_{session_id}",
+        _pending_event(provisional_id, message, player if room else None),
+    )
+    OPTIMISTIC_ECHOES.labels(result="echoed").inc()
+    return True
+
+
+async def aecho_pending_message(
+    session_id, user_id, provisional_id, message, player=None
+) -> bool:
+    """Versão assíncrona de echo_pending_message."""
+    owner = await aload_owner(session_id)
+    room = _is_room(owner)
+    if not _can_echo(owner, user_id, room and await ais_member(session_id, user_id)):
+        OPTIMISTIC_ECHOES.labels(result="skipped").inc()
+        return False
+    await get_channel_layer().group_send(
+        f"game_{session_id}",
+        _pending_event(provisional_id, message, player if room else None),
+    )
+    OPTIMISTIC_ECHOES.labels(result="echoed").inc()
+    return True
+
+
+def _rejected_event(provisional_id, reason):
+    event = {
+        "type": "message_rejected",
+        "provisional_id": provisional_id,
+        "message": reason,
+    }
+    inject_traceparent(event)
+    return event
+
+
+def reject_pending_message(session_id, provisional_id, reason):
+    """
+    Avisa o grupo que a mensagem provisória não será processada (chamada pelo worker, ou
+    pela API quando a tarefa não pôde ser enfileirada).
+    """
+    async_to_sync(get_channel_layer().group_send)(
+        f"game_{session_id}", _rejected_event(provisional_id, reason)
+    )
+    OPTIMISTIC_ECHOES.labels(result="rejected").inc()
+
+
+async def areject_pending_message(session_id, provisional_id, reason):
+    """Versão assíncrona de reject_pending_message."""
+    await get_channel_layer().group_send(
+        f"game_{session_id}", _rejected_event(provisional_id, reason)
+    )
+    OPTIMISTIC_ECHOES.labels(result="rejected").inc()
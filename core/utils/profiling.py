@@ -0,0 +1,252 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+# Profiler por amostragem das tarefas do jogo e dos handlers do GameConsumer.
+#
+# Ativado por PROFILING=1 ou, em tempo de execução, por `manage.py profile start`, que grava
+# CONTROL_KEY no Redis com duração (TTL). O controle remoto é opcional: só com
+# PROFILE_CONTROL_REFRESH > 0 cada processo relê a chave, no máximo a cada
+# PROFILE_CONTROL_REFRESH segundos, em uma thread à parte. Com o padrão (0) e PROFILING=0,
+# os pontos de entrada custam uma comparação e não há thread nem leitura do Redis; com o
+# controle remoto ligado, há também uma leitura do Redis por intervalo.
+#
+# Uma execução escolhida (PROFILE_SAMPLE_RATE) registra a sua thread (tarefas) ou a sua
+# task asyncio (handlers do consumer). A thread de amostragem lê a pilha de cada uma a cada
+# PROFILE_INTERVAL_MS e, no fim, grava as pilhas no formato "collapsed" dos flamegraphs
+# (flamegraph.pl, speedscope), com quadros de rótulo na raiz:
+#     process_player_message_task;session:<id>;stage:llm_call;agent:_invoke;... 12
+
+CONTROL_KEY = "whoami:profiling"
+PROFILED_TASKS = {"process_start_game_task", "process_player_message_task"}
+
+# Execuções em andamento: thread (tarefas) -> perfil; task asyncio (consumer) -> perfil.
+_thread_profiles = {}
+_task_profiles = {}
+# Threads de event loop com handlers perfilados (thread -> loop).
+_loops = {}
+# Etapa atual (observe_stage) das threads perfiladas.
+_stages = {}
+
+_control = {"rate": 0.0, "checked_at": float("-inf"), "refreshing": False}
+# (PROFILING, PROFILE_SAMPLE_RATE, PROFILE_CONTROL_REFRESH), lidos uma vez: o acesso a
+# django.conf.settings custa mais que o resto da verificação.
+_config = None
+
+
+def _refresh_control():
+    from core.utils.redis_client import get_redis
+
+    try:
+        raw = get_redis().get(CONTROL_KEY)
+        _control["rate"] = float(json.loads(raw)["sample_rate"]) if raw else 0.0
+    except Exception:
+        _control["rate"] = 0.0
+    finally:
+        _control["refreshing"] = False
+
+
+def sample_rate() -> float:
+    """Fração das execuções perfiladas agora (0 com o profiler desligado)."""
+    global _config
+    if _config is None:
+        _config = (
+            settings.PROFILING,
+            settings.PROFILE_SAMPLE_RATE,
+            settings.PROFILE_CONTROL_REFRESH,
+        )
+    enabled, rate, refresh = _config
+    if enabled:
+        return rate
+    if refresh <= 0:
+        return 0.0
+    now = time.monotonic()
+    if now - _control["checked_at"] >= refresh and not _control["refreshing"]:
+        # A leitura do Redis não roda no event loop nem na tarefa.
+        _control["checked_at"] = now
+        _control["refreshing"] = True
+        threading.Thread(
+            target=_refresh_control, name="profiling-control", daemon=True
+        ).start()
+    return _control["rate"]
+
+
+def should_profile() -> bool:
+    rate = sample_rate()
+    return rate > 0 and random.random() < rate
+
+
+class Profile:
+    """Amostras de uma execução perfilada: pilha (com rótulos) -> contagem."""
+
+    __slots__ = ("kind", "labels", "samples")
+
+    def __init__(self, kind, name, session_id=None):
+        self.kind = kind
+        self.labels = [name] + ([f"session:{session_id}"] if session_id else [])
+        self.samples = Counter()
+
+    def add(self, frame, stage=None):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        labels = self.labels + [f"stage:{stage}"] if stage else self.labels
+        self.samples[";".join(labels + stack)] += 1
+
+
+_frame_names = {}
+
+
+def _frame_name(code):
+    name = _frame_names.get(code)
+    if name is None:
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        name = f"{module}:{code.co_qualname}".replace(";", ":").replace(" ", "_")
+        _frame_names[code] = name
+    return name
+
+
+class _Sampler:
+    """Thread que amostra as pilhas das execuções registradas e grava os perfis prontos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._finished = []
+        self._wakeup = threading.Event()
+
+    def ensure_started(self):
+        # Também recria a thread nos filhos dos workers prefork (após o fork).
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._finished = []
+            self._wakeup = threading.Event()
+            threading.Thread(target=self._run, name="profiler", daemon=True).start()
+            self._pid = os.getpid()
+
+    def finish(self, profile):
+        if profile.samples:
+            self._finished.append(profile)
+        self._wakeup.set()
+
+    def _run(self):
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        switch_interval = sys.getswitchinterval()
+        while True:
+            if not (_thread_profiles or _task_profiles or self._finished):
+                sys.setswitchinterval(switch_interval)
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+            # Esta thread só amostra quando a thread perfilada solta o GIL, o que o Python
+            # força a cada switch interval (5 ms por padrão): enquanto há perfis ativos, ele
+            # acompanha o intervalo de amostragem para trechos curtos de CPU não escaparem.
+            sys.setswitchinterval(min(switch_interval, interval))
+            time.sleep(interval)
+            self._sample()
+            if self._finished:
+                self._write()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        for thread_id, profile in list(_thread_profiles.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                profile.add(frame, _stages.get(thread_id))
+        for thread_id, loop in list(_loops.items()):
+            profile = _task_profiles.get(asyncio.current_task(loop))
+            frame = frames.get(thread_id)
+            if profile is not None and frame is not None:
+                profile.add(frame)
+
+    def _write(self):
+        finished, self._finished = self._finished, []
+        os.makedirs(settings.PROFILE_OUTPUT_DIR, exist_ok=True)
+        by_kind = {}
+        for profile in finished:
+            by_kind.setdefault(profile.kind, []).extend(
+                f"{stack} {count}\n" for stack, count in profile.samples.items()
+            )
+        for kind, lines in by_kind.items():
+            path = os.path.join(
+                settings.PROFILE_OUTPUT_DIR,
+                f"{kind}-{socket.gethostname()}-{os.getpid()}.collapsed",
+            )
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            except OSError:
+                pass
+
+
+_sampler = _Sampler()
+
+
+def start_thread_profile(kind, name, session_id=None):
+    """Começa a perfilar a thread atual (ex.: uma tarefa Celery). Retorna o perfil."""
+    _sampler.ensure_started()
+    profile = Profile(kind, name, session_id)
+    _thread_profiles[threading.get_ident()] = profile
+    _sampler._wakeup.set()
+    return profile
+
+
+def stop_thread_profile():
+    if not _thread_profiles:
+        return
+    thread_id = threading.get_ident()
+    _stages.pop(thread_id, None)
+    profile = _thread_profiles.pop(thread_id, None)
+    if profile is not None:
+        _sampler.finish(profile)
+
+
+def start_task_profile(kind, name, session_id=None):
+    """Começa a perfilar a task asyncio atual (ex.: um handler do consumer)."""
+    _sampler.ensure_started()
+    profile = Profile(kind, name, session_id)
+    _loops.setdefault(threading.get_ident(), asyncio.get_running_loop())
+    _task_profiles[asyncio.current_task()] = profile
+    _sampler._wakeup.set()
+    return profile
+
+
+def stop_task_profile():
+    profile = _task_profiles.pop(asyncio.current_task(), None)
+    if profile is not None:
+        _sampler.finish(profile)
+
+
+def enter_stage(stage):
+    """Marca a etapa atual da thread, se ela estiver sendo perfilada (ver observe_stage)."""
+    if not _thread_profiles:
+        return None
+    thread_id = threading.get_ident()
+    if thread_id not in _thread_profiles:
+        return None
+    previous = _stages.get(thread_id)
+    _stages[thread_id] = stage
+    return (thread_id, previous)
+
+
+def exit_stage(token):
+    if token is None:
+        return
+    thread_id, previous = token
+    if previous is None:
+        _stages.pop(thread_id, None)
+    else:
+        _stages[thread_id] = previous
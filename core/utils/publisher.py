@@ -0,0 +1,27 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Publicação de tarefas Celery a partir de código assíncrono.
+# apply_async é bloqueante (kombu), então roda em um executor pequeno e dedicado, e não
+# no pool de threads do Django; as conexões com o broker vêm do producer pool do Celery
+# (broker_pool_limit), compartilhado pelas threads.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.CELERY_PUBLISH_THREADS, thread_name_prefix="celery-publish"
+)
+
+
+async def apublish(task, *args, **kwargs):
+    """
+    Enfileira `task` com os argumentos dados sem bloquear o event loop.
+    A publicação roda no contexto da requisição (trace e contexto de log).
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor,
+        functools.partial(context.run, task.apply_async, args=args, kwargs=kwargs),
+    )
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import weakref
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_client_lock = threading.Lock()
+# Clientes assíncronos por event loop (as conexões do pool ficam presas ao loop que as criou).
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> redis.Redis:
+    """
+    Retorna o cliente Redis compartilhado do processo (settings.REDIS_URL).
+    O cliente usa um pool de conexões interno e é seguro entre threads.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    settings.REDIS_URL, decode_responses=True
+                )
+    return _client
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """
+    Retorna o cliente Redis assíncrono (redis.asyncio) do event loop atual,
+    usado pelas views assíncronas para não ocupar o pool de threads.
+    O pool é bloqueante: com todas as conexões em uso, a requisição espera uma livre.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_ASYNC_MAX_CONNECTIONS,
+            decode_responses=True,
+        )
+        client = redis.asyncio.Redis(connection_pool=pool)
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,361 @@
+import json
+import re
+import time
+import unicodedata
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from core.models import RoomPlayer
+from core.utils.event_log import append_event
+from core.utils.redis_client import get_async_redis, get_redis
+from core.utils.tracing import inject_traceparent
+
+# Salas multijogador: vários jogadores interrogam o mesmo personagem em uma GameSession
+# com mode "turns" (um jogador por vez, na ordem de entrada) ou "free_for_all".
+#
+# Tudo o que muda a cada turno fica no Redis, ao lado do estado da sessão
+# (core.utils.session_state): participantes, ordem, vez, pontuação por jogador e as
+# respostas já dadas (perguntas repetidas não chamam o LLM). O broadcast de um turno não
+# consulta o banco; RoomPlayer só é gravado na entrada e, em lote, no fim da partida.
+# Toda escrita renova o TTL de todas as chaves da sala; se elas saírem do cache, são
+# recriadas a partir de RoomPlayer (_rebuild_from_db).
+#
+# As mensagens de uma sala entram em uma fila e são processadas em ordem por um único
+# worker de cada vez (posse da fila com prazo, DRAIN_KEY): os outros workers enfileiram e
+# retornam, em vez de esperar um lock ocupando o processo.
+
+ROOM_MODES = ("turns", "free_for_all")
+
+DUPLICATE_GUESS_REPLY = "Esse palpite já foi feito nesta sala, e não sou eu. Tente outro!"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def _players_key(session_id):
+    # user_id -> nome de usuário
+    return f"whoami:room:{session_id}:players"
+
+
+def _order_key(session_id):
+    # user_ids na ordem de entrada (ordem dos turnos)
+    return f"whoami:room:{session_id}:order"
+
+
+def _room_key(session_id):
+    # "turn", "turn_started_at" e contadores por jogador ("score:<id>", ...)
+    return f"whoami:room:{session_id}"
+
+
+def _answers_key(session_id):
+    # mensagem normalizada -> {"input_type", "answer"}
+    return f"whoami:room:{session_id}:answers"
+
+
+def _queue_key(session_id):
+    return f"whoami:room:{session_id}:queue"
+
+
+def _drain_key(session_id):
+    return f"whoami:room:{session_id}:drain"
+
+
+def is_room(state) -> bool:
+    return bool(state) and state.get("mode") in ROOM_MODES
+
+
+def _expire_all(pipe, session_id):
+    for key in (
+        _players_key(session_id),
+        _order_key(session_id),
+        _room_key(session_id),
+        _answers_key(session_id),
+    ):
+        pipe.expire(key, settings.SESSION_STATE_TTL)
+
+
+def _rebuild_from_db(session_id) -> bool:
+    """
+    Recria participantes, ordem de entrada e contadores a partir de RoomPlayer quando as
+    chaves da sala saíram do cache. Contadores ainda presentes no Redis são mantidos.
+    Retorna False se a sala não tem participantes no banco.
+    """
+    members = list(
+        RoomPlayer.objects.filter(session__session_id=session_id)
+        .select_related("user")
+        .order_by("joined_at")
+    )
+    if not members:
+        return False
+    players_key = _players_key(session_id)
+    order_key = _order_key(session_id)
+    room_key = _room_key(session_id)
+
+    def rebuild(pipe):
+        if pipe.exists(players_key):
+            return
+        pipe.multi()
+        pipe.delete(order_key)
+        for member in members:
+            pipe.hset(players_key, member.user_id, member.user.username)
+            pipe.rpush(order_key, member.user_id)
+            pipe.hsetnx(room_key, f"score:{member.user_id}", member.score)
+            pipe.hsetnx(room_key, f"questions:{member.user_id}", member.question_count)
+            pipe.hsetnx(room_key, f"guesses:{member.user_id}", member.guess_count)
+        pipe.hsetnx(room_key, "turn_started_at", time.time())
+        _expire_all(pipe, session_id)
+
+    get_redis().transaction(rebuild, players_key)
+    return True
+
+
+def add_player(session_id, user_id, username, max_players) -> str:
+    """
+    Inclui o jogador na sala (WATCH/MULTI, sem passar do limite).
+    Retorna "joined", "already" (já participava) ou "full".
+    """
+    players_key = _players_key(session_id)
+    if not get_redis().exists(players_key):
+        # Sem a sala no cache, quem volta seria tratado como novo (placar zerado).
+        _rebuild_from_db(session_id)
+
+    def join(pipe):
+        if pipe.hexists(players_key, user_id):
+            return "already"
+        if pipe.hlen(players_key) >= max_players:
+            return "full"
+        pipe.multi()
+        pipe.hset(players_key, user_id, username)
+        pipe.rpush(_order_key(session_id), user_id)
+        pipe.hsetnx(_room_key(session_id), "turn_started_at", time.time())
+        _expire_all(pipe, session_id)
+        return "joined"
+
+    return get_redis().transaction(join, players_key, value_from_callable=True)
+
+
+def is_member(session_id, user_id) -> bool:
+    client = get_redis()
+    players_key = _players_key(session_id)
+    if client.hexists(players_key, user_id):
+        return True
+    if client.exists(players_key) or not _rebuild_from_db(session_id):
+        return False
+    return bool(client.hexists(players_key, user_id))
+
+
+async def ais_member(session_id, user_id) -> bool:
+    """Versão assíncrona de is_member (cliente redis.asyncio)."""
+    client = get_async_redis()
+    players_key = _players_key(session_id)
+    if await client.hexists(players_key, user_id):
+        return True
+    if await client.exists(players_key):
+        return False
+    if not await database_sync_to_async(_rebuild_from_db)(session_id):
+        return False
+    return bool(await client.hexists(players_key, user_id))
+
+
+def _read_room(session_id):
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hgetall(_players_key(session_id))
+    pipe.lrange(_order_key(session_id), 0, -1)
+    pipe.hgetall(_room_key(session_id))
+    return pipe.execute()
+
+
+def load_room(session_id, mode) -> dict:
+    """
+    Lê a sala em um pipeline: jogadores (na ordem de entrada) com pontuação e contadores,
+    e de quem é a vez (apenas no modo "turns").
+    """
+    usernames, order, fields = _read_room(session_id)
+    if not usernames and _rebuild_from_db(session_id):
+        usernames, order, fields = _read_room(session_id)
+
+    players = []
+    for user_id in order:
+        if user_id not in usernames:
+            continue
+        players.append(
+            {
+                "user_id": int(user_id),
+                "username": usernames[user_id],
+                "score": int(fields.get(f"score:{user_id}", 0)),
+                "question_count": int(fields.get(f"questions:{user_id}", 0)),
+                "guess_count": int(fields.get(f"guesses:{user_id}", 0)),
+            }
+        )
+    room = {
+        "session_id": session_id,
+        "mode": mode,
+        "players": players,
+        "turn": int(fields.get("turn", 0)),
+        "turn_started_at": float(fields.get("turn_started_at") or time.time()),
+    }
+    return room
+
+
+def turn_user_id(room):
+    """Jogador da vez no modo "turns" (None no modo livre ou em sala vazia)."""
+    if room["mode"] != "turns" or not room["players"]:
+        return None
+    return room["players"][room["turn"] % len(room["players"])]["user_id"]
+
+
+def get_player(room, user_id):
+    return next(
+        (player for player in room["players"] if player["user_id"] == user_id), None
+    )
+
+
+def turn_rejection(room, user_id):
+    """
+    Motivo para recusar a jogada fora da vez, ou None se o jogador pode jogar.
+    Depois de ROOM_TURN_TIMEOUT sem jogada, qualquer participante pode jogar.
+    """
+    current = turn_user_id(room)
+    if current is None or current == user_id:
+        return None
+    if time.time() - room["turn_started_at"] > settings.ROOM_TURN_TIMEOUT:
+        return None
+    return f"Agora é a vez de {get_player(room, current)['username']}."
+
+
+def reset_turn_clock(session_id):
+    """Reinicia o prazo da vez (ex.: quando a primeira dica chega)."""
+    pipe = get_redis().pipeline()
+    pipe.hset(_room_key(session_id), "turn_started_at", time.time())
+    _expire_all(pipe, session_id)
+    pipe.execute()
+
+
+def update_player(session_id, room, user_id, input_type=None, points=0):
+    """
+    Contabiliza a jogada (contadores e pontos do jogador) e passa a vez para o próximo
+    da ordem, no Redis e em `room`. Um único pipeline, sem consultar o banco.
+    """
+    player = get_player(room, user_id)
+    key = _room_key(session_id)
+    pipe = get_redis().pipeline()
+    if input_type == "question":
+        pipe.hincrby(key, f"questions:{user_id}", 1)
+        player["question_count"] += 1
+    elif input_type == "guess":
+        pipe.hincrby(key, f"guesses:{user_id}", 1)
+        player["guess_count"] += 1
+    if points:
+        pipe.hincrby(key, f"score:{user_id}", points)
+        player["score"] += points
+    if room["mode"] == "turns":
+        # A vez segue quem jogou (mesmo fora da vez, após o prazo).
+        room["turn"] = (room["players"].index(player) + 1) % len(room["players"])
+        room["turn_started_at"] = time.time()
+        pipe.hset(
+            key,
+            mapping={"turn": room["turn"], "turn_started_at": room["turn_started_at"]},
+        )
+    _expire_all(pipe, session_id)
+    pipe.execute()
+
+
+def standings(room) -> list:
+    """Jogadores ordenados pela pontuação (maior primeiro)."""
+    return [
+        {"user_id": p["user_id"], "username": p["username"], "score": p["score"]}
+        for p in sorted(room["players"], key=lambda p: -p["score"])
+    ]
+
+
+def room_update_event(room) -> dict:
+    """Evento com participantes, placar e vez, enviado ao grupo a cada mudança."""
+    return {
+        "type": "room_update",
+        "mode": room["mode"],
+        "players": standings(room),
+        "turn_user_id": turn_user_id(room),
+    }
+
+
+def publish_room_update(session_id, mode):
+    """Grava no log e envia ao grupo o estado atual da sala (ex.: entrada de um jogador)."""
+    event = room_update_event(load_room(session_id, mode))
+    event["event_id"] = append_event(session_id, event)
+    inject_traceparent(event)
+    async_to_sync(get_channel_layer().group_send)(f"game_{session_id}", event)
+
+
+def normalize_message(text) -> str:
+    """Forma canônica da mensagem para detectar repetições (sem caixa, acentos e pontuação)."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def get_answer(session_id, normalized):
+    """Resposta já dada na sala para a mesma mensagem, ou None."""
+    raw = get_redis().hget(_answers_key(session_id), normalized)
+    return json.loads(raw) if raw else None
+
+
+def cache_answer(session_id, normalized, input_type, answer):
+    key = _answers_key(session_id)
+    pipe = get_redis().pipeline()
+    pipe.hset(
+        key,
+        normalized,
+        json.dumps({"input_type": input_type, "answer": answer}, ensure_ascii=False),
+    )
+    pipe.expire(key, settings.SESSION_STATE_TTL)
+    pipe.execute()
+
+
+def enqueue_message(session_id, item: dict):
+    key = _queue_key(session_id)
+    pipe = get_redis().pipeline()
+    pipe.rpush(key, json.dumps(item, ensure_ascii=False))
+    pipe.expire(key, settings.SESSION_STATE_TTL)
+    _expire_all(pipe, session_id)
+    pipe.execute()
+
+
+def pop_messages(session_id, count) -> list:
+    raw = get_redis().lpop(_queue_key(session_id), count)
+    return [json.loads(item) for item in raw or []]
+
+
+def has_pending(session_id) -> bool:
+    return get_redis().llen(_queue_key(session_id)) > 0
+
+
+def claim_drain(session_id):
+    """Assume a fila da sala por ROOM_DRAIN_LEASE segundos. Retorna o token ou None."""
+    token = uuid.uuid4().hex
+    if get_redis().set(
+        _drain_key(session_id), token, nx=True, ex=settings.ROOM_DRAIN_LEASE
+    ):
+        return token
+    return None
+
+
+def renew_drain(session_id, token):
+    key = _drain_key(session_id)
+    client = get_redis()
+    if client.get(key) == token:
+        client.expire(key, settings.ROOM_DRAIN_LEASE)
+
+
+def release_drain(session_id, token):
+    """Libera a fila, se ela ainda for deste token (a posse pode ter expirado)."""
+    key = _drain_key(session_id)
+
+    def release(pipe):
+        if pipe.get(key) == token:
+            pipe.multi()
+            pipe.delete(key)
+
+    get_redis().transaction(release, key)
@@ -0,0 +1,363 @@
+import json
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from core.models import ChatMessage, GameSession
+from core.utils.redis_client import get_async_redis, get_redis
+
+# Estado "quente" dos jogos ativos, guardado em hashes Redis.
+# Os turnos leem e atualizam apenas este estado; um flusher periódico (write-behind)
+# persiste as sessões alteradas em GameSession, e o fim de jogo faz um flush síncrono.
+
+DIRTY_SET_KEY = "whoami:game:dirty"
+
+# Campos do estado e a conversão de tipo aplicada na leitura do hash.
+INT_FIELDS = (
+    "pk",
+    "attempts_left",
+    "score",
+    "user_message_count",
+    "guess_count",
+    "question_count",
+    "llm_latency_ms_total",
+    "llm_tokens_total",
+    "max_players",
+    "spec_hint_version",
+    "spec_hint_tokens",
+)
+STR_FIELDS = ("session_id", "theme", "level", "character_name", "end_time", "mode")
+BOOL_FIELDS = ("is_completed",)
+
+# Campos copiados de volta para GameSession no flush.
+PERSISTED_FIELDS = (
+    "theme",
+    "level",
+    "character_name",
+    "attempts_left",
+    "is_completed",
+    "score",
+    "end_time",
+    "user_message_count",
+    "guess_count",
+    "question_count",
+    "llm_latency_ms_total",
+    "llm_tokens_total",
+)
+
+
+def _state_key(session_id):
+    return f"whoami:game:{session_id}"
+
+
+def _history_key(session_id):
+    return f"whoami:game:{session_id}:history"
+
+
+def _encode(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _decode(raw: dict) -> dict:
+    state = {}
+    for field, value in raw.items():
+        if field in INT_FIELDS:
+            state[field] = int(value) if value != "" else 0
+        elif field in BOOL_FIELDS:
+            state[field] = value == "1"
+        elif field == "user_id":
+            state[field] = int(value) if value else None
+        else:
+            state[field] = value
+    return state
+
+
+def _session_to_mapping(session: GameSession) -> dict:
+    mapping = {
+        "pk": session.pk,
+        "session_id": session.session_id,
+        "user_id": session.user_id,
+        "mode": session.mode,
+        "max_players": session.max_players,
+    }
+    for field in PERSISTED_FIELDS:
+        mapping[field] = getattr(session, field)
+    return {field: _encode(value) for field, value in mapping.items()}
+
+
+def seed_state(session: GameSession):
+    """Grava no cache o estado completo de uma sessão recém-criada ou carregada do banco."""
+    key = _state_key(session.session_id)
+    pipe = get_redis().pipeline()
+    pipe.hset(key, mapping=_session_to_mapping(session))
+    pipe.expire(key, settings.SESSION_STATE_TTL)
+    pipe.execute()
+
+
+async def aseed_state(session: GameSession):
+    """Versão assíncrona de seed_state (cliente redis.asyncio)."""
+    key = _state_key(session.session_id)
+    pipe = get_async_redis().pipeline()
+    pipe.hset(key, mapping=_session_to_mapping(session))
+    pipe.expire(key, settings.SESSION_STATE_TTL)
+    await pipe.execute()
+
+
+def load_state(session_id):
+    """
+    Retorna o estado da sessão como dicionário, ou None se ela não existir.
+    Em caso de falta no cache (ex.: Redis reiniciado), carrega do banco e repopula.
+    """
+    raw = get_redis().hgetall(_state_key(session_id))
+    if raw:
+        return _decode(raw)
+
+    session = GameSession.objects.filter(session_id=session_id).first()
+    if session is None:
+        return None
+    seed_state(session)
+    return _decode(_session_to_mapping(session))
+
+
+def _owner_from_fields(user_id, is_completed, mode):
+    if is_completed is None:
+        return None
+    return (int(user_id) if user_id else None), is_completed == "1", mode or "solo"
+
+
+def load_owner(session_id):
+    """
+    Lê apenas o dono, a conclusão e o modo da sessão, sem fallback para o banco.
+    Retorna (user_id, is_completed, mode), ou None se a sessão não estiver em cache.
+    """
+    return _owner_from_fields(
+        *get_redis().hmget(_state_key(session_id), "user_id", "is_completed", "mode")
+    )
+
+
+async def aload_owner(session_id):
+    """Versão assíncrona de load_owner (cliente redis.asyncio)."""
+    return _owner_from_fields(
+        *await get_async_redis().hmget(
+            _state_key(session_id), "user_id", "is_completed", "mode"
+        )
+    )
+
+
+# Escritas no estado que só acontecem se o hash existir. Um HSET/HINCRBY em um hash que
+# expirou (ou foi removido) criaria um estado parcial, sem "pk", em que load_state confiaria.
+# KEYS: hash do estado, DIRTY_SET_KEY; ARGV: TTL, session_id, pares campo/valor.
+_UPDATE_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return 1
+"""
+_INCREMENT_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return false end
+local values = {}
+for i = 3, #ARGV, 2 do
+    values[#values + 1] = redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return values
+"""
+
+
+def _reseed_from_db(session_id) -> bool:
+    """Recarrega o estado do banco quando o hash não está mais no cache."""
+    session = GameSession.objects.filter(session_id=session_id).first()
+    if session is None:
+        return False
+    seed_state(session)
+    return True
+
+
+def update_state(session_id, **fields):
+    """
+    Atualiza campos do estado e marca a sessão para o próximo flush.
+    Se o estado saiu do cache, ele é recarregado do banco antes da escrita.
+    """
+    script = get_redis().register_script(_UPDATE_IF_EXISTS)
+    args = [settings.SESSION_STATE_TTL, session_id]
+    for field, value in fields.items():
+        args += [field, _encode(value)]
+    keys = [_state_key(session_id), DIRTY_SET_KEY]
+    if not script(keys=keys, args=args) and _reseed_from_db(session_id):
+        script(keys=keys, args=args)
+
+
+def increment_state(session_id, **increments) -> dict:
+    """
+    Incrementa contadores do estado atomicamente (HINCRBY em um script Lua)
+    e retorna os novos valores. Se o estado saiu do cache, ele é recarregado do banco
+    antes do incremento; sem a sessão no banco, retorna um dicionário vazio.
+    """
+    script = get_redis().register_script(_INCREMENT_IF_EXISTS)
+    fields = list(increments)
+    args = [settings.SESSION_STATE_TTL, session_id]
+    for field in fields:
+        args += [field, increments[field]]
+    keys = [_state_key(session_id), DIRTY_SET_KEY]
+    results = script(keys=keys, args=args)
+    if results is None and _reseed_from_db(session_id):
+        results = script(keys=keys, args=args)
+    return dict(zip(fields, results or []))
+
+
+def load_history(session_id, pk):
+    """
+    Retorna as mensagens da sessão como pares (sender, texto) em ordem cronológica.
+    Lê a lista do Redis e, se ela não existir, reconstrói a partir do banco.
+    """
+    raw = get_redis().lrange(_history_key(session_id), 0, -1)
+    if raw:
+        return [tuple(json.loads(item)) for item in raw]
+
+    messages = list(
+        ChatMessage.objects.filter(session_id=pk)
+        .order_by("timestamp", "id")
+        .values_list("sender", "message_text")
+    )
+    seed_history(session_id, messages)
+    return messages
+
+
+def seed_history(session_id, messages):
+    """Grava no cache o histórico completo da sessão, pares (sender, texto)."""
+    if not messages:
+        return
+    key = _history_key(session_id)
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    pipe.rpush(key, *[json.dumps(list(message)) for message in messages])
+    pipe.expire(key, settings.SESSION_STATE_TTL)
+    pipe.execute()
+
+
+def append_history(session_id, sender, message_text):
+    """
+    Acrescenta uma mensagem ao histórico em cache da sessão.
+    Usa RPUSHX: sem a lista em cache, nada é gravado (uma lista só com as mensagens novas
+    pareceria o histórico completo), e load_history a reconstrói do banco, onde a mensagem
+    já foi salva.
+    """
+    key = _history_key(session_id)
+    pipe = get_redis().pipeline()
+    pipe.rpushx(key, json.dumps([sender, message_text]))
+    pipe.expire(key, settings.SESSION_STATE_TTL)
+    pipe.execute()
+
+
+# Dica antecipada (core.utils.speculation): campos do estado fora de PERSISTED_FIELDS.
+SPEC_HINT_FIELDS = ("spec_hint", "spec_hint_version", "spec_hint_tokens", "spec_hint_cost")
+
+
+def store_speculative_hint(session_id, version, hint, tokens, cost) -> bool:
+    """
+    Guarda a dica antecipada no estado se o histórico ainda tiver `version` mensagens
+    (WATCH/MULTI). Retorna False se a conversa mudou enquanto a dica era gerada.
+    """
+    state_key = _state_key(session_id)
+    history_key = _history_key(session_id)
+
+    def store(pipe):
+        if pipe.llen(history_key) != version or not pipe.exists(state_key):
+            return False
+        pipe.multi()
+        pipe.hset(
+            state_key,
+            mapping={
+                "spec_hint": hint,
+                "spec_hint_version": version,
+                "spec_hint_tokens": tokens,
+                "spec_hint_cost": _encode(cost),
+            },
+        )
+        pipe.expire(state_key, settings.SESSION_STATE_TTL)
+        return True
+
+    return get_redis().transaction(
+        store, history_key, state_key, value_from_callable=True
+    )
+
+
+def clear_speculative_hint(session_id):
+    get_redis().hdel(_state_key(session_id), *SPEC_HINT_FIELDS)
+
+
+# Lê o estado para o flush e limpa a marca de alterado no mesmo passo: uma escrita feita
+# depois da leitura volta a marcar a sessão. KEYS: hash do estado, DIRTY_SET_KEY;
+# ARGV: session_id.
+_TAKE_FOR_FLUSH = """
+redis.call('SREM', KEYS[2], ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+
+def _take_for_flush(session_id):
+    """Estado em cache da sessão, já sem a marca de alterado (None se não existir)."""
+    script = get_redis().register_script(_TAKE_FOR_FLUSH)
+    raw = script(keys=[_state_key(session_id), DIRTY_SET_KEY], args=[session_id])
+    return _decode(dict(zip(raw[::2], raw[1::2]))) if raw else None
+
+
+def _write_state(state) -> int:
+    """
+    Grava o estado em GameSession (um único UPDATE). Um estado de jogo em andamento só
+    é gravado se a linha também estiver em andamento: um flush atrasado, lido antes do
+    fim de jogo, não reabre uma sessão já concluída.
+    """
+    values = {field: state[field] for field in PERSISTED_FIELDS if field in state}
+    values["character_name"] = values.get("character_name") or None
+    values["end_time"] = parse_datetime(values["end_time"]) if values.get("end_time") else None
+    sessions = GameSession.objects.filter(pk=state["pk"])
+    if not values.get("is_completed"):
+        sessions = sessions.filter(is_completed=False)
+    return sessions.update(**values)
+
+
+def flush_state(session_id) -> bool:
+    """
+    Persiste o estado em cache da sessão em GameSession.
+    Retorna False se o estado não estiver mais no cache. Se a gravação falhar, a sessão
+    volta a ser marcada como alterada.
+    """
+    state = _take_for_flush(session_id)
+    if state is None:
+        return False
+    try:
+        _write_state(state)
+    except Exception:
+        get_redis().sadd(DIRTY_SET_KEY, session_id)
+        raise
+    return True
+
+
+def flush_dirty_states(batch_size=500) -> int:
+    """
+    Persiste as sessões marcadas como alteradas desde o último flush. Em caso de erro no
+    banco, as sessões do lote ainda não gravadas voltam ao conjunto e são tentadas no
+    próximo flush.
+    """
+    client = get_redis()
+    flushed = 0
+    while True:
+        session_ids = client.spop(DIRTY_SET_KEY, batch_size)
+        if not session_ids:
+            return flushed
+        for index, session_id in enumerate(session_ids):
+            try:
+                if flush_state(session_id):
+                    flushed += 1
+            except Exception:
+                client.sadd(DIRTY_SET_KEY, *session_ids[index:])
+                raise
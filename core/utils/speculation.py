@@ -0,0 +1,142 @@
+from decimal import Decimal
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+from core.utils import session_state
+from core.utils.llm_ledger import call_cost
+from core.utils.metrics import (
+    SPECULATIVE_HINT_WASTED_COST,
+    SPECULATIVE_HINT_WASTED_TOKENS,
+    SPECULATIVE_HINTS,
+)
+from core.utils.rooms import normalize_message
+
+# Dica antecipada: enquanto o jogador pensa, pregenerate_hint_task gera a próxima dica extra
+# da conversa e a guarda no estado em cache da sessão (core.utils.session_state), marcada com
+# o tamanho do histórico para o qual foi gerada. Qualquer mensagem nova muda o histórico e
+# invalida a dica.
+#
+# Um palpite que não menciona o nome do personagem (comparação local, tolerante a erros de
+# digitação) é tratado como errado: a resposta é montada com a dica pronta, sem a chamada ao
+# LLM da conversa. Palpites que mencionam o nome, o último palpite e as perguntas seguem pelo
+# LLM. A dica não usada é descartada e o seu custo contabilizado como desperdício.
+#
+# A comparação não reconhece apelidos nem descrições ("Pelé", "o imperador do Brasil"): um
+# acerto assim seria respondido como erro. Por isso o recurso é opcional, por tema
+# (SPECULATIVE_HINT_THEMES), para os temas em que os personagens são chamados pelo nome.
+
+INCORRECT_GUESS_REPLY = (
+    "Não, não sou quem você pensa. Tente novamente! Você ainda tem {attempts_left} "
+    "tentativas. Aqui vai outra dica: {hint}"
+)
+
+# Partes de nomes que não identificam o personagem sozinhas.
+_NAME_PARTICLES = {"das", "dos", "del", "der", "the", "van", "von"}
+_NAME_SIMILARITY = 0.8
+
+
+def enabled_for(state) -> bool:
+    """Indica se o tema da sessão usa a dica antecipada (SPECULATIVE_HINT_THEMES)."""
+    return bool(state) and state.get("theme") in settings.SPECULATIVE_HINT_THEMES
+
+
+def should_speculate(state) -> bool:
+    """
+    Indica se vale antecipar a dica: jogo solo em andamento, em um tema habilitado, com ao
+    menos duas tentativas (um palpite errado deixa o jogo ativo e a resposta pode usar a dica).
+    """
+    return bool(
+        enabled_for(state)
+        and not state["is_completed"]
+        and state.get("mode", "solo") == "solo"
+        and state.get("character_name")
+        and state["attempts_left"] >= 2
+    )
+
+
+def may_be_correct_guess(message, character_name) -> bool:
+    """
+    Indica se o palpite pode estar certo: alguma palavra da mensagem é igual ou parecida
+    com uma parte do nome do personagem. Sem partes comparáveis, o LLM decide.
+    """
+    words = normalize_message(message).split()
+    parts = [
+        part
+        for part in normalize_message(character_name).split()
+        if len(part) >= 3 and part not in _NAME_PARTICLES
+    ]
+    if not parts:
+        return True
+    return any(
+        word == part or SequenceMatcher(None, word, part).ratio() >= _NAME_SIMILARITY
+        for part in parts
+        for word in words
+    )
+
+
+def generation_cost(usage):
+    """Tokens e custo estimado (USD) das chamadas de uma geração (LLMUsage)."""
+    cost = sum(
+        (
+            call_cost(
+                call["model"],
+                call["input_tokens"],
+                call["output_tokens"],
+                call["cached_tokens"],
+            )
+            for call in usage.calls
+        ),
+        Decimal(0),
+    )
+    return usage.total_tokens, cost
+
+
+def store_hint(session_id, version, hint, usage) -> bool:
+    """Guarda a dica gerada para `version`; se a conversa já mudou, conta como desperdício."""
+    tokens, cost = generation_cost(usage)
+    if hint and session_state.store_speculative_hint(
+        session_id, version, hint, tokens, cost
+    ):
+        SPECULATIVE_HINTS.labels(result="generated").inc()
+        return True
+    _record_waste(tokens, cost)
+    return False
+
+
+def take_hint(state, version):
+    """
+    Retira do estado a dica antecipada e a retorna se ela valer para o histórico atual
+    (`version` mensagens); a dica obsoleta é descartada. Sem dica, retorna None.
+    """
+    if not state.get("spec_hint"):
+        return None
+    session_state.clear_speculative_hint(state["session_id"])
+    hint = state.pop("spec_hint")
+    if state.get("spec_hint_version") != version:
+        discard_hint(state)
+        return None
+    return hint
+
+
+def incorrect_guess_reply(hint, attempts_left) -> str:
+    SPECULATIVE_HINTS.labels(result="hit").inc()
+    return INCORRECT_GUESS_REPLY.format(attempts_left=attempts_left, hint=hint)
+
+
+def record_miss():
+    """Palpite errado respondido pelo LLM por não haver dica pronta."""
+    SPECULATIVE_HINTS.labels(result="miss").inc()
+
+
+def discard_hint(state):
+    """Contabiliza como desperdício a dica retirada por take_hint e não usada."""
+    _record_waste(
+        state.get("spec_hint_tokens", 0), Decimal(state.get("spec_hint_cost") or 0)
+    )
+
+
+def _record_waste(tokens, cost):
+    SPECULATIVE_HINTS.labels(result="wasted").inc()
+    SPECULATIVE_HINT_WASTED_TOKENS.inc(tokens)
+    SPECULATIVE_HINT_WASTED_COST.inc(float(cost))
@@ -0,0 +1,298 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+# Tracing distribuído dos turnos do jogo (sem dependências externas).
+#
+# O contexto segue o formato W3C traceparent ("00-<trace_id>-<span_id>-<flags>") e atravessa:
+# - a requisição HTTP (tracing_middleware abre o span raiz, ou continua um traceparent recebido);
+# - o broker do Celery, no cabeçalho TRACEPARENT_KEY das tarefas (sinais em app/celery.py);
+# - o channel layer, na chave TRACEPARENT_KEY dos eventos de group_send (lida pelo consumer).
+# Cada etapa medida por observe_stage vira um span filho. Os spans terminados vão, em lote e
+# por uma thread própria, para um arquivo JSON lines (TRACE_EXPORT_FILE) que o comando
+# trace_waterfall analisa offline.
+
+TRACEPARENT_KEY = "traceparent"
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_CURRENT = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    """Um trecho medido de um trace. Spans não amostrados só propagam o contexto."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "sampled",
+        "start_ns",
+        "duration_ns",
+        "attributes",
+        "error",
+        "_start_perf",
+    )
+
+    def __init__(self, name, trace_id, parent_id, sampled, attributes, start_ns=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.duration_ns = None
+        self.attributes = attributes
+        self.error = ""
+        self._start_perf = time.perf_counter_ns()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, duration_ns=None):
+        if self.duration_ns is not None:
+            return
+        self.duration_ns = (
+            duration_ns
+            if duration_ns is not None
+            else time.perf_counter_ns() - self._start_perf
+        )
+        if self.sampled:
+            get_exporter().export(
+                {
+                    "trace_id": self.trace_id,
+                    "span_id": self.span_id,
+                    "parent_id": self.parent_id,
+                    "name": self.name,
+                    "start_ns": self.start_ns,
+                    "duration_ns": self.duration_ns,
+                    "attributes": self.attributes,
+                    "error": self.error,
+                    "pid": os.getpid(),
+                }
+            )
+
+
+def parse_traceparent(value):
+    """Retorna (trace_id, span_id, amostrado) de um traceparent válido, ou None."""
+    match = _TRACEPARENT.match(value or "")
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+def current_span():
+    return _CURRENT.get()
+
+
+def current_traceparent():
+    current = _CURRENT.get()
+    return current.traceparent if current is not None else None
+
+
+def inject_traceparent(carrier: dict):
+    """Grava o traceparent do span atual em `carrier` (cabeçalhos ou evento), se houver."""
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        carrier[TRACEPARENT_KEY] = traceparent
+
+
+def annotate_span(**attributes):
+    """Acrescenta atributos ao span atual, se houver."""
+    current = _CURRENT.get()
+    if current is not None:
+        current.set_attributes(**attributes)
+
+
+def start_span(name, parent=None, root=False, start_ns=None, **attributes):
+    """
+    Cria um span filho de `parent` (traceparent recebido) ou do span atual.
+    Sem nenhum dos dois (ou com `parent` inválido), só inicia um trace novo com root=True
+    (sujeito a TRACE_SAMPLE_RATE); caso contrário retorna None e nada é medido.
+    """
+    if not settings.TRACING:
+        return None
+    context = parse_traceparent(parent) if parent is not None else None
+    if context is not None:
+        trace_id, parent_id, sampled = context
+    else:
+        current = _CURRENT.get()
+        if current is not None:
+            trace_id, parent_id, sampled = (
+                current.trace_id,
+                current.span_id,
+                current.sampled,
+            )
+        elif root:
+            trace_id = f"{random.getrandbits(128):032x}"
+            parent_id = None
+            sampled = random.random() < settings.TRACE_SAMPLE_RATE
+        else:
+            return None
+    return Span(name, trace_id, parent_id, sampled, attributes, start_ns)
+
+
+@contextlib.contextmanager
+def span(name, parent=None, root=False, **attributes):
+    """Mede o bloco como um span (filho do atual, de `parent` ou raiz com root=True)."""
+    new_span = start_span(name, parent=parent, root=root, **attributes)
+    if new_span is None:
+        yield None
+        return
+    token = _CURRENT.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        _CURRENT.reset(token)
+        new_span.end()
+
+
+def record_span(name, parent, start_ns, duration_ns, **attributes):
+    """Registra um span já terminado (ex.: a espera na fila, medida pelos cabeçalhos)."""
+    completed = start_span(name, parent=parent, start_ns=start_ns, **attributes)
+    if completed is not None:
+        completed.end(max(0, duration_ns))
+
+
+# Spans das tarefas Celery em execução (task_id -> (span, token)), abertos no task_prerun
+# e fechados no task_postrun, que rodam na mesma thread da tarefa.
+_task_spans = {}
+
+
+def start_task_span(task, task_id, enqueued_at=None):
+    """
+    Continua no worker o trace recebido no cabeçalho da tarefa: registra a espera na fila
+    (desde a publicação) e abre o span da tarefa como span atual. Retorna o span ou None.
+    """
+    traceparent = task.request.get(TRACEPARENT_KEY)
+    if not traceparent or not settings.TRACING:
+        return None
+    if enqueued_at:
+        try:
+            published_ns = int(float(enqueued_at) * 1e9)
+        except (TypeError, ValueError):
+            published_ns = None
+        if published_ns is not None:
+            record_span(
+                "queue_wait",
+                traceparent,
+                published_ns,
+                time.time_ns() - published_ns,
+                task=task.name,
+            )
+    task_span = start_span(f"celery {task.name}", parent=traceparent, task_id=task_id)
+    if task_span is not None:
+        _task_spans[task_id] = (task_span, _CURRENT.set(task_span))
+    return task_span
+
+
+def end_task_span(task_id, state=None):
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    task_span, token = entry
+    task_span.set_attributes(state=state)
+    if state == "FAILURE":
+        task_span.error = state
+    _CURRENT.reset(token)
+    task_span.end()
+
+
+class FileSpanExporter:
+    """
+    Grava os spans terminados em um arquivo JSON lines, em lote, por uma thread própria.
+    Cada lote é um único write() em modo append, então web e workers podem compartilhar
+    o arquivo. Com a fila cheia, spans são descartados em vez de bloquear o turno.
+    """
+
+    max_batch = 512
+
+    def __init__(self, path, queue_size=10000):
+        self.path = path
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # Também recria a fila e a thread nos filhos dos workers prefork (após o fork).
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(
+                target=self._run, name="trace-exporter", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def export(self, span_data: dict):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span_data)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Espera a fila ser gravada (comandos e testes)."""
+        if self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                data = "".join(
+                    json.dumps(item, default=str, separators=(",", ":")) + "\n"
+                    for item in batch
+                )
+                os.write(fd, data.encode())
+            except Exception:
+                self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> FileSpanExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = FileSpanExporter(settings.TRACE_EXPORT_FILE)
+                atexit.register(_exporter.flush, 2.0)
+    return _exporter
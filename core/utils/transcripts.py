@@ -0,0 +1,128 @@
+import json
+import zlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import ChatMessage, GameSession
+
+# Transcrições de jogos concluídos.
+# Depois do período de retenção, as linhas de chat_messages de uma sessão concluída
+# são compactadas em um único blob em GameSession.transcript e apagadas, deixando a
+# tabela (e seus índices, os mesmos usados pelos turnos ativos) só com jogos recentes.
+# get_transcript() lê qualquer uma das duas formas de armazenamento.
+
+# Versão 2: cada mensagem leva também o jogador (user id) que a enviou, usado nas salas.
+# Blobs da versão 1 (sem jogador) continuam legíveis.
+TRANSCRIPT_VERSION = 2
+
+
+def compress_messages(messages) -> bytes:
+    """
+    Serializa mensagens (sender, texto, timestamp, player_id) como JSON compacto e
+    comprime com zlib.
+    """
+    payload = {
+        "v": TRANSCRIPT_VERSION,
+        "messages": [
+            [sender, message_text, timestamp.isoformat() if timestamp else None, player]
+            for sender, message_text, timestamp, player in messages
+        ],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(raw.encode("utf-8"), 9)
+
+
+def decompress_transcript(blob) -> list:
+    """Converte um blob de transcrição de volta em uma lista de mensagens."""
+    payload = json.loads(zlib.decompress(bytes(blob)).decode("utf-8"))
+    return [
+        {
+            "sender": sender,
+            "message_text": message_text,
+            "timestamp": parse_datetime(timestamp) if timestamp else None,
+            "player": player[0] if player else None,
+        }
+        for sender, message_text, timestamp, *player in payload["messages"]
+    ]
+
+
+def get_transcript(session: GameSession) -> list:
+    """
+    Retorna as mensagens da sessão em ordem cronológica, como dicionários com
+    sender, message_text, timestamp e player, esteja a sessão arquivada ou não.
+    Para listas de sessões, use prefetch_related("chat_messages"): o cache do
+    prefetch é reaproveitado em vez de uma consulta por sessão.
+    """
+    if session.archived_at is not None:
+        return decompress_transcript(session.transcript) if session.transcript else []
+
+    # .all() usa o cache do prefetch_related quando existe (ordenado por Meta.ordering).
+    return [
+        {
+            "sender": message.sender,
+            "message_text": message.message_text,
+            "timestamp": message.timestamp,
+            "player": message.player_id,
+        }
+        for message in session.chat_messages.all()
+    ]
+
+
+def archive_session(session_pk) -> int:
+    """
+    Compacta as mensagens de uma sessão concluída em GameSession.transcript e apaga
+    as linhas de chat_messages, na mesma transação. Retorna o número de mensagens
+    arquivadas, ou -1 se a sessão já estava arquivada (ou não está concluída).
+    """
+    with transaction.atomic():
+        locked = (
+            GameSession.objects.select_for_update()
+            .filter(pk=session_pk, is_completed=True, archived_at__isnull=True)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if locked is None:
+            return -1
+
+        messages = list(
+            ChatMessage.objects.filter(session_id=session_pk)
+            .order_by("timestamp", "id")
+            .values_list("sender", "message_text", "timestamp", "player_id")
+        )
+        GameSession.objects.filter(pk=session_pk).update(
+            transcript=compress_messages(messages),
+            archived_at=timezone.now(),
+        )
+        ChatMessage.objects.filter(session_id=session_pk).delete()
+    return len(messages)
+
+
+def archive_completed_sessions(retention_days, batch_size=200, limit=None):
+    """
+    Arquiva as sessões concluídas há mais de `retention_days` dias.
+    Processa em lotes de `batch_size` sessões (uma transação por sessão) e para
+    após `limit` sessões, se informado. Retorna (sessões, mensagens) arquivadas.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    sessions = 0
+    messages = 0
+    while limit is None or sessions < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sessions)
+        pks = list(
+            GameSession.objects.filter(
+                is_completed=True, archived_at__isnull=True, end_time__lt=cutoff
+            )
+            .order_by("end_time")
+            .values_list("pk", flat=True)[:size]
+        )
+        if not pks:
+            break
+        for pk in pks:
+            archived = archive_session(pk)
+            if archived >= 0:
+                sessions += 1
+                messages += archived
+    return sessions, messages
@@ -0,0 +1,72 @@
+import json
+
+import msgpack
+
+# Formatos de quadro do WebSocket do jogo, negociados pelo subprotocolo
+# (Sec-WebSocket-Protocol). Sem subprotocolo, o formato é o JSON verboso original.
+#
+# - whoami.v1.json: JSON com as chaves completas (texto).
+# - whoami.v1.cjson: JSON com chaves e tipos curtos (texto).
+# - whoami.v1.msgpack: mesmo esquema curto em MessagePack (binário).
+#
+# O mapeamento curto é espelhado em frontend/static/js/wire.js.
+
+JSON = "whoami.v1.json"
+COMPACT_JSON = "whoami.v1.cjson"
+MSGPACK = "whoami.v1.msgpack"
+SUBPROTOCOLS = (MSGPACK, COMPACT_JSON, JSON)
+
+SHORT_KEYS = {
+    "type": "t",
+    "event_id": "i",
+    "sender": "s",
+    "message": "m",
+    "attempts_left": "a",
+    "score": "p",
+    "character_name": "c",
+    "character_image_url": "u",
+    "provisional_id": "d",
+}
+SHORT_TYPES = {
+    "chat_message": "c",
+    "update_attempts": "a",
+    "game_over": "g",
+    "error": "e",
+    "system_message": "s",
+    "message_pending": "p",
+    "message_rejected": "r",
+}
+
+
+def select_subprotocol(requested):
+    """
+    Escolhe o subprotocolo: o primeiro da lista do cliente (ordem de preferência)
+    que o servidor suporta. Retorna None para o formato padrão (JSON, sem subprotocolo).
+    """
+    for subprotocol in requested or ():
+        if subprotocol in SUBPROTOCOLS:
+            return subprotocol
+    return None
+
+
+def compact(payload: dict) -> dict:
+    """Converte um evento para o esquema de chaves e tipos curtos."""
+    short = {SHORT_KEYS.get(key, key): value for key, value in payload.items()}
+    if "t" in short:
+        short["t"] = SHORT_TYPES.get(short["t"], short["t"])
+    return short
+
+
+def encode(payload: dict, subprotocol=None):
+    """
+    Codifica um evento no formato do subprotocolo.
+    Retorna (text_data, bytes_data), com apenas um dos dois preenchido.
+    """
+    if subprotocol == MSGPACK:
+        return None, msgpack.packb(compact(payload), use_bin_type=True)
+    if subprotocol == COMPACT_JSON:
+        return (
+            json.dumps(compact(payload), ensure_ascii=False, separators=(",", ":")),
+            None,
+        )
+    return json.dumps(payload), None
@@ -1,11 +1,19 @@
+from datetime import timedelta
+import hashlib
 import json
+import logging
 import uuid
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken  # Importar RefreshToken
 from django.contrib.auth import authenticate  # Importar authenticate
+from django.contrib.auth.models import User
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.http import HttpResponse
+from django.utils.http import parse_etags, quote_etag
 
 # Importa as tarefas Celery
 from .tasks import process_start_game_task, process_player_message_task
@@ -13,12 +21,34 @@ from .tasks import process_start_game_task, process_player_message_task
 from .serializers import (
     StartGameRequestSerializer,
     StartGameResponseSerializer,
+    CreateRoomRequestSerializer,
+    RoomSerializer,
     MessageSerializer,
     UserRegisterSerializer,
     UserLoginSerializer,
     UserSerializer,
+    GameStatsSerializer,
+    GameTranscriptSerializer,
+    LeaderboardSerializer,
+    GameHistorySerializer,
+    GameDetailSerializer,
+    GameLLMUsageSerializer,
+    LLMUsageReportSerializer,
 )
-from .models import GameSession  # Apenas para criar a sessão, o resto é na task
+from .models import ChatMessage, GameSession, LLMCall, RoomPlayer
+from .pagination import GameHistoryPagination
+from .utils import rooms
+from .utils.idempotency import claim_message_submission, release_message_submission
+from .utils.llm_ledger import GROUP_BY_FIELDS, summarize
+from .utils.leaderboards import PERIODS, SCOPES, get_leaderboard, get_user_rank
+from .utils.log import bind_context
+from .utils.metrics import render_metrics
+from .utils.optimistic import echo_pending_message, reject_pending_message
+from .utils.session_state import load_state, seed_state
+from .utils.tracing import annotate_span, span
+from .utils.transcripts import get_transcript
+
+logger = logging.getLogger(__name__)
 
 
 class StartGameAPIView(APIView):
@@ -37,34 +67,34 @@ class StartGameAPIView(APIView):
             level = serializer.validated_data["level"]
             session_id = str(uuid.uuid4())  # Gera um ID de sessão único
 
-            print(
-                f"DEBUG API: Recebida requisição para iniciar jogo. session_id={session_id}, user={request.user.username}"
-            )
+            bind_context(session_id=session_id, user_id=request.user.id)
+            annotate_span(session_id=session_id)
+            logger.debug("Recebida requisição para iniciar jogo (%s/%s).", theme, level)
 
             try:
                 # Cria a sessão de jogo no banco de dados.
                 # A associação do usuário é feita aqui, pois a sessão precisa existir para o WebSocket.
-                game_session = GameSession.objects.create(
-                    session_id=session_id,
-                    theme=theme,
-                    level=level,
-                    user=request.user,  # Associe o usuário logado
-                )
-                print(
-                    f"DEBUG API: GameSession {game_session.session_id} criada no banco de dados."
-                )
+                with span("create_session"):
+                    game_session = GameSession.objects.create(
+                        session_id=session_id,
+                        theme=theme,
+                        level=level,
+                        user=request.user,  # Associe o usuário logado
+                    )
+                    # Publica o estado inicial no cache para que tarefas e WebSocket não leiam o banco.
+                    seed_state(game_session)
+                logger.debug("GameSession criada no banco de dados.")
             except Exception as e:
-                print(f"DEBUG API: ERRO ao criar GameSession: {str(e)}")
+                logger.exception("Erro ao criar GameSession: %s", e)
                 return Response(
                     {"error": f"Erro ao criar sessão de jogo: {str(e)}"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
             # Enfileira a tarefa Celery para processar o início do jogo e obter a primeira dica.
-            process_start_game_task.delay(session_id, theme, level, request.user.id)
-            print(
-                f"DEBUG API: Tarefa 'process_start_game_task' enfileirada para sessão {session_id}."
-            )
+            with span("publish"):
+                process_start_game_task.delay(session_id, theme, level, request.user.id)
+            logger.debug("Tarefa 'process_start_game_task' enfileirada.")
 
             response_data = {"session_id": session_id}
             response_serializer = StartGameResponseSerializer(response_data)
@@ -75,8 +105,8 @@ class StartGameAPIView(APIView):
 class AIMessageView(APIView):
     """
     API View para enviar uma mensagem do usuário para a sessão de jogo.
-    Enfileira uma tarefa Celery para processar a mensagem.
-    A resposta da IA será enviada de volta via WebSocket.
+    Ecoa a mensagem provisória ao grupo da sessão e enfileira uma tarefa Celery
+    para processá-la. A resposta da IA será enviada de volta via WebSocket.
     """
 
     permission_classes = [IsAuthenticated]
@@ -88,23 +118,208 @@ class AIMessageView(APIView):
             player_message = serializer.validated_data["message"]
             user_id = request.user.id  # Pega o ID do usuário autenticado
 
-            print(
-                f"DEBUG API: Recebida mensagem para sessão {session_id}, mensagem='{player_message[:50]}'"
-            )
+            client_message_id = serializer.validated_data.get("client_message_id")
 
-            # Enfileira a tarefa Celery para processar a mensagem do jogador.
-            process_player_message_task.delay(session_id, player_message, user_id)
-            print(
-                f"DEBUG API: Tarefa 'process_player_message_task' enfileirada para sessão {session_id}."
+            bind_context(
+                session_id=session_id,
+                user_id=user_id,
+                client_message_id=client_message_id,
             )
+            annotate_span(session_id=session_id)
+            logger.debug("Recebida mensagem: '%.50s'", player_message)
 
             # A resposta HTTP para esta requisição é apenas um ACK.
             # A resposta real da IA virá via WebSocket.
+            ack = {"status": "Mensagem recebida e encaminhada."}
+            if client_message_id:
+                ack["client_message_id"] = client_message_id
+                original_ack = claim_message_submission(
+                    user_id, session_id, client_message_id, ack
+                )
+                if original_ack is not None:
+                    # Reenvio do cliente: devolve o ACK original sem enfileirar de novo.
+                    logger.debug("Mensagem duplicada; ignorando.")
+                    return Response(original_ack, status=status.HTTP_200_OK)
+
+            # Eco otimista: a mensagem e o indicador "pensando" aparecem no cliente
+            # antes de um worker pegar a tarefa, que depois confirma ou rejeita o eco.
+            provisional_id = client_message_id or str(uuid.uuid4())
+            echoed = False
+            try:
+                with span("echo"):
+                    echoed = echo_pending_message(
+                        session_id,
+                        user_id,
+                        provisional_id,
+                        player_message,
+                        player=request.user.username,
+                    )
+            except Exception as e:
+                logger.warning("Falha no eco provisório da mensagem: %s", e)
+
+            # Enfileira a tarefa Celery para processar a mensagem do jogador.
+            try:
+                with span("publish"):
+                    process_player_message_task.delay(
+                        session_id,
+                        player_message,
+                        user_id,
+                        client_message_id,
+                        provisional_id,
+                    )
+            except Exception as e:
+                logger.exception("Erro ao enfileirar a mensagem: %s", e)
+                error = "Não foi possível enviar a mensagem. Tente novamente."
+                # Sem a tarefa, o reenvio precisa ser processado, não só confirmado.
+                if client_message_id:
+                    release_message_submission(user_id, session_id, client_message_id)
+                # Remove o eco provisório e o indicador "pensando" do cliente.
+                if echoed:
+                    try:
+                        reject_pending_message(session_id, provisional_id, error)
+                    except Exception as e:
+                        logger.warning("Falha ao rejeitar o eco provisório: %s", e)
+                return Response(
+                    {"error": error},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+            logger.debug("Tarefa 'process_player_message_task' enfileirada.")
+
+            return Response(ack, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class CreateRoomAPIView(APIView):
+    """
+    API View para criar uma sala multijogador.
+    O criador entra na sala como primeiro jogador; os demais entram por JoinRoomAPIView.
+    Retorna o session_id, como StartGameAPIView.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        serializer = CreateRoomRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        session_id = str(uuid.uuid4())
+
+        bind_context(session_id=session_id, user_id=request.user.id)
+        annotate_span(session_id=session_id)
+        logger.debug(
+            "Recebida requisição para criar sala %s (%s/%s).",
+            data["mode"],
+            data["theme"],
+            data["level"],
+        )
+
+        try:
+            with span("create_session"):
+                game_session = GameSession.objects.create(
+                    session_id=session_id,
+                    theme=data["theme"],
+                    level=data["level"],
+                    user=request.user,  # Criador da sala
+                    mode=data["mode"],
+                    max_players=data["max_players"],
+                )
+                RoomPlayer.objects.create(session=game_session, user=request.user)
+                seed_state(game_session)
+                rooms.add_player(
+                    session_id,
+                    request.user.id,
+                    request.user.username,
+                    data["max_players"],
+                )
+        except Exception as e:
+            logger.exception("Erro ao criar sala: %s", e)
             return Response(
-                {"status": "Mensagem recebida e encaminhada."},
-                status=status.HTTP_200_OK,
+                {"error": f"Erro ao criar sala: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with span("publish"):
+            process_start_game_task.delay(
+                session_id, data["theme"], data["level"], request.user.id
+            )
+
+        response_serializer = StartGameResponseSerializer({"session_id": session_id})
+        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+
+def _room_response(state, room):
+    data = {
+        "session_id": room["session_id"],
+        "mode": room["mode"],
+        "max_players": state["max_players"],
+        "is_completed": state["is_completed"],
+        "turn_user_id": rooms.turn_user_id(room),
+        "players": room["players"],
+    }
+    return RoomSerializer(data).data
+
+
+class JoinRoomAPIView(APIView):
+    """
+    API View para entrar em uma sala multijogador em andamento.
+    A vaga é reservada no Redis (sem passar de max_players); o RoomPlayer é criado uma
+    única vez, na entrada, e os demais jogadores recebem um room_update pelo WebSocket.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id, format=None):
+        bind_context(session_id=session_id, user_id=request.user.id)
+        state = load_state(session_id)
+        if not rooms.is_room(state):
+            return Response(
+                {"detail": "Sala não encontrada."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if state["is_completed"]:
+            return Response(
+                {"detail": "Esta partida já terminou."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        result = rooms.add_player(
+            session_id, request.user.id, request.user.username, state["max_players"]
+        )
+        if result == "full":
+            return Response(
+                {"detail": "A sala está cheia."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if result == "joined":
+            RoomPlayer.objects.get_or_create(session_id=state["pk"], user=request.user)
+            try:
+                rooms.publish_room_update(session_id, state["mode"])
+            except Exception as e:
+                logger.warning("Falha ao anunciar a entrada na sala: %s", e)
+            logger.debug("Jogador entrou na sala.")
+
+        room = rooms.load_room(session_id, state["mode"])
+        return Response(_room_response(state, room), status=status.HTTP_200_OK)
+
+
+class RoomDetailAPIView(APIView):
+    """
+    API View que retorna participantes, placar e vez de uma sala da qual o usuário participa.
+    Lida do Redis, sem consultar o banco.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id, format=None):
+        state = load_state(session_id)
+        if not rooms.is_room(state) or not rooms.is_member(session_id, request.user.id):
+            return Response(
+                {"detail": "Sala não encontrada."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        room = rooms.load_room(session_id, state["mode"])
+        return Response(_room_response(state, room), status=status.HTTP_200_OK)
 
 
 class UserRegisterAPIView(APIView):
@@ -171,3 +386,297 @@ class UserDetailAPIView(APIView):
     def get(self, request, format=None):
         serializer = UserSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class GameStatsAPIView(APIView):
+    """
+    API View que retorna as estatísticas de uma sessão do usuário autenticado.
+    Lê apenas os contadores mantidos em GameSession, sem agregar mensagens.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id, format=None):
+        game_session = (
+            GameSession.objects.filter(session_id=session_id, user=request.user)
+            .only(*GameStatsSerializer.Meta.fields)
+            .first()
+        )
+        if not game_session:
+            return Response(
+                {"detail": "Sessão de jogo não encontrada."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        serializer = GameStatsSerializer(game_session)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class GameTranscriptAPIView(APIView):
+    """
+    API View que retorna as mensagens de uma sessão do usuário autenticado,
+    venham elas de chat_messages ou da transcrição arquivada.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id, format=None):
+        game_session = (
+            GameSession.objects.filter(session_id=session_id, user=request.user)
+            .only("pk", "session_id", "archived_at", "transcript")
+            .first()
+        )
+        if not game_session:
+            return Response(
+                {"detail": "Sessão de jogo não encontrada."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        serializer = GameTranscriptSerializer(
+            {
+                "session_id": game_session.session_id,
+                "archived": game_session.archived_at is not None,
+                "messages": get_transcript(game_session),
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class GameLLMUsageAPIView(APIView):
+    """
+    API View que retorna o consumo de LLM (tokens, latência, custo e erros) de uma
+    sessão do usuário autenticado, a partir do ledger LLMCall.
+    As chamadas chegam ao ledger em lote, alguns segundos depois do turno.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id, format=None):
+        game_session = (
+            GameSession.objects.filter(session_id=session_id, user=request.user)
+            .only("pk", "session_id")
+            .first()
+        )
+        if not game_session:
+            return Response(
+                {"detail": "Sessão de jogo não encontrada."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        calls = LLMCall.objects.filter(session=game_session)
+        serializer = GameLLMUsageSerializer(
+            {
+                "session_id": game_session.session_id,
+                "totals": summarize(calls, group_by=())[0],
+                "by_call_type": summarize(calls, group_by=("call_type",)),
+                "calls": calls,
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class LLMUsageReportAPIView(APIView):
+    """
+    API View (somente administradores) com o consumo de LLM agregado dos últimos
+    `days` dias, agrupado por etapa (call_type), modelo e/ou dia.
+    Ex.: /api/llm-usage/?days=7&group_by=day,call_type
+    """
+
+    permission_classes = [IsAdminUser]
+    max_days = 90
+
+    def get(self, request, format=None):
+        try:
+            days = min(self.max_days, max(1, int(request.query_params.get("days", 7))))
+        except ValueError:
+            return Response(
+                {"detail": "days deve ser um inteiro."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        group_by = [
+            field
+            for field in request.query_params.get("group_by", "call_type").split(",")
+            if field
+        ]
+        if not group_by or any(field not in GROUP_BY_FIELDS for field in group_by):
+            return Response(
+                {"detail": f"Agrupamento inválido. Use: {', '.join(GROUP_BY_FIELDS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        calls = LLMCall.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=days)
+        )
+        serializer = LLMUsageReportSerializer(
+            {
+                "days": days,
+                "group_by": group_by,
+                "totals": summarize(calls, group_by=())[0],
+                "rows": summarize(calls, group_by=group_by),
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class LeaderboardAPIView(APIView):
+    """
+    API View que retorna uma página do ranking (global, por tema ou por nível)
+    no período pedido, junto com a posição do usuário autenticado.
+    Tudo vem dos sorted sets do Redis; apenas os nomes de usuário são lidos do banco.
+    """
+
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request, period, scope="global", value="", format=None):
+        if period not in PERIODS:
+            return Response(
+                {"detail": f"Período inválido. Use: {', '.join(PERIODS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if scope not in SCOPES or (scope == "global") == bool(value):
+            return Response(
+                {"detail": "Escopo inválido. Use theme/<tema> ou level/<nível>."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            offset = max(0, int(request.query_params.get("offset", 0)))
+            limit = min(self.max_limit, max(1, int(request.query_params.get("limit", 10))))
+        except ValueError:
+            return Response(
+                {"detail": "offset e limit devem ser inteiros."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        entries = get_leaderboard(scope, period, value, offset=offset, limit=limit)
+        me = get_user_rank(scope, period, request.user.id, value)
+        usernames = dict(
+            User.objects.filter(pk__in=[entry["user_id"] for entry in entries]).values_list(
+                "pk", "username"
+            )
+        )
+        for entry in entries:
+            entry["username"] = usernames.get(entry["user_id"])
+        if me:
+            me["username"] = request.user.username
+
+        serializer = LeaderboardSerializer(
+            {
+                "scope": scope,
+                "value": value,
+                "period": period,
+                "entries": entries,
+                "me": me,
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def _make_etag(*parts):
+    """Gera um ETag forte a partir de valores que identificam a versão da resposta."""
+    digest = hashlib.sha1(
+        json.dumps(parts, default=str, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+def _etag_matches(request, etag):
+    """Indica se o cliente já possui a versão (If-None-Match) desta resposta."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return "*" in etags or etag in etags
+
+
+def _not_modified(etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response["ETag"] = etag
+    return response
+
+
+def _game_history_queryset(user, serializer_class):
+    """
+    Sessões do usuário com as colunas usadas pelo serializador e as mensagens
+    carregadas em uma única consulta extra (prefetch), independente do tamanho da página.
+    """
+    messages = ChatMessage.objects.only(
+        "session_id", "sender", "message_text", "timestamp"
+    ).order_by("timestamp", "id")
+    return (
+        GameSession.objects.filter(user=user)
+        .only(*serializer_class.db_fields)
+        .prefetch_related(Prefetch("chat_messages", queryset=messages))
+    )
+
+
+class GameListAPIView(APIView):
+    """
+    API View que lista os jogos do usuário autenticado, do mais recente ao mais antigo,
+    com as transcrições. Usa paginação por cursor em start_time e um número fixo de
+    consultas por página (sessões + mensagens). Suporta GET condicional (ETag).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        paginator = GameHistoryPagination()
+        page = paginator.paginate_queryset(
+            _game_history_queryset(request.user, GameHistorySerializer),
+            request,
+            view=self,
+        )
+        serializer = GameHistorySerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+
+        etag = _make_etag(response.data)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        response["ETag"] = etag
+        return response
+
+
+class GameDetailAPIView(APIView):
+    """
+    API View que retorna uma sessão do usuário autenticado com a transcrição e os contadores.
+    Jogos concluídos não mudam (além do arquivamento), então o ETag é verificado antes
+    de carregar as mensagens.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id, format=None):
+        version = (
+            GameSession.objects.filter(session_id=session_id, user=request.user)
+            .values("is_completed", "end_time", "archived_at")
+            .first()
+        )
+        if version is None:
+            return Response(
+                {"detail": "Sessão de jogo não encontrada."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        if version["is_completed"]:
+            etag = _make_etag(session_id, version["end_time"], version["archived_at"])
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+        game_session = _game_history_queryset(request.user, GameDetailSerializer).get(
+            session_id=session_id
+        )
+        data = GameDetailSerializer(game_session).data
+        if not version["is_completed"]:
+            # Jogo em andamento: a versão é o próprio conteúdo.
+            etag = _make_etag(data)
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+        response = Response(data, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
+
+
+def metrics_view(request):
+    """
+    Exporta as métricas Prometheus do processo web.
+    """
+    payload, content_type = render_metrics()
+    return HttpResponse(payload, content_type=content_type)
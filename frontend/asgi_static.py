@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+# Cabeçalho de cache dos arquivos com hash no nome: o conteúdo nunca muda nessa URL.
+IMMUTABLE_CACHE_CONTROL = b"public, max-age=31536000, immutable"
+# Arquivos sem hash (ex.: referenciados por nome fixo) são revalidados pelo ETag.
+REVALIDATE_CACHE_CONTROL = b"public, max-age=0, must-revalidate"
+# Variantes pré-comprimidas geradas por frontend.storage, em ordem de preferência.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Arquivos maiores que isso são lidos do disco a cada requisição, sem cache em memória.
+MAX_CACHED_FILE_SIZE = 512 * 1024
+
+
+def accepted_encodings(header: str) -> set:
+    """Codificações aceitas pelo cliente no Accept-Encoding (ignorando as com q=0)."""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted
+
+
+class _StaticFile:
+    """Um arquivo de STATIC_ROOT e as suas variantes (codificação -> caminho no disco)."""
+
+    def __init__(self, path, immutable):
+        self.path = path
+        self.variants = {None: path}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = path + suffix
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in (
+            "application/javascript",
+            "application/json",
+            "image/svg+xml",
+        ):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type.encode()
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        )
+        # Conteúdo e ETag por variante, carregados sob demanda.
+        self.bodies = {}
+
+    def select(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    def load(self, encoding):
+        """Retorna (conteúdo, etag) da variante, guardando em memória os arquivos pequenos."""
+        if encoding in self.bodies:
+            return self.bodies[encoding]
+        with open(self.variants[encoding], "rb") as f:
+            body = f.read()
+        digest = hashlib.md5(body, usedforsecurity=False).hexdigest()[:16]
+        loaded = (body, f'"{digest}"'.encode())
+        if len(body) <= MAX_CACHED_FILE_SIZE:
+            self.bodies[encoding] = loaded
+        return loaded
+
+
+class StaticFilesApp:
+    """
+    Aplicação ASGI que serve STATIC_URL direto de STATIC_ROOT, antes do Django
+    (ativada por STATIC_PIPELINE, depois do collectstatic).
+
+    - Negocia a variante pré-comprimida (.br ou .gz) pelo Accept-Encoding, com Vary.
+    - Arquivos com hash no nome (manifesto do collectstatic) recebem cache imutável de
+      um ano; os demais são revalidados com ETag/If-None-Match (304).
+    - Caminhos que não existem em STATIC_ROOT seguem para a aplicação Django.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.realpath(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+        if not self.prefix.startswith("/"):
+            self.prefix = "/" + self.prefix
+        self._files = {}
+        self._immutable = None
+
+    def immutable_names(self):
+        if self._immutable is None:
+            hashed_files = getattr(staticfiles_storage, "hashed_files", {})
+            self._immutable = set(hashed_files.values())
+        return self._immutable
+
+    def find(self, name):
+        """Resolve o arquivo de STATIC_ROOT (sem sair do diretório), ou None."""
+        if name in self._files:
+            return self._files[name]
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            # Caminhos inexistentes não são guardados (seriam ilimitados)
+            return None
+        static_file = _StaticFile(path, name in self.immutable_names())
+        self._files[name] = static_file
+        return static_file
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix):
+            return await self.application(scope, receive, send)
+
+        static_file = self.find(path[len(self.prefix) :])
+        if static_file is None:
+            return await self.application(scope, receive, send)
+
+        if scope["method"] not in ("GET", "HEAD"):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 405,
+                    "headers": [(b"allow", b"GET, HEAD"), (b"content-length", b"0")],
+                }
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        request_headers = dict(scope.get("headers", []))
+        encoding = static_file.select(
+            request_headers.get(b"accept-encoding", b"").decode("latin-1")
+        )
+        body, etag = await asyncio.to_thread(static_file.load, encoding)
+
+        headers = [
+            (b"content-type", static_file.content_type),
+            (b"cache-control", static_file.cache_control),
+            (b"etag", etag),
+        ]
+        if len(static_file.variants) > 1:
+            headers.append((b"vary", b"Accept-Encoding"))
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode()))
+
+        if_none_match = request_headers.get(b"if-none-match", b"")
+        if etag in [tag.strip() for tag in if_none_match.split(b",")]:
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"" if scope["method"] == "HEAD" else body,
+            }
+        )
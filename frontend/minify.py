@@ -0,0 +1,163 @@
+import re
+
+# Minificação conservadora dos assets do frontend (sem dependências externas).
+# Remove comentários e espaços redundantes sem reescrever código: as quebras de linha
+# do JavaScript são mantidas (inserção automática de ponto e vírgula) e o conteúdo de
+# strings, template literals e expressões regulares é copiado sem alteração.
+# As duas funções são idempotentes.
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE_AROUND = re.compile(r"\s*([{};,>])\s*")
+_CSS_SPACE_AFTER_COLON = re.compile(r":\s+")
+
+# Pontuação ao lado da qual espaços nunca são necessários no JavaScript
+_JS_TIGHT = set("{}()[];,=:<>!&|?")
+# Caracteres após os quais uma "/" inicia uma expressão regular, e não uma divisão
+_JS_REGEX_PREFIX = set("(,=:[!&|?{};+-*%<>~^")
+_JS_REGEX_KEYWORDS = {
+    "return",
+    "typeof",
+    "case",
+    "do",
+    "else",
+    "in",
+    "of",
+    "void",
+    "yield",
+    "await",
+    "delete",
+    "instanceof",
+    "new",
+    "throw",
+}
+
+
+def minify_css(source: str) -> str:
+    css = _CSS_COMMENT.sub("", source)
+    css = " ".join(css.split())
+    css = _CSS_SPACE_AROUND.sub(r"\1", css)
+    css = _CSS_SPACE_AFTER_COLON.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+def _skip_string(source, i):
+    """Retorna o índice após a string (', " ou `) que começa em `i`."""
+    quote = source[i]
+    j = i + 1
+    n = len(source)
+    while j < n:
+        ch = source[j]
+        if ch == "\\":
+            j += 2
+            continue
+        if ch == quote:
+            return j + 1
+        if quote == "`" and source.startswith("${", j):
+            j = _skip_template_expression(source, j + 2)
+            continue
+        j += 1
+    return n
+
+
+def _skip_template_expression(source, j):
+    """Retorna o índice após o "}" que fecha uma expressão ${...} de template literal."""
+    depth = 1
+    n = len(source)
+    while j < n:
+        ch = source[j]
+        if ch in "'\"`":
+            j = _skip_string(source, j)
+            continue
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    return n
+
+
+def _skip_regex(source, i):
+    """Retorna o índice após a barra que fecha a expressão regular iniciada em `i`."""
+    j = i + 1
+    n = len(source)
+    in_class = False
+    while j < n and source[j] != "\n":
+        ch = source[j]
+        if ch == "\\":
+            j += 2
+            continue
+        if ch == "[":
+            in_class = True
+        elif ch == "]":
+            in_class = False
+        elif ch == "/" and not in_class:
+            return j + 1
+        j += 1
+    return j
+
+
+def _starts_regex(out):
+    """Indica se uma "/" após o código já emitido inicia uma expressão regular."""
+    text = "".join(out[-12:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in _JS_REGEX_PREFIX:
+        return True
+    word = re.search(r"[A-Za-z_$][\w$]*$", text)
+    return bool(word) and word.group() in _JS_REGEX_KEYWORDS
+
+
+def minify_js(source: str) -> str:
+    out = []
+    i = 0
+    n = len(source)
+
+    def last():
+        return out[-1][-1] if out else "\n"
+
+    while i < n:
+        ch = source[i]
+        nxt = source[i + 1] if i + 1 < n else ""
+        if ch in "'\"`":
+            j = _skip_string(source, i)
+            out.append(source[i:j])
+            i = j
+        elif ch == "/" and nxt == "/":
+            while i < n and source[i] != "\n":
+                i += 1
+        elif ch == "/" and nxt == "*":
+            end = source.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            # Um comentário entre dois identificadores equivale a um espaço
+            if last() not in " \n":
+                out.append(" ")
+        elif ch == "/" and _starts_regex(out):
+            j = _skip_regex(source, i)
+            out.append(source[i:j])
+            i = j
+        elif ch in "\r\n":
+            # Espaços são sempre emitidos como elementos " " isolados
+            if out and out[-1] == " ":
+                out.pop()
+            if out and last() != "\n":
+                out.append("\n")
+            i += 1
+        elif ch in " \t":
+            while i < n and source[i] in " \t":
+                i += 1
+            following = source[i] if i < n else "\n"
+            if (
+                last() not in " \n"
+                and last() not in _JS_TIGHT
+                and following not in _JS_TIGHT
+                and following not in "\r\n"
+            ):
+                out.append(" ")
+        else:
+            if ch in _JS_TIGHT and out and out[-1] == " ":
+                out.pop()
+            out.append(ch)
+            i += 1
+    return "".join(out).strip() + "\n"
@@ -9,6 +9,8 @@ const chatInput = document.getElementById('chat-input');
 const sendButton = document.getElementById('send-button');
 const themeSelect = document.getElementById('theme-select');
 const levelSelect = document.getElementById('level-select');
+const modeSelect = document.getElementById('mode-select');
+const roomPanel = document.getElementById('room-panel');
 const startGameButton = document.getElementById('start-game-button');
 const scoreDisplay = document.getElementById('score-display');
 const attemptsDisplay = document.getElementById('attempts-display'); // NOVO: Elemento para exibir tentativas
@@ -20,6 +22,7 @@ const modalMessage = document.getElementById('modal-message');
 const finalScoreSpan = document.getElementById('final-score');
 const revealedCharacterSpan = document.getElementById('revealed-character');
 const characterImage = document.getElementById('character-image');
+const standingsList = document.getElementById('standings-list');
 
 const usernameDisplay = document.getElementById('username-display');
 const loginLink = document.getElementById('login-link');
@@ -29,19 +32,123 @@ const logoutLink = document.getElementById('logout-link');
 const statusBar = document.getElementById('status-bar');
 
 let currentScore = 0;
+let currentUserId = null;
 let currentAttempts = 0; // NOVO: Variável para armazenar as tentativas restantes
 
-// Função para adicionar mensagens à interface do chat (apenas user e ai)
-function appendMessage(sender, message) {
+// ID da mensagem em envio. É reaproveitado nas novas tentativas do mesmo envio
+// para que o servidor descarte duplicatas.
+let pendingMessage = null;
+
+// Último evento do jogo recebido (ID do log da sessão no servidor). Na reconexão,
+// o servidor reenvia apenas os eventos posteriores a ele.
+let lastEventId = null;
+let reconnectAttempts = 0;
+let reconnectTimer = null;
+let gameFinished = false;
+const MAX_RECONNECT_DELAY_MS = 10000;
+const MAX_RECONNECT_ATTEMPTS = 10;
+// Fechamento por inatividade (servidor): reconecta apenas quando o jogador agir
+const CLOSE_CODE_IDLE = 4000;
+
+// Ecos otimistas ainda não confirmados pelo worker (provisional_id -> elemento)
+// e o indicador "pensando" exibido enquanto a IA processa a mensagem.
+const pendingBubbles = new Map();
+let thinkingDiv = null;
+
+// Compara IDs de evento no formato "<ms>-<seq>"
+function compareEventIds(a, b) {
+    const [aMs, aSeq] = a.split('-').map(Number);
+    const [bMs, bSeq] = b.split('-').map(Number);
+    return aMs === bMs ? aSeq - bSeq : aMs - bMs;
+}
+
+// Gera um ID único para cada mensagem enviada pelo jogador
+function generateClientMessageId() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+// Função para adicionar mensagens à interface do chat (apenas user e ai).
+// Nas salas multijogador, `player` é o nome de quem enviou a mensagem.
+function appendMessage(sender, message, player) {
     if (sender === 'user' || sender === 'ai') {
         const messageDiv = document.createElement('div');
         messageDiv.classList.add('message', sender);
-        messageDiv.textContent = message;
-        chatMessagesDiv.appendChild(messageDiv);
+        if (player) {
+            const nameSpan = document.createElement('span');
+            nameSpan.classList.add('player-name');
+            nameSpan.textContent = player;
+            messageDiv.appendChild(nameSpan);
+        }
+        messageDiv.appendChild(document.createTextNode(message));
+        // O indicador "pensando" fica sempre por último
+        chatMessagesDiv.insertBefore(messageDiv, thinkingDiv);
+        chatMessagesDiv.scrollTop = chatMessagesDiv.scrollHeight;
+        return messageDiv;
+    }
+    return null;
+}
+
+function showThinking() {
+    if (!thinkingDiv) {
+        thinkingDiv = document.createElement('div');
+        thinkingDiv.classList.add('message', 'ai', 'thinking');
+        thinkingDiv.textContent = 'Pensando...';
+        chatMessagesDiv.appendChild(thinkingDiv);
         chatMessagesDiv.scrollTop = chatMessagesDiv.scrollHeight;
     }
 }
 
+function hideThinking() {
+    if (thinkingDiv) {
+        thinkingDiv.remove();
+        thinkingDiv = null;
+    }
+}
+
+// Mensagem do jogador: confirma o eco otimista, se houver, ou a exibe
+function handleUserMessage(data) {
+    const bubble = data.provisional_id && pendingBubbles.get(data.provisional_id);
+    if (bubble) {
+        bubble.classList.remove('pending');
+        pendingBubbles.delete(data.provisional_id);
+    } else {
+        appendMessage('user', data.message, data.player);
+    }
+    showThinking();
+}
+
+// Salas multijogador: participantes com a pontuação, destacando quem tem a vez
+function renderRoom(data) {
+    roomPanel.innerHTML = '';
+    data.players.forEach((player) => {
+        const item = document.createElement('span');
+        item.textContent = `${player.username}: ${player.score}`;
+        if (player.user_id === data.turn_user_id) {
+            item.classList.add('current-turn');
+            item.textContent += player.user_id === currentUserId ? ' (sua vez)' : ' (vez)';
+        }
+        roomPanel.appendChild(item);
+    });
+    roomPanel.classList.remove('hidden');
+}
+
+function renderStandings(standings) {
+    standingsList.innerHTML = '';
+    if (!standings) {
+        standingsList.classList.add('hidden');
+        return;
+    }
+    standings.forEach((player) => {
+        const item = document.createElement('li');
+        item.textContent = `${player.username}: ${player.score}`;
+        standingsList.appendChild(item);
+    });
+    standingsList.classList.remove('hidden');
+}
+
 // Função para atualizar a barra de status
 function updateStatusBar(message) {
     statusBar.textContent = message;
@@ -88,24 +195,67 @@ function fetchCharacterImage(characterName) {
 // Função para configurar a conexão WebSocket
 function setupWebSocket(sessionId) {
     if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+        chatSocket.onclose = null;
         chatSocket.close();
     }
-    chatSocket = new WebSocket(
-        'ws://' + window.location.host + '/ws/game/' + sessionId + '/'
-    );
+    clearTimeout(reconnectTimer);
+    let url = 'ws://' + window.location.host + '/ws/game/' + sessionId + '/';
+    if (lastEventId) {
+        url += '?last_event_id=' + encodeURIComponent(lastEventId);
+    }
+    // O formato dos quadros é negociado por subprotocolo (ver wire.js); o token JWT
+    // vai em um subprotocolo próprio para não aparecer na URL.
+    const protocols = accessToken ? [...WIRE_SUBPROTOCOLS, `whoami.auth.${accessToken}`] : WIRE_SUBPROTOCOLS;
+    chatSocket = new WebSocket(url, protocols);
+    chatSocket.binaryType = 'arraybuffer';
 
     // Manipuladores de eventos WebSocket
     chatSocket.onmessage = function (e) {
-        const data = JSON.parse(e.data);
-        if (data.type === 'chat_message') {
-            appendMessage(data.sender, data.message);
+        const data = decodeWireFrame(e.target.protocol, e.data);
+        if (data.event_id) {
+            // Ignora eventos já processados (reenviados após uma reconexão)
+            if (lastEventId && compareEventIds(data.event_id, lastEventId) <= 0) {
+                return;
+            }
+            lastEventId = data.event_id;
+        }
+        if (data.type === 'ping') {
+            e.target.send(JSON.stringify({ type: 'pong' }));
+        } else if (data.type === 'message_pending') {
+            if (!pendingBubbles.has(data.provisional_id)) {
+                const bubble = appendMessage('user', data.message, data.player);
+                bubble.classList.add('pending');
+                pendingBubbles.set(data.provisional_id, bubble);
+            }
+            showThinking();
+        } else if (data.type === 'message_rejected') {
+            const bubble = pendingBubbles.get(data.provisional_id);
+            if (bubble) {
+                bubble.remove();
+                pendingBubbles.delete(data.provisional_id);
+            }
+            hideThinking();
+            updateStatusBar(`Mensagem não enviada: ${data.message}`);
+        } else if (data.type === 'chat_message') {
+            if (data.sender === 'user') {
+                handleUserMessage(data);
+            } else {
+                hideThinking();
+                appendMessage(data.sender, data.message);
+            }
+        } else if (data.type === 'room_update') {
+            renderRoom(data);
         } else if (data.type === 'system_message') {
             updateStatusBar(data.message);
         } else if (data.type === 'game_over') {
+            gameFinished = true;
+            hideThinking();
             updateScore(data.score);
+            renderStandings(data.standings);
             // Passa a URL da imagem para o modal
             showGameOverModal(data.message, data.score, data.character_name, data.character_image_url);
         } else if (data.type === 'error') {
+            hideThinking();
             updateStatusBar(`Erro: ${data.message}`);
         } else if (data.type === 'update_attempts') { // NOVO: Handler para tentativas
             updateAttemptsDisplay(data.attempts_left);
@@ -113,11 +263,34 @@ function setupWebSocket(sessionId) {
     };
 
     chatSocket.onclose = function (e) {
+        // Fechamento normal pelo servidor (ex.: sessão inexistente) ou jogo encerrado
+        if (sessionId !== currentSessionId || gameFinished || e.code === 1000) {
+            return;
+        }
+        if (e.code === CLOSE_CODE_IDLE) {
+            updateStatusBar('Conexão encerrada por inatividade. Envie uma mensagem para continuar.');
+            return;
+        }
+        if (reconnectAttempts >= MAX_RECONNECT_ATTEMPTS) {
+            updateStatusBar('Não foi possível reconectar ao jogo. Por favor, inicie um novo jogo.');
+            return;
+        }
+        // Reconecta com backoff exponencial; o servidor reenvia os eventos perdidos.
+        const delay = Math.min(MAX_RECONNECT_DELAY_MS, 500 * 2 ** reconnectAttempts);
+        reconnectAttempts += 1;
         console.error('Chat socket fechado inesperadamente');
-        updateStatusBar('Conexão com o jogo perdida. Por favor, inicie um novo jogo.');
+        updateStatusBar(`Conexão com o jogo perdida. Reconectando em ${Math.round(delay / 1000)}s...`);
+        reconnectTimer = setTimeout(async () => {
+            // Handshakes recusados seguidos podem ser um token expirado
+            if (reconnectAttempts === 2) {
+                await refreshAccessToken();
+            }
+            setupWebSocket(sessionId);
+        }, delay);
     };
 
     chatSocket.onopen = function (e) {
+        reconnectAttempts = 0;
         updateStatusBar(`Conectado à sessão de jogo: ${sessionId}.`);
     };
 }
@@ -141,6 +314,14 @@ sendButton.onclick = async function () {
         return;
     }
     if (message) {
+        // Reabre o socket fechado por inatividade; os eventos perdidos são reenviados
+        if (!gameFinished && (!chatSocket || chatSocket.readyState === WebSocket.CLOSED)) {
+            reconnectAttempts = 0;
+            setupWebSocket(currentSessionId);
+        }
+        if (!pendingMessage || pendingMessage.text !== message || pendingMessage.sessionId !== currentSessionId) {
+            pendingMessage = { id: generateClientMessageId(), text: message, sessionId: currentSessionId };
+        }
         try {
             const response = await fetch('/api/message/', {
                 method: 'POST',
@@ -151,7 +332,8 @@ sendButton.onclick = async function () {
                 },
                 body: JSON.stringify({
                     session_id: currentSessionId,
-                    message: message
+                    message: message,
+                    client_message_id: pendingMessage.id
                 })
             });
 
@@ -171,6 +353,7 @@ sendButton.onclick = async function () {
             }
 
             chatInput.value = '';
+            pendingMessage = null;
         } catch (error) {
             updateStatusBar(`Erro ao enviar mensagem: ${error.message}`);
             console.error('Erro ao enviar mensagem:', error);
@@ -187,31 +370,30 @@ startGameButton.onclick = async function () {
 
     const theme = themeSelect.value;
     const level = levelSelect.value;
-    chatMessagesDiv.innerHTML = ''; // Limpa as mensagens do chat
-    updateScore(0); // Reseta a pontuação
-    updateAttemptsDisplay(0); // Reseta as tentativas
-    gameOverModal.style.display = 'none';
-    characterImage.classList.add('hidden');
+    const mode = modeSelect.value;
+    resetGameView();
 
     try {
-        const response = await fetch('/api/new/game/', {
+        // Salas multijogador são criadas em /api/rooms/; o jogo solo, em /api/new/game/.
+        const response = await fetch(mode === 'solo' ? '/api/new/game/' : '/api/rooms/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCookie('csrftoken'),
                 'Authorization': `Bearer ${accessToken}`
             },
-            body: JSON.stringify({
-                theme: theme,
-                level: level
-            })
+            body: JSON.stringify(mode === 'solo' ? { theme, level } : { theme, level, mode })
         });
 
         if (response.ok) {
             const data = await response.json();
-            currentSessionId = data.session_id;
-            setupWebSocket(currentSessionId);
-            updateStatusBar(`Jogo iniciado! Tema: ${theme}, Nível: ${level}. Aguardando a primeira dica...`);
+            connectToSession(data.session_id);
+            if (mode === 'solo') {
+                updateStatusBar(`Jogo iniciado! Tema: ${theme}, Nível: ${level}. Aguardando a primeira dica...`);
+            } else {
+                const inviteUrl = `${window.location.origin}${window.location.pathname}?room=${data.session_id}`;
+                updateStatusBar(`Sala criada! Convide outros jogadores com o link: ${inviteUrl}`);
+            }
         } else {
             if (response.status === 401) {
                 const refreshed = await refreshAccessToken();
@@ -232,6 +414,55 @@ startGameButton.onclick = async function () {
     }
 };
 
+// Limpa o chat, o placar e o modal para um novo jogo
+function resetGameView() {
+    chatMessagesDiv.innerHTML = ''; // Limpa as mensagens do chat
+    pendingBubbles.clear();
+    thinkingDiv = null;
+    updateScore(0); // Reseta a pontuação
+    updateAttemptsDisplay(0); // Reseta as tentativas
+    gameOverModal.style.display = 'none';
+    characterImage.classList.add('hidden');
+    roomPanel.classList.add('hidden');
+    renderStandings(null);
+}
+
+function connectToSession(sessionId) {
+    currentSessionId = sessionId;
+    lastEventId = null;
+    gameFinished = false;
+    reconnectAttempts = 0;
+    setupWebSocket(currentSessionId);
+}
+
+// Entra na sala multijogador do link de convite (?room=<session_id>)
+async function joinRoom(sessionId) {
+    resetGameView();
+    try {
+        const response = await fetch(`/api/rooms/${encodeURIComponent(sessionId)}/join/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken'),
+                'Authorization': `Bearer ${accessToken}`
+            }
+        });
+        if (response.status === 401 && await refreshAccessToken()) {
+            return joinRoom(sessionId);
+        }
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.detail || 'Erro ao entrar na sala.');
+        }
+        connectToSession(sessionId);
+        renderRoom(data);
+        updateStatusBar(`Você entrou na sala (${data.players.length} jogadores).`);
+    } catch (error) {
+        updateStatusBar(`Falha ao entrar na sala: ${error.message}`);
+        console.error('Erro ao entrar na sala:', error);
+    }
+}
+
 // Manipulador de evento para fechar o modal de fim de jogo
 closeModalButton.onclick = function () {
     gameOverModal.style.display = 'none';
@@ -314,6 +545,7 @@ async function checkLoginStatus() {
 
             if (response.ok) {
                 const userData = await response.json();
+                currentUserId = userData.id;
                 usernameDisplay.textContent = `Olá, ${userData.username || 'Usuário'}!`;
                 usernameDisplay.style.display = 'inline';
                 loginLink.style.display = 'none';
@@ -361,7 +593,12 @@ logoutLink.onclick = function (event) {
 };
 
 // Ao carregar a página, verifica o status de login e fornece instruções iniciais
-window.onload = function () {
-    checkLoginStatus();
+window.onload = async function () {
+    await checkLoginStatus();
+    const roomId = new URLSearchParams(window.location.search).get('room');
+    if (roomId && accessToken) {
+        joinRoom(roomId);
+        return;
+    }
     updateStatusBar('Por favor, faça login e clique em "Iniciar Novo Jogo" para começar.');
 };
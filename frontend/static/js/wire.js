@@ -0,0 +1,112 @@
+// Formatos de quadro do WebSocket do jogo (espelha core/utils/wire_format.py).
+// O cliente oferece os subprotocolos em ordem de preferência e o servidor escolhe um.
+
+const WIRE_SUBPROTOCOLS = ['whoami.v1.msgpack', 'whoami.v1.cjson', 'whoami.v1.json'];
+
+const WIRE_LONG_KEYS = {
+    t: 'type',
+    i: 'event_id',
+    s: 'sender',
+    m: 'message',
+    a: 'attempts_left',
+    p: 'score',
+    c: 'character_name',
+    u: 'character_image_url',
+    d: 'provisional_id',
+};
+const WIRE_LONG_TYPES = {
+    c: 'chat_message',
+    a: 'update_attempts',
+    g: 'game_over',
+    e: 'error',
+    s: 'system_message',
+    p: 'message_pending',
+    r: 'message_rejected',
+};
+
+const wireTextDecoder = new TextDecoder();
+
+// Decodificador MessagePack mínimo: apenas os tipos usados pelos eventos do jogo
+// (mapas, listas, strings, inteiros, floats, booleanos e nil).
+function decodeMsgpack(buffer) {
+    const view = new DataView(buffer);
+    const bytes = new Uint8Array(buffer);
+    let offset = 0;
+
+    function readString(length) {
+        const value = wireTextDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    }
+    function readMap(size) {
+        const result = {};
+        for (let i = 0; i < size; i++) {
+            const key = read();
+            result[key] = read();
+        }
+        return result;
+    }
+    function readArray(size) {
+        const result = [];
+        for (let i = 0; i < size; i++) {
+            result.push(read());
+        }
+        return result;
+    }
+    function read() {
+        const byte = bytes[offset++];
+        if (byte <= 0x7f) return byte;
+        if (byte >= 0xe0) return byte - 0x100;
+        if (byte >= 0x80 && byte <= 0x8f) return readMap(byte & 0x0f);
+        if (byte >= 0x90 && byte <= 0x9f) return readArray(byte & 0x0f);
+        if (byte >= 0xa0 && byte <= 0xbf) return readString(byte & 0x1f);
+        let value;
+        switch (byte) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xcc: value = view.getUint8(offset); offset += 1; return value;
+            case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+            case 0xce: value = view.getUint32(offset); offset += 4; return value;
+            case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+            case 0xd0: value = view.getInt8(offset); offset += 1; return value;
+            case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+            case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+            case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+            case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+            case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+            case 0xd9: value = view.getUint8(offset); offset += 1; return readString(value);
+            case 0xda: value = view.getUint16(offset); offset += 2; return readString(value);
+            case 0xdb: value = view.getUint32(offset); offset += 4; return readString(value);
+            case 0xdc: value = view.getUint16(offset); offset += 2; return readArray(value);
+            case 0xdd: value = view.getUint32(offset); offset += 4; return readArray(value);
+            case 0xde: value = view.getUint16(offset); offset += 2; return readMap(value);
+            case 0xdf: value = view.getUint32(offset); offset += 4; return readMap(value);
+            default: throw new Error(`MessagePack: tipo 0x${byte.toString(16)} não suportado`);
+        }
+    }
+    return read();
+}
+
+// Converte um evento do esquema curto para as chaves completas usadas pelo game.js
+function expandWireEvent(short) {
+    const event = {};
+    for (const [key, value] of Object.entries(short)) {
+        event[WIRE_LONG_KEYS[key] || key] = value;
+    }
+    if (event.type in WIRE_LONG_TYPES) {
+        event.type = WIRE_LONG_TYPES[event.type];
+    }
+    return event;
+}
+
+// Decodifica um quadro recebido de acordo com o subprotocolo negociado (socket.protocol)
+function decodeWireFrame(protocol, data) {
+    if (protocol === 'whoami.v1.msgpack') {
+        return expandWireEvent(decodeMsgpack(data));
+    }
+    if (protocol === 'whoami.v1.cjson') {
+        return expandWireEvent(JSON.parse(data));
+    }
+    return JSON.parse(data);
+}
@@ -0,0 +1,82 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .minify import minify_css, minify_js
+
+try:
+    import brotli
+except ImportError:  # Dependência opcional: pip install .[static]
+    brotli = None
+
+# Extensões comprimidas no collectstatic (imagens e fontes já são comprimidas)
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".svg", ".html", ".json", ".txt", ".map")
+# Arquivos menores que isso não compensam o custo de negociar a variante
+MIN_COMPRESS_SIZE = 256
+MINIFIERS = {".js": minify_js, ".css": minify_css}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Storage do collectstatic para produção (STATIC_PIPELINE=1).
+
+    1. Minifica os .js e .css (frontend.minify) antes de calcular o hash.
+    2. Gera os nomes com hash do conteúdo (ManifestStaticFilesStorage).
+    3. Grava ao lado de cada arquivo as variantes pré-comprimidas .gz e, com o pacote
+       brotli instalado, .br, apenas quando forem menores que o original.
+
+    As variantes são servidas por frontend.asgi_static.StaticFilesApp.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run=dry_run, **options)
+            return
+
+        for path in paths:
+            self._minify(path)
+
+        # O hash é calculado sobre as cópias já minificadas em STATIC_ROOT, e não
+        # sobre os arquivos de origem dos finders.
+        collected = {path: (self, path) for path in paths}
+        for name, hashed_name, processed in super().post_process(
+            collected, dry_run=dry_run, **options
+        ):
+            yield name, hashed_name, processed
+            if isinstance(processed, Exception):
+                continue
+            self._compress(name)
+            if hashed_name:
+                self._compress(hashed_name)
+
+    def _minify(self, path):
+        root, ext = os.path.splitext(path)
+        minifier = MINIFIERS.get(ext)
+        # Arquivos de terceiros já minificados (ex.: admin/js/vendor/*.min.js) são mantidos
+        if minifier is None or root.endswith(".min"):
+            return
+        with self.open(path) as original:
+            source = original.read().decode("utf-8")
+        minified = minifier(source)
+        if minified != source:
+            self.delete(path)
+            self._save(path, ContentFile(minified.encode("utf-8")))
+
+    def _compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(content, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))